@@ -46,4 +46,10 @@ class ResourceAdmin(admin.ModelAdmin):
 class UserPreferenceAdmin(admin.ModelAdmin):
     list_display = ['session', 'preferred_name', 'university', 'enable_mood_tracking', 'crisis_mode']
     list_filter = ['enable_mood_tracking', 'daily_check_ins', 'crisis_mode']
-    search_fields = ['session__session_id', 'preferred_name', 'university']
\ No newline at end of file
+    search_fields = ['session__session_id', 'preferred_name', 'university']
+
+@admin.register(DailyAnalytics)
+class DailyAnalyticsAdmin(admin.ModelAdmin):
+    list_display = ['date', 'sessions', 'conversations', 'messages', 'mood_entries', 'assessments', 'is_complete']
+    list_filter = ['is_complete']
+    readonly_fields = ['updated_at']
\ No newline at end of file
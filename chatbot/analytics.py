@@ -0,0 +1,167 @@
+# chatbot/analytics.py
+from django.db import transaction
+from django.db.models import Count, Sum, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from .models import UserSession, Conversation, Message, MoodEntry, MentalHealthAssessment, DailyAnalytics
+
+# Rollup fields computed per day, written together on every upsert
+ROLLUP_FIELDS = [
+    'sessions', 'conversations', 'messages', 'prediction_distribution',
+    'mood_entries', 'mood_intensity_sum', 'mood_distribution',
+    'assessments', 'assessment_score_sum', 'risk_distribution', 'is_complete', 'updated_at',
+]
+
+def day_start(day):
+    """Start of a calendar day in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def first_data_day():
+    """Earliest day with any rows, or None for an empty database"""
+    firsts = [
+        UserSession.objects.aggregate(first=Min('created_at'))['first'],
+        Conversation.objects.aggregate(first=Min('created_at'))['first'],
+        MoodEntry.objects.aggregate(first=Min('created_at'))['first'],
+        MentalHealthAssessment.objects.aggregate(first=Min('created_at'))['first'],
+    ]
+    firsts = [first for first in firsts if first is not None]
+    return timezone.localdate(min(firsts)) if firsts else None
+
+def _per_day(queryset, field, *group_by, **aggregates):
+    """Rows of queryset between the range bounds grouped by calendar day (and group_by)"""
+    return queryset.order_by().annotate(day=TruncDate(field)).values('day', *group_by).annotate(**aggregates)
+
+def compute_rollups(start_day, end_day, since=None, until=None):
+    """DailyAnalytics rows for start_day up to, not including, end_day
+    
+    One grouped query per table over the date range, each a range read
+    on that table's date index, so the cost follows the rows in the
+    range, not the size of the tables. since and until narrow the range
+    to a time of day; rows cut that way are partial, never complete.
+    """
+    start, end = day_start(start_day), day_start(end_day)
+    if since is not None:
+        start = max(start, since)
+    if until is not None:
+        end = min(end, until)
+    now = timezone.now()
+    rollups = {}
+    
+    def rollup(day):
+        if day not in rollups:
+            rollups[day] = DailyAnalytics(
+                date=day,
+                is_complete=start <= day_start(day) and day_start(day + timedelta(days=1)) <= min(end, now),
+                updated_at=now
+            )
+        return rollups[day]
+    
+    # Every day in the range gets a row, so quiet days are not recomputed later
+    day = start_day
+    while day < end_day:
+        rollup(day)
+        day += timedelta(days=1)
+    
+    for row in _per_day(UserSession.objects.filter(created_at__gte=start, created_at__lt=end), 'created_at', count=Count('pk')):
+        rollup(row['day']).sessions = row['count']
+    
+    for row in _per_day(Conversation.objects.filter(created_at__gte=start, created_at__lt=end), 'created_at', count=Count('pk')):
+        rollup(row['day']).conversations = row['count']
+    
+    for row in _per_day(
+        Message.objects.filter(timestamp__gte=start, timestamp__lt=end),
+        'timestamp', 'predicted_condition', count=Count('pk')
+    ):
+        day_rollup = rollup(row['day'])
+        day_rollup.messages += row['count']
+        if row['predicted_condition'] is not None:
+            day_rollup.prediction_distribution[row['predicted_condition']] = row['count']
+    
+    for row in _per_day(
+        MoodEntry.objects.filter(created_at__gte=start, created_at__lt=end),
+        'created_at', 'mood', count=Count('pk'), intensity_sum=Sum('intensity')
+    ):
+        day_rollup = rollup(row['day'])
+        day_rollup.mood_entries += row['count']
+        day_rollup.mood_intensity_sum += row['intensity_sum']
+        day_rollup.mood_distribution[row['mood']] = row['count']
+    
+    for row in _per_day(
+        MentalHealthAssessment.objects.filter(created_at__gte=start, created_at__lt=end),
+        'created_at', 'risk_level', count=Count('pk'), score_sum=Sum('total_score')
+    ):
+        day_rollup = rollup(row['day'])
+        day_rollup.assessments += row['count']
+        day_rollup.assessment_score_sum += row['score_sum']
+        day_rollup.risk_distribution[row['risk_level']] = row['count']
+    
+    return [rollups[day] for day in sorted(rollups)]
+
+def update_rollups(include_today=False, rebuild_days=0, batch_days=31):
+    """Bring DailyAnalytics up to date and return the number of days written
+    
+    Only days after the last complete rollup are computed, plus the last
+    rebuild_days complete days when asked (for backfills or corrections).
+    Days are computed batch_days at a time, each batch upserted in one
+    transaction. A rollup of today is partial and redone on the next run.
+    """
+    today = timezone.localdate()
+    end_day = today + timedelta(days=1) if include_today else today
+    
+    last_complete = DailyAnalytics.objects.filter(is_complete=True).order_by('-date').values_list('date', flat=True).first()
+    if last_complete is not None:
+        start_day = last_complete + timedelta(days=1)
+    else:
+        start_day = first_data_day()
+        if start_day is None:
+            return 0
+    if rebuild_days:
+        start_day = min(start_day, today - timedelta(days=rebuild_days))
+    
+    written = 0
+    while start_day < end_day:
+        batch_end = min(start_day + timedelta(days=batch_days), end_day)
+        rows = compute_rollups(start_day, batch_end)
+        with transaction.atomic():
+            DailyAnalytics.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['date'],
+                update_fields=ROLLUP_FIELDS
+            )
+        written += len(rows)
+        start_day = batch_end
+    return written
+
+def period_rollups(since, until=None):
+    """Rollups covering since up to until (default now), without writing any
+    
+    Complete days in between are read from DailyAnalytics. The partial
+    days at either end, and days not rolled up yet, are computed from the
+    raw rows, so totals follow the exact period.
+    """
+    if until is None:
+        until = timezone.now()
+    first_day, last_day = timezone.localdate(since), timezone.localdate(until)
+    stored = {
+        rollup.date: rollup
+        for rollup in DailyAnalytics.objects.filter(date__gt=first_day, date__lt=last_day, is_complete=True)
+    }
+    
+    rollups = compute_rollups(first_day, first_day + timedelta(days=1), since=since, until=until)
+    day = first_day + timedelta(days=1)
+    while day < last_day:
+        if day in stored:
+            rollups.append(stored[day])
+            day += timedelta(days=1)
+            continue
+        # Consecutive missing days are computed in one go
+        gap_end = day
+        while gap_end < last_day and gap_end not in stored:
+            gap_end += timedelta(days=1)
+        rollups.extend(compute_rollups(day, gap_end))
+        day = gap_end
+    if last_day > first_day:
+        rollups.extend(compute_rollups(last_day, last_day + timedelta(days=1), until=until))
+    return rollups
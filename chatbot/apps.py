@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
-    verbose_name = 'Moodigo Chatbot'
\ No newline at end of file
+    verbose_name = 'Moodigo Chatbot'
+    
+    def ready(self):
+        from . import signals
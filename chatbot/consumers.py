@@ -0,0 +1,113 @@
+# chatbot/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.utils import timezone
+from .models import Conversation
+from .ml_models import InferenceOverloaded, ModelsNotReady
+from .views import moodigo_ai, session_cache, is_crisis_analysis, save_chat_turn
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """Chat over a persistent WebSocket
+    
+    The UserSession is looked up once when the socket connects and reused
+    for every message on it. The active Conversation is read per message,
+    since it can be ended from another tab. Frames are JSON:
+        
+        client -> {"type": "message", "id": 1, "message": "..."}
+        server -> {"type": "reply", "id": 1, "bot_response": "...", ...}
+        client -> {"type": "ping"}
+        server -> {"type": "pong"}
+    
+    Errors come back as {"type": "error", "id": ..., "error": "..."}.
+    """
+    
+    # Same limit as the chat input
+    MAX_MESSAGE_LENGTH = 500
+    
+    # Close codes the chat page does not retry
+    CLOSE_NO_SESSION = 4401
+    
+    async def connect(self):
+        # The chat page creates the Django session before it opens the socket
+        session_id = self.scope['session'].get('session_id')
+        if not session_id:
+            await self.close(code=self.CLOSE_NO_SESSION)
+            return
+        
+        self.user_session = await self.load_session(session_id)
+        await self.accept()
+    
+    @database_sync_to_async
+    def load_session(self, session_id):
+        return session_cache.get_session(session_id, user=self.scope.get('user'))
+    
+    @database_sync_to_async
+    def active_conversation_id(self):
+        # Read per message: the conversation can be ended from another tab or worker
+        conversation_id = Conversation.objects.filter(
+            session=self.user_session, is_active=True
+        ).values_list('pk', flat=True).first()
+        if conversation_id is None:
+            conversation_id = Conversation.objects.create(
+                session=self.user_session,
+                title=f"Chat {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+            ).pk
+        return conversation_id
+    
+    async def receive_json(self, content, **kwargs):
+        frame_type = content.get('type')
+        if frame_type == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif frame_type == 'message':
+            await self.handle_message(content)
+        else:
+            await self.send_json({'type': 'error', 'error': f'Unknown frame type: {frame_type}'})
+    
+    async def handle_message(self, content):
+        frame_id = content.get('id')
+        message_content = str(content.get('message', '')).strip()
+        
+        if not message_content:
+            await self.send_json({'type': 'error', 'id': frame_id, 'error': 'Message cannot be empty'})
+            return
+        if len(message_content) > self.MAX_MESSAGE_LENGTH:
+            await self.send_json({'type': 'error', 'id': frame_id, 'error': 'Message is too long'})
+            return
+        
+        try:
+            ai_analysis = await moodigo_ai.analyze_message_async(
+                message_content, session_id=self.user_session.session_id
+            )
+        except InferenceOverloaded:
+            await self.send_json({
+                'type': 'error',
+                'id': frame_id,
+                'error': 'Moodigo is busy right now, please try again in a moment',
+                'retry_after': 1
+            })
+            return
+        except ModelsNotReady:
+            await self.send_json({
+                'type': 'error',
+                'id': frame_id,
+                'error': 'Moodigo is still starting up, please try again in a moment',
+                'retry_after': 5
+            })
+            return
+        
+        is_crisis = is_crisis_analysis(ai_analysis)
+        session_cache.touch(self.user_session)
+        conversation_id = await self.active_conversation_id()
+        bot_message = await save_chat_turn(
+            conversation_id, self.user_session, message_content, ai_analysis, is_crisis
+        )
+        
+        await self.send_json({
+            'type': 'reply',
+            'id': frame_id,
+            'bot_response': bot_message.content,
+            'prediction': ai_analysis['prediction'],
+            'confidence': ai_analysis['confidence'],
+            'is_crisis': is_crisis,
+            'timestamp': bot_message.timestamp.strftime('%H:%M')
+        })
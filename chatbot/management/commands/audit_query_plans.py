@@ -0,0 +1,197 @@
+# chatbot/management/commands/audit_query_plans.py
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from datetime import timedelta
+from chatbot.models import *
+from chatbot.pagination import encode_cursor
+from chatbot import views
+import io
+import re
+import tempfile
+import uuid
+
+# Plan lines that mean a whole table is read: SQLite "SCAN t" without an index, PostgreSQL "Seq Scan"
+FULL_SCAN_PATTERNS = [
+    re.compile(r'\bSCAN (?!.*\bINDEX\b)(?!CONSTANT ROW)'),
+    re.compile(r'\bSeq Scan\b'),
+]
+
+# Plan lines that mean an extra sort step
+SORT_PATTERNS = [
+    re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+]
+
+# Statements with a plan worth reading; inserts have none
+AUDITED_STATEMENT = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+# Literals, so the same query with other values is audited once
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+VALUE_LISTS = re.compile(r'\((?:\?, )+\?\)')
+
+# Days of inactivity of the seeded session; cleanup_old_sessions is run for
+# sessions nearly this old, so on a real database it only finds that one
+SEEDED_SESSION_AGE = 36500
+
+def query_shape(sql):
+    """sql with its values replaced by placeholders"""
+    return VALUE_LISTS.sub('(?)', LITERALS.sub('?', sql))
+
+class Command(BaseCommand):
+    help = 'Show the query plan of every query the views and commands run and flag full table scans'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the SQL and full plan of every query, not only flagged ones',
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Exit with an error if any query does a full table scan',
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(f'Auditing query plans on {connection.vendor}...')
+        
+        # The views and commands run for real inside a transaction that is rolled
+        # back, so what gets audited is the SQL they issue today, not a copy of it
+        with transaction.atomic():
+            queries = self.capture_queries()
+            audited = [(location, sql, self.explain(sql)) for location, sql in queries]
+            transaction.set_rollback(True)
+        
+        full_scans = []
+        sorts = []
+        for location, sql, lines in audited:
+            scan_lines = [line for line in lines if any(p.search(line) for p in FULL_SCAN_PATTERNS)]
+            sort_lines = [line for line in lines if any(p.search(line) for p in SORT_PATTERNS)]
+            
+            if scan_lines:
+                full_scans.append(location)
+                self.stdout.write(self.style.ERROR(f'FULL SCAN  {location}'))
+            elif sort_lines:
+                sorts.append(location)
+                self.stdout.write(self.style.WARNING(f'SORT       {location}'))
+            else:
+                self.stdout.write(f'ok         {location}')
+            
+            if scan_lines or sort_lines or options['verbose_plans']:
+                self.stdout.write(f'             {sql}')
+                for line in lines:
+                    self.stdout.write(f'             {line}')
+        
+        summary = f'{len(audited)} queries audited, {len(full_scans)} full scans, {len(sorts)} extra sorts.'
+        if full_scans:
+            if options['strict']:
+                raise CommandError(summary)
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+    
+    def capture_queries(self):
+        """(location, sql) for each distinct query the views and commands issue on the app's tables"""
+        self.seed_old_session()
+        
+        queries = []
+        seen = set()
+        for location, step in self.steps():
+            with CaptureQueriesContext(connection) as captured, override_settings(ALLOWED_HOSTS=['testserver']):
+                step()
+            for query in captured.captured_queries:
+                sql = query['sql']
+                if not AUDITED_STATEMENT.match(sql) or '"chatbot_' not in sql:
+                    continue
+                shape = (location, query_shape(sql))
+                if shape not in seen:
+                    seen.add(shape)
+                    queries.append((f'{location}: {sql[:70]}...' if len(sql) > 70 else f'{location}: {sql}', sql))
+        return queries
+    
+    def seed_old_session(self):
+        """An expired anonymous session with data under it, so cleanup_old_sessions has work to do"""
+        session = UserSession.objects.create(session_id=f'audit-{uuid.uuid4()}', is_anonymous=True)
+        UserSession.objects.filter(pk=session.pk).update(last_activity=timezone.now() - timedelta(days=SEEDED_SESSION_AGE))
+        conversation = Conversation.objects.create(session=session)
+        Message.objects.create(conversation=conversation, sender='user', content='audit', predicted_condition='Normal')
+        MoodEntry.objects.create(session=session, mood='neutral', intensity=5)
+        MentalHealthAssessment.objects.create(session=session, total_score=10, risk_level='low', responses={})
+    
+    def steps(self):
+        """(location, callable) for every view and command with queries of its own
+        
+        Steps are generated one at a time, so code between them runs outside
+        the query capture. The resource pages are left out: they read the whole (small) Resource
+        table once per catalog change, not per request.
+        """
+        client = Client()
+        cursor = encode_cursor(timezone.now(), 0)
+        
+        def get(path):
+            def request():
+                response = client.get(path)
+                self.check_response(path, response)
+            return request
+        
+        def post(path, data, **extra):
+            def request():
+                response = client.post(path, data, **extra)
+                self.check_response(path, response)
+            return request
+        
+        def command(name, *args):
+            def run():
+                call_command(name, *args, stdout=io.StringIO())
+            return run
+        
+        def row_export():
+            with tempfile.TemporaryDirectory() as output_dir:
+                call_command('export_analytics', '--format', 'ndjson', '--output', output_dir, stdout=io.StringIO())
+        
+        # Chat turns are written inside the audit transaction even when writes are deferred
+        deferred = views.chat_turn_writer.deferred
+        views.chat_turn_writer.deferred = False
+        try:
+            yield 'chat', get('/chat/')
+            yield 'send_message', post('/send-message/', {'message': 'How do I sleep better?'}, content_type='application/json')
+            yield 'mood_tracker', post('/mood-tracker/', {'mood': 'neutral', 'intensity': 5, 'notes': ''})
+            yield 'mood_tracker', get('/mood-tracker/')
+            yield 'assessment', post('/assessment/', {})
+            yield 'mood_chart_data', get('/mood-chart-data/')
+            yield 'conversation_history', get('/history/')
+            yield 'conversation_history', get(f'/history/?before={cursor}')
+            
+            # Looked up between steps, so this query is not audited
+            conversation_id = Conversation.objects.filter(
+                session__session_id=client.session['session_id']
+            ).values_list('pk', flat=True).first()
+            yield 'view_conversation', get(f'/conversation/{conversation_id}/')
+            yield 'conversation_messages', get(f'/conversation/{conversation_id}/messages/?before={cursor}')
+            yield 'new_conversation', get('/new-conversation/')
+            yield 'session activity flush', views.session_cache.flush
+        finally:
+            views.chat_turn_writer.deferred = deferred
+        
+        cleanup_days = str(SEEDED_SESSION_AGE - 1)
+        yield 'cleanup_old_sessions --dry-run', command('cleanup_old_sessions', '--days', cleanup_days, '--dry-run')
+        yield 'cleanup_old_sessions', command('cleanup_old_sessions', '--days', cleanup_days, '--sleep', '0')
+        yield 'rollup_analytics', command('rollup_analytics', '--include-today')
+        yield 'export_analytics', command('export_analytics', '--format', 'json')
+        yield 'export_analytics --format ndjson', row_export
+    
+    def check_response(self, path, response):
+        # A failed request stops early, so some of its queries were never issued
+        if response.status_code >= 400:
+            self.stdout.write(self.style.WARNING(
+                f'{path} returned {response.status_code}; the queries after the failure are not audited'
+            ))
+    
+    def explain(self, sql):
+        """Plan lines of a captured statement"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return [str(row[-1]) for row in cursor.fetchall()]
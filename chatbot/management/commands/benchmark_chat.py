@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+import asyncio
+import json
+import time
+
+SAMPLE_MESSAGES = [
+    "I feel really anxious about my exams",
+    "I'm so depressed and nothing matters",
+    "Life is great and I'm feeling amazing!!!",
+    "I can't sleep and I'm so stressed about work",
+    "My mood keeps changing rapidly and I feel empty",
+]
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent chat requests through the ASGI handler on a throwaway test database'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Total chat messages to send (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Chat sessions sending messages at the same time (default: 50)',
+        )
+    
+    def handle(self, *args, **options):
+        from chatbot.views import moodigo_ai, session_cache, chat_turn_writer
+        
+        # Never write benchmark traffic to the real database
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write('Waiting for models to warm up...')
+            moodigo_ai.start_warmup()
+            moodigo_ai.wait_until_ready()
+            
+            total = options['requests']
+            concurrency = max(1, options['concurrency'])
+            self.stdout.write(f'Sending {total} chat messages from {concurrency} concurrent sessions...')
+            latencies, statuses, elapsed = asyncio.run(self.run_load(total, concurrency))
+        finally:
+            # Write-behind state belongs to the test database, settle it before that goes away
+            session_cache.flush()
+            chat_turn_writer.flush()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        
+        ok = sorted(latency for latency, status in zip(latencies, statuses) if status == 200)
+        self.stdout.write(f'  throughput      {len(statuses) / elapsed:9.1f} req/s')
+        if ok:
+            self.stdout.write(f'  latency p50     {ok[len(ok) // 2] * 1000:9.1f} ms')
+            self.stdout.write(f'  latency p95     {ok[int(len(ok) * 0.95) - 1] * 1000:9.1f} ms')
+            self.stdout.write(f'  latency max     {ok[-1] * 1000:9.1f} ms')
+        for status in sorted(set(statuses)):
+            self.stdout.write(f'  HTTP {status}        {statuses.count(status):9d}')
+        self.stdout.write(f'  inference pool  {moodigo_ai.inference_pool.stats()}')
+        self.stdout.write(self.style.SUCCESS('Benchmark completed.'))
+    
+    async def run_load(self, total, concurrency):
+        url = reverse('send_message')
+        latencies, statuses = [], []
+        remaining = iter(range(total))
+        
+        async def session_worker(client):
+            for i in remaining:
+                body = json.dumps({'message': SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)]})
+                start = time.perf_counter()
+                response = await client.post(url, body, content_type='application/json')
+                latencies.append(time.perf_counter() - start)
+                statuses.append(response.status_code)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(session_worker(AsyncClient()) for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - start
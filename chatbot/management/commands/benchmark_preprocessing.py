@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from chatbot.ml_models import TextNormalizer
+import random
+import time
+
+SAMPLE_MESSAGES = [
+    "I feel really anxious about my exams",
+    "I'm so depressed and nothing matters",
+    "Life is great and I'm feeling amazing!!!",
+    "I can't sleep, I won't stop worrying and I don't know why??",
+    "im stressed about work and studies",
+    "check this out http://example.com/help @friend #mentalhealth",
+    "Sometimes I think about ending it all...",
+    "My mood keeps changing rapidly   and I feel   empty",
+]
+
+class Command(BaseCommand):
+    help = 'Benchmark chat text preprocessing (reference vs compiled normalizer)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Number of messages to normalize (default: 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Repetitions per implementation, the best run is reported (default: 3)',
+        )
+    
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = max(1, options['repeat'])
+        
+        rng = random.Random(42)
+        corpus = [rng.choice(SAMPLE_MESSAGES) for _ in range(rows)]
+        normalizer = TextNormalizer()
+        
+        implementations = [
+            ('reference (7 passes)', lambda: [TextNormalizer.reference(text) for text in corpus]),
+            ('normalize', lambda: [normalizer.normalize(text) for text in corpus]),
+            ('normalize_many', lambda: normalizer.normalize_many(corpus)),
+        ]
+        
+        self.stdout.write(f'Normalizing {rows} messages, best of {repeat} runs...')
+        
+        expected = None
+        baseline = None
+        for name, run in implementations:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = run()
+                best = min(best, time.perf_counter() - start)
+            
+            if expected is None:
+                expected = result
+                baseline = best
+            elif result != expected:
+                self.stdout.write(self.style.ERROR(f'{name}: output differs from reference!'))
+                continue
+            
+            self.stdout.write(
+                f'  {name:<22} {best * 1000:9.1f} ms  '
+                f'{rows / best:12,.0f} rows/s  {baseline / best:5.2f}x'
+            )
+        
+        self.stdout.write(self.style.SUCCESS('Benchmark completed.'))
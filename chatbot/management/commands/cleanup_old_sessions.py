@@ -2,8 +2,9 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from chatbot.models import UserSession, Conversation, Message, MoodEntry
+from chatbot.models import UserSession, Conversation, Message, MoodEntry, MentalHealthAssessment, UserPreference
 from django.db import transaction
+import time
 
 class Command(BaseCommand):
     help = 'Clean up old anonymous user sessions and associated data'
@@ -20,10 +21,24 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Sessions per batch, and rows per DELETE of messages (default: 500)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Seconds to pause after each transaction so live traffic can write (default: 0.1)',
+        )
     
     def handle(self, *args, **options):
         days = options['days']
         dry_run = options['dry_run']
+        self.batch_size = max(1, options['batch_size'])
+        self.sleep = max(0.0, options['sleep'])
         cutoff_date = timezone.now() - timedelta(days=days)
         
         self.stdout.write(
@@ -42,39 +57,99 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('No old sessions found to cleanup.'))
             return
         
-        # Count related objects
-        conversation_count = Conversation.objects.filter(session__in=old_sessions).count()
-        message_count = Message.objects.filter(conversation__session__in=old_sessions).count()
-        mood_entry_count = MoodEntry.objects.filter(session__in=old_sessions).count()
-        
-        self.stdout.write(f'Found for cleanup:')
-        self.stdout.write(f'  - {session_count} old sessions')
-        self.stdout.write(f'  - {conversation_count} conversations')
-        self.stdout.write(f'  - {message_count} messages')
-        self.stdout.write(f'  - {mood_entry_count} mood entries')
-        
         if dry_run:
+            # Counting related rows joins every old session, so only dry runs pay for it
+            conversation_count = Conversation.objects.filter(session__in=old_sessions).count()
+            message_count = Message.objects.filter(conversation__session__in=old_sessions).count()
+            mood_entry_count = MoodEntry.objects.filter(session__in=old_sessions).count()
+            
+            self.stdout.write(f'Found for cleanup:')
+            self.stdout.write(f'  - {session_count} old sessions')
+            self.stdout.write(f'  - {conversation_count} conversations')
+            self.stdout.write(f'  - {message_count} messages')
+            self.stdout.write(f'  - {mood_entry_count} mood entries')
             self.stdout.write(
                 self.style.WARNING('DRY RUN: No data was actually deleted.')
             )
             return
         
-        # Confirm deletion
-        confirm = input('Are you sure you want to delete this data? (yes/no): ')
-        if confirm.lower() != 'yes':
-            self.stdout.write('Cleanup cancelled.')
-            return
+        self.stdout.write(f'Deleting {session_count} old sessions in batches of {self.batch_size}...')
         
+        # Sessions are taken in id order and each batch is deleted children first, each
+        # DELETE in its own short transaction. A run that is stopped leaves no orphans,
+        # and running the command again carries on where it stopped.
+        self.deleted = {'sessions': 0, 'conversations': 0, 'messages': 0, 'other': 0}
+        self.started = time.monotonic()
+        last_id = 0
         try:
-            with transaction.atomic():
-                # Delete will cascade to related objects
-                deleted_count = old_sessions.delete()[0]
+            while True:
+                session_ids = list(
+                    old_sessions.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:self.batch_size]
+                )
+                if not session_ids:
+                    break
                 
-            self.stdout.write(
-                self.style.SUCCESS(f'Successfully deleted {deleted_count} old sessions and related data.')
-            )
-            
+                self.delete_sessions(session_ids)
+                last_id = session_ids[-1]
+                self.report_progress(session_count, last_id)
+        
         except Exception as e:
             self.stdout.write(
-                self.style.ERROR(f'Error during cleanup: {str(e)}')
-            )
\ No newline at end of file
+                self.style.ERROR(f'Error during cleanup after session id {last_id}: {str(e)}')
+            )
+            self.stdout.write('Deleted batches are committed; run the command again to continue.')
+            return
+        
+        elapsed = time.monotonic() - self.started
+        total_rows = sum(self.deleted.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully deleted {self.deleted["sessions"]} old sessions and related data '
+                f'({total_rows} rows in {elapsed:.1f}s, {total_rows / max(elapsed, 1e-9):.0f} rows/s).'
+            )
+        )
+    
+    def delete_sessions(self, session_ids):
+        """Delete a batch of sessions bottom-up with bulk DELETEs that skip the ORM collector"""
+        conversation_ids = list(
+            Conversation.objects.filter(session_id__in=session_ids).values_list('pk', flat=True)
+        )
+        
+        # Messages are the bulk of the data, so they go in bounded chunks
+        for start in range(0, len(conversation_ids), self.batch_size):
+            chunk = conversation_ids[start:start + self.batch_size]
+            while True:
+                message_ids = list(
+                    Message.objects.filter(conversation_id__in=chunk).values_list('pk', flat=True)[:self.batch_size]
+                )
+                if not message_ids:
+                    break
+                with transaction.atomic():
+                    self.deleted['messages'] += self.raw_delete(Message.objects.filter(pk__in=message_ids))
+                self.throttle()
+        
+        # Everything else that points at the sessions (keep in step with models.py), then the sessions
+        with transaction.atomic():
+            for model in (MoodEntry, MentalHealthAssessment, UserPreference):
+                self.deleted['other'] += self.raw_delete(model.objects.filter(session_id__in=session_ids))
+            self.deleted['conversations'] += self.raw_delete(Conversation.objects.filter(pk__in=conversation_ids))
+            self.deleted['sessions'] += self.raw_delete(UserSession.objects.filter(pk__in=session_ids))
+        self.throttle()
+    
+    def raw_delete(self, queryset):
+        # One DELETE statement: no rows are loaded and no cascade is collected
+        return queryset._raw_delete(queryset.db)
+    
+    def throttle(self):
+        if self.sleep:
+            time.sleep(self.sleep)
+    
+    def report_progress(self, session_count, last_id):
+        elapsed = time.monotonic() - self.started
+        total_rows = sum(self.deleted.values())
+        self.stdout.write(
+            f'  {self.deleted["sessions"]}/{session_count} sessions, '
+            f'{self.deleted["conversations"]} conversations, {self.deleted["messages"]} messages, '
+            f'{self.deleted["other"]} other rows; {total_rows / max(elapsed, 1e-9):.0f} rows/s '
+            f'(last session id {last_id})'
+        )
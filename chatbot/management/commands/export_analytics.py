@@ -1,11 +1,52 @@
 # chatbot/management/commands/export_analytics.py
-from django.core.management.base import BaseCommand
-from django.db.models import Count, Avg
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from datetime import timedelta
-from chatbot.models import *
+from collections import Counter
+from chatbot.models import Message, MoodEntry, MentalHealthAssessment
+from chatbot.analytics import period_rollups, day_start
 import csv
 import json
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Row-level datasets: name -> (queryset, date field, [(field, type)]). Nothing that
+# identifies a person leaves the database: no ids, sessions or free text.
+ROW_DATASETS = {
+    'predictions': (
+        lambda: Message.objects.filter(predicted_condition__isnull=False),
+        'timestamp',
+        [('timestamp', 'timestamp'), ('predicted_condition', 'string'), ('confidence_score', 'double'), ('risk_level', 'string')],
+    ),
+    'mood_entries': (
+        lambda: MoodEntry.objects.all(),
+        'created_at',
+        [('created_at', 'timestamp'), ('mood', 'string'), ('intensity', 'int64')],
+    ),
+    'assessments': (
+        lambda: MentalHealthAssessment.objects.all(),
+        'created_at',
+        [('created_at', 'timestamp'), ('total_score', 'int64'), ('risk_level', 'string'), ('responses', 'json')],
+    ),
+}
+
+def arrow_schema(columns):
+    """Fixed Parquet schema, so every day and row group has the same column types"""
+    def arrow_type(kind):
+        if kind == 'timestamp':
+            return pyarrow.timestamp('us', tz='UTC')
+        if kind == 'json':
+            return pyarrow.string()
+        return pyarrow.type_for_alias(kind)
+    return pyarrow.schema([(name, arrow_type(kind)) for name, kind in columns])
+
+def json_default(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
 
 class Command(BaseCommand):
     help = 'Export analytics data for Moodigo usage analysis'
@@ -13,14 +54,25 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             '--format',
-            choices=['csv', 'json'],
+            choices=['csv', 'json', 'ndjson', 'parquet'],
             default='csv',
-            help='Export format (csv or json)',
+            help='Export format: csv or json for the summary, ndjson or parquet for anonymized rows',
         )
         parser.add_argument(
             '--output',
             type=str,
-            help='Output file path',
+            help='Output file path (a directory for ndjson and parquet)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched and written at a time in row exports (default: 2000)',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='In row exports, keep day partitions already written by an earlier run',
         )
         parser.add_argument(
             '--days',
@@ -36,6 +88,10 @@ class Command(BaseCommand):
         
         cutoff_date = timezone.now() - timedelta(days=days)
         
+        if format_type in ('ndjson', 'parquet'):
+            self.export_rows(format_type, output_file, days, max(1, options['chunk_size']), options['resume'])
+            return
+        
         self.stdout.write(f'Generating analytics for last {days} days...')
         
         try:
@@ -58,69 +114,60 @@ class Command(BaseCommand):
             )
     
     def gather_analytics(self, cutoff_date):
-        """Gather anonymized analytics data"""
+        """Gather anonymized analytics data from the daily rollups
         
-        # Basic usage statistics
-        total_sessions = UserSession.objects.filter(created_at__gte=cutoff_date).count()
-        total_conversations = Conversation.objects.filter(created_at__gte=cutoff_date).count()
-        total_messages = Message.objects.filter(timestamp__gte=cutoff_date).count()
-        
-        # User engagement
-        avg_messages_per_conversation = Message.objects.filter(
-            timestamp__gte=cutoff_date
-        ).count() / max(total_conversations, 1)
+        Nothing is written: days rollup_analytics has not done yet, and the
+        partial days at both ends of the period, come from the raw rows.
+        """
+        now = timezone.now()
         
-        # Mood tracking
-        mood_entries = MoodEntry.objects.filter(created_at__gte=cutoff_date)
-        total_mood_entries = mood_entries.count()
+        totals = {
+            'sessions': 0, 'conversations': 0, 'messages': 0,
+            'mood_entries': 0, 'mood_intensity_sum': 0,
+            'assessments': 0, 'assessment_score_sum': 0,
+        }
+        mood_distribution = Counter()
+        prediction_distribution = Counter()
+        risk_distribution = Counter()
         
-        if total_mood_entries > 0:
-            avg_mood_intensity = mood_entries.aggregate(Avg('intensity'))['intensity__avg']
-            mood_distribution = dict(mood_entries.values('mood').annotate(count=Count('mood')).values_list('mood', 'count'))
-        else:
-            avg_mood_intensity = 0
-            mood_distribution = {}
+        # One row per day, however many raw rows the period holds
+        for rollup in period_rollups(cutoff_date, now):
+            for field in totals:
+                totals[field] += getattr(rollup, field)
+            mood_distribution.update(rollup.mood_distribution)
+            prediction_distribution.update(rollup.prediction_distribution)
+            risk_distribution.update(rollup.risk_distribution)
         
-        # AI predictions (anonymized)
-        ai_predictions = Message.objects.filter(
-            timestamp__gte=cutoff_date,
-            predicted_condition__isnull=False
-        ).values('predicted_condition').annotate(count=Count('predicted_condition'))
+        # User engagement
+        avg_messages_per_conversation = totals['messages'] / max(totals['conversations'], 1)
         
-        prediction_distribution = {pred['predicted_condition']: pred['count'] for pred in ai_predictions}
+        # Mood tracking
+        avg_mood_intensity = totals['mood_intensity_sum'] / totals['mood_entries'] if totals['mood_entries'] else 0
         
         # Mental health assessments
-        assessments = MentalHealthAssessment.objects.filter(created_at__gte=cutoff_date)
-        total_assessments = assessments.count()
-        
-        if total_assessments > 0:
-            risk_distribution = dict(assessments.values('risk_level').annotate(count=Count('risk_level')).values_list('risk_level', 'count'))
-            avg_assessment_score = assessments.aggregate(Avg('total_score'))['total_score__avg']
-        else:
-            risk_distribution = {}
-            avg_assessment_score = 0
+        avg_assessment_score = totals['assessment_score_sum'] / totals['assessments'] if totals['assessments'] else 0
         
         return {
-            'period_days': (timezone.now() - cutoff_date).days,
-            'generated_at': timezone.now().isoformat(),
+            'period_days': (now - cutoff_date).days,
+            'generated_at': now.isoformat(),
             'usage_statistics': {
-                'total_sessions': total_sessions,
-                'total_conversations': total_conversations,
-                'total_messages': total_messages,
+                'total_sessions': totals['sessions'],
+                'total_conversations': totals['conversations'],
+                'total_messages': totals['messages'],
                 'avg_messages_per_conversation': round(avg_messages_per_conversation, 2),
             },
             'mood_tracking': {
-                'total_mood_entries': total_mood_entries,
-                'avg_mood_intensity': round(avg_mood_intensity or 0, 2),
-                'mood_distribution': mood_distribution,
+                'total_mood_entries': totals['mood_entries'],
+                'avg_mood_intensity': round(avg_mood_intensity, 2),
+                'mood_distribution': dict(mood_distribution),
             },
             'ai_predictions': {
-                'prediction_distribution': prediction_distribution,
+                'prediction_distribution': dict(prediction_distribution),
             },
             'assessments': {
-                'total_assessments': total_assessments,
-                'risk_distribution': risk_distribution,
-                'avg_assessment_score': round(avg_assessment_score or 0, 2),
+                'total_assessments': totals['assessments'],
+                'risk_distribution': dict(risk_distribution),
+                'avg_assessment_score': round(avg_assessment_score, 2),
             }
         }
     
@@ -179,4 +226,93 @@ class Command(BaseCommand):
             with open(output_file, 'w') as jsonfile:
                 json.dump(data, jsonfile, indent=2, default=str)
         else:
-            self.stdout.write(json.dumps(data, indent=2, default=str))
\ No newline at end of file
+            self.stdout.write(json.dumps(data, indent=2, default=str))
+    
+    def export_rows(self, format_type, output_dir, days, chunk_size, resume):
+        """Stream anonymized rows into one file per dataset and day
+        
+        Files are laid out as <output>/<dataset>/date=YYYY-MM-DD/part-0.<ext>,
+        the partitioning pandas, pyarrow and Spark read as a date column.
+        Each day is one short query read with iterator(chunk_size) and
+        written chunk by chunk, so memory stays bounded by the chunk size.
+        Every file is written under a temporary name and renamed when
+        complete: with --resume, finished days are skipped, and today is
+        always rewritten since it is still growing.
+        """
+        if not output_dir:
+            raise CommandError(f'--output must name a directory for {format_type} exports')
+        if format_type == 'parquet' and pyarrow is None:
+            raise CommandError('Parquet export needs the pyarrow package; use --format ndjson or install pyarrow')
+        
+        today = timezone.localdate()
+        first_day = today - timedelta(days=days)
+        extension = 'parquet' if format_type == 'parquet' else 'ndjson'
+        self.stdout.write(f'Exporting rows for {days + 1} days to {output_dir}...')
+        
+        for dataset, (queryset_factory, date_field, columns) in ROW_DATASETS.items():
+            fields = [name for name, _ in columns]
+            rows_written = 0
+            days_skipped = 0
+            day = first_day
+            while day <= today:
+                path = os.path.join(output_dir, dataset, f'date={day.isoformat()}', f'part-0.{extension}')
+                if resume and day < today and os.path.exists(path):
+                    days_skipped += 1
+                else:
+                    rows = queryset_factory().filter(**{
+                        f'{date_field}__gte': day_start(day),
+                        f'{date_field}__lt': day_start(day + timedelta(days=1)),
+                    }).order_by(date_field).values_list(*fields).iterator(chunk_size=chunk_size)
+                    rows_written += self._write_partition(path, format_type, columns, rows, chunk_size)
+                day += timedelta(days=1)
+            
+            self.stdout.write(f'  {dataset}: {rows_written} rows written, {days_skipped} finished days skipped')
+        
+        self.stdout.write(self.style.SUCCESS(f'Rows exported successfully to {output_dir}!'))
+    
+    def _write_partition(self, path, format_type, columns, rows, chunk_size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp'
+        if format_type == 'parquet':
+            count = self._write_parquet(temp_path, columns, rows, chunk_size)
+        else:
+            count = self._write_ndjson(temp_path, columns, rows)
+        os.replace(temp_path, path)
+        return count
+    
+    def _write_ndjson(self, path, columns, rows):
+        fields = [name for name, _ in columns]
+        count = 0
+        with open(path, 'w') as ndjson_file:
+            for row in rows:
+                ndjson_file.write(json.dumps(dict(zip(fields, row)), default=json_default))
+                ndjson_file.write('\n')
+                count += 1
+        return count
+    
+    def _write_parquet(self, path, columns, rows, chunk_size):
+        schema = arrow_schema(columns)
+        json_columns = {index for index, (_, kind) in enumerate(columns) if kind == 'json'}
+        
+        def write_chunk(writer, chunk):
+            values = list(zip(*chunk)) if chunk else [()] * len(columns)
+            arrays = [
+                pyarrow.array([json.dumps(value) for value in column] if index in json_columns else column, type=field.type)
+                for index, (column, field) in enumerate(zip(values, schema))
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        
+        # Each chunk becomes one row group, so only one chunk is ever held in memory
+        count = 0
+        chunk = []
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    write_chunk(writer, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk or count == 0:
+                write_chunk(writer, chunk)
+                count += len(chunk)
+        return count
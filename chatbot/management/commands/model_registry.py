@@ -0,0 +1,92 @@
+# chatbot/management/commands/model_registry.py
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from chatbot.ml_models import ModelRegistry, DEFAULT_MODELS_DIR
+
+class Command(BaseCommand):
+    help = 'Publish, promote and roll back versions of the ML models served by the web workers'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['list', 'publish', 'promote', 'rollback', 'verify'],
+            help='list versions, publish the trained models as a new version, promote or verify a version, or roll back',
+        )
+        parser.add_argument(
+            'version',
+            nargs='?',
+            help='Version to promote or verify',
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='Directory holding the trained models to publish (default: ML_MODELS_DIR setting)',
+        )
+        parser.add_argument(
+            '--note',
+            type=str,
+            default='',
+            help='Free-form note stored with a published version',
+        )
+        parser.add_argument(
+            '--promote',
+            action='store_true',
+            help='Promote the version right after publishing it',
+        )
+        parser.add_argument(
+            '--registry-dir',
+            type=str,
+            help='Registry location (default: ML_MODEL_REGISTRY_DIR setting)',
+        )
+    
+    def handle(self, *args, **options):
+        registry_dir = options['registry_dir'] or getattr(settings, 'ML_MODEL_REGISTRY_DIR', None)
+        if not registry_dir:
+            raise CommandError('No registry configured. Set ML_MODEL_REGISTRY_DIR or pass --registry-dir.')
+        registry = ModelRegistry(registry_dir)
+        action = options['action']
+        
+        try:
+            if action == 'list':
+                self.list_versions(registry)
+            elif action == 'publish':
+                source = options['source'] or getattr(settings, 'ML_MODELS_DIR', DEFAULT_MODELS_DIR)
+                info = registry.publish(source, metadata={'note': options['note']})
+                self.stdout.write(self.style.SUCCESS(
+                    f"Published version {info['version']} ({len(info['checksums'])} files) from {source}."
+                ))
+                if options['promote']:
+                    registry.promote(info['version'])
+                    self.stdout.write(self.style.SUCCESS(f"Promoted version {info['version']}."))
+            elif action == 'promote':
+                if not options['version']:
+                    raise CommandError('promote needs a version, see "model_registry list".')
+                registry.promote(options['version'])
+                self.stdout.write(self.style.SUCCESS(f"Promoted version {options['version']}."))
+            elif action == 'rollback':
+                version = registry.rollback()
+                self.stdout.write(self.style.SUCCESS(f"Rolled back to version {version}."))
+            elif action == 'verify':
+                version = options['version'] or registry.active_version()
+                if not version:
+                    raise CommandError('No version given and no active version to verify.')
+                registry.verify(version)
+                self.stdout.write(self.style.SUCCESS(f"Version {version} matches its checksums."))
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+        
+        if action in ('publish', 'promote', 'rollback') and registry.active_version():
+            interval = getattr(settings, 'ML_MODEL_RELOAD_INTERVAL', 30)
+            self.stdout.write(f'Web workers pick up the active version within {interval}s.')
+    
+    def list_versions(self, registry):
+        versions = registry.versions()
+        if not versions:
+            self.stdout.write(self.style.WARNING(f'No versions published in {registry.root}.'))
+            return
+        
+        active = registry.active_version()
+        for info in versions:
+            marker = '*' if info['version'] == active else ' '
+            note = info['metadata'].get('note') or ''
+            self.stdout.write(f"{marker} {info['version']}  {info['created_at']}  {note}".rstrip())
@@ -0,0 +1,36 @@
+# chatbot/management/commands/rollup_analytics.py
+from django.core.management.base import BaseCommand
+from chatbot.analytics import update_rollups
+import time
+
+class Command(BaseCommand):
+    help = 'Update the daily analytics rollups with every day not rolled up yet'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-today',
+            action='store_true',
+            help='Also roll up today so far; it is recomputed on the next run',
+        )
+        parser.add_argument(
+            '--rebuild-days',
+            type=int,
+            default=0,
+            help='Recompute the last N days even if already rolled up (default: 0)',
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write('Updating daily analytics rollups...')
+        
+        started = time.monotonic()
+        days = update_rollups(
+            include_today=options['include_today'],
+            rebuild_days=max(0, options['rebuild_days'])
+        )
+        
+        if days == 0:
+            self.stdout.write(self.style.SUCCESS('Rollups are already up to date.'))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Rolled up {days} days in {time.monotonic() - started:.1f}s.')
+            )
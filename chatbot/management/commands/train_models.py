@@ -1,8 +1,9 @@
 # chatbot/management/commands/train_models.py
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from chatbot.ml_models import MoodigoAI
+from chatbot.ml_models import MoodigoAI, DEFAULT_MODELS_DIR
 import os
+import shutil
 
 class Command(BaseCommand):
     help = 'Train and initialize ML models for Moodigo'
@@ -23,17 +24,72 @@ class Command(BaseCommand):
             action='store_true',
             help='Retrain models even if they already exist',
         )
+        parser.add_argument(
+            '--survey-label-column',
+            type=str,
+            default='Risk Level',
+            help='Survey dataset column holding the risk level label (default: "Risk Level")',
+        )
+        parser.add_argument(
+            '--cv',
+            type=int,
+            default=5,
+            help='Cross-validation folds for survey model selection (default: 5)',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            help='Worker processes for survey model selection (default: all cores)',
+        )
+        parser.add_argument(
+            '--text-column',
+            type=str,
+            default='statement',
+            help='NLP dataset column holding the text (default: statement)',
+        )
+        parser.add_argument(
+            '--label-column',
+            type=str,
+            default='status',
+            help='NLP dataset column holding the label (default: status)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Rows read per chunk when streaming the NLP dataset (default: 10000)',
+        )
+        parser.add_argument(
+            '--holdout',
+            type=float,
+            default=0.1,
+            help='Fraction of NLP rows held out for accuracy (default: 0.1)',
+        )
+        parser.add_argument(
+            '--epochs',
+            type=int,
+            default=1,
+            help='Passes over the NLP dataset (default: 1)',
+        )
+        parser.add_argument(
+            '--models-dir',
+            type=str,
+            help='Directory for model pickles and artifacts (default: ML_MODELS_DIR setting)',
+        )
     
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting ML model training...'))
         
         try:
             # Initialize AI service
-            moodigo_ai = MoodigoAI()
+            models_dir = options['models_dir'] or getattr(settings, 'ML_MODELS_DIR', DEFAULT_MODELS_DIR)
+            # Created before training, so a long run cannot fail when saving
+            os.makedirs(models_dir, exist_ok=True)
+            moodigo_ai = MoodigoAI(models_dir=models_dir)
             
             # Check if models already exist
-            survey_model_exists = os.path.exists('mental_health_model.pkl')
-            nlp_model_exists = os.path.exists('best_fast_mental_health_model.pkl')
+            survey_model_exists = os.path.exists(moodigo_ai.survey_model.pickle_path)
+            nlp_model_exists = os.path.exists(moodigo_ai.nlp_model.pickle_path)
             
             if (survey_model_exists and nlp_model_exists) and not options['retrain']:
                 self.stdout.write(
@@ -44,24 +100,54 @@ class Command(BaseCommand):
             # Train survey model if data provided
             if options['survey_data']:
                 self.stdout.write('Training survey-based model...')
-                # Here you would implement the training logic from your first model
-                self.stdout.write(self.style.SUCCESS('Survey model training completed.'))
+                cv_scores = moodigo_ai.survey_model.train_model_selection(
+                    options['survey_data'],
+                    label_column=options['survey_label_column'],
+                    cv=options['cv'],
+                    n_jobs=options['jobs']
+                )
+                moodigo_ai.survey_model.save_model(cv_scores=cv_scores)
+                
+                for name, accuracy in sorted(cv_scores.items(), key=lambda item: -item[1]):
+                    self.stdout.write(f'  - {name}: {accuracy:.4f}')
+                self.stdout.write(self.style.SUCCESS(
+                    f'Survey model training completed. Selected {moodigo_ai.survey_model.model_name} '
+                    f'({moodigo_ai.survey_model.accuracy:.4f} cross-validated accuracy).'
+                ))
             else:
                 self.stdout.write(
                     self.style.WARNING('No survey data provided. Creating demo survey model.')
                 )
-                moodigo_ai.survey_model.initialize_model()
+                moodigo_ai.survey_model.initialize_model(use_artifact=False)
             
             # Train NLP model if data provided
             if options['nlp_data']:
                 self.stdout.write('Training NLP model...')
-                # Here you would implement the training logic from your second model
+                stats = moodigo_ai.nlp_model.train_streaming(
+                    options['nlp_data'],
+                    text_column=options['text_column'],
+                    label_column=options['label_column'],
+                    chunk_size=options['chunk_size'],
+                    holdout_fraction=options['holdout'],
+                    epochs=options['epochs'],
+                    progress=self.report_progress
+                )
+                moodigo_ai.nlp_model.save_model(accuracy=stats['accuracy'])
+                
+                self.stdout.write(f"  - {stats['train_rows']} training rows, {stats['holdout_rows']} held out, {stats['skipped_rows']} skipped")
+                self.stdout.write(f"  - {stats['seconds']:.1f}s ({stats['rows_per_second']:,.0f} rows/s)")
+                if stats['accuracy'] is not None:
+                    self.stdout.write(f"  - Held-out accuracy: {stats['accuracy']:.4f}")
                 self.stdout.write(self.style.SUCCESS('NLP model training completed.'))
             else:
                 self.stdout.write(
                     self.style.WARNING('No NLP data provided. Creating demo NLP model.')
                 )
-                moodigo_ai.nlp_model.initialize_model()
+                moodigo_ai.nlp_model.initialize_model(use_artifact=False)
+            
+            # Export memory-mapped artifacts so web workers can share them without scikit-learn
+            self.export_artifact('survey model', moodigo_ai.survey_model.save_artifact, moodigo_ai.survey_model.artifact_path)
+            self.export_artifact('NLP scorer', moodigo_ai.nlp_model.export_scorer, moodigo_ai.nlp_model.artifact_path)
             
             # Initialize both models
             moodigo_ai.initialize()
@@ -73,4 +159,22 @@ class Command(BaseCommand):
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error during model training: {str(e)}')
-            )
\ No newline at end of file
+            )
+    
+    def export_artifact(self, name, export, path):
+        """Export one model artifact, removing a stale one if the model cannot be exported"""
+        self.stdout.write(f'Exporting {name} artifact...')
+        try:
+            manifest = export()
+            self.stdout.write(self.style.SUCCESS(f"Exported {name} artifact {manifest['version']} to {path}."))
+        except ValueError as e:
+            # A stale artifact would shadow the model that was just trained
+            shutil.rmtree(path, ignore_errors=True)
+            self.stdout.write(self.style.WARNING(f'Skipped {name} artifact: {e}'))
+    
+    def report_progress(self, stats):
+        """Print streaming training progress"""
+        self.stdout.write(
+            f"  epoch {stats['epoch']}: {stats['rows']:,} rows read "
+            f"({stats['rows_per_second']:,.0f} rows/s)"
+        )
\ No newline at end of file
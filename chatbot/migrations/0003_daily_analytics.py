@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAnalytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('conversations', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('prediction_distribution', models.JSONField(default=dict)),
+                ('mood_entries', models.PositiveIntegerField(default=0)),
+                ('mood_intensity_sum', models.PositiveIntegerField(default=0)),
+                ('mood_distribution', models.JSONField(default=dict)),
+                ('assessments', models.PositiveIntegerField(default=0)),
+                ('assessment_score_sum', models.IntegerField(default=0)),
+                ('risk_distribution', models.JSONField(default=dict)),
+                ('is_complete', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily analytics',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
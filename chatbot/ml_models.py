@@ -4,97 +4,605 @@ import numpy as np
 import pickle
 import re
 import os
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from collections import Counter
+import json
+import time
+import hashlib
+import asyncio
+import functools
+import queue
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import Counter, OrderedDict, deque
 import warnings
 
 warnings.filterwarnings('ignore')
 
+# Default location of trained models, overridden by the ML_MODELS_DIR setting
+DEFAULT_MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml_models')
+
+# Bumped whenever the artifact layout changes incompatibly
+ARTIFACT_FORMAT = 1
+
+def save_artifact(directory, kind, arrays, metadata):
+    """Write a model artifact directory: one .npy file per array plus manifest.json
+    
+    The artifact is written next to its final location and swapped in with a
+    rename, so readers never see a half-written artifact. Processes that
+    still map the previous files keep using them until they reload.
+    """
+    directory = os.path.abspath(directory)
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{os.path.basename(directory)}-', dir=parent)
+    os.chmod(staging, 0o755)
+    
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'kind': kind,
+        'version': datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f'),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'metadata': metadata,
+        'arrays': {}
+    }
+    for name, array in arrays.items():
+        filename = f'{name}.npy'
+        np.save(os.path.join(staging, filename), np.ascontiguousarray(array), allow_pickle=False)
+        manifest['arrays'][name] = filename
+    
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    if os.path.exists(directory):
+        retired = staging + '.old'
+        os.replace(directory, retired)
+        os.replace(staging, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging, directory)
+    
+    return manifest
+
+def load_artifact(directory, kind=None):
+    """Read an artifact written by save_artifact with its arrays memory-mapped"""
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    
+    if manifest.get('format', 0) > ARTIFACT_FORMAT:
+        raise ValueError(f"Artifact format {manifest['format']} is newer than supported format {ARTIFACT_FORMAT}")
+    if kind is not None and manifest.get('kind') != kind:
+        raise ValueError(f"Expected a {kind} artifact, found {manifest.get('kind')}")
+    
+    # Read-only maps are shared through the page cache by every worker process
+    arrays = {
+        name: np.load(os.path.join(directory, filename), mmap_mode='r', allow_pickle=False)
+        for name, filename in manifest['arrays'].items()
+    }
+    return manifest, arrays
+
+def artifact_exists(directory):
+    """True if directory holds a model artifact"""
+    return os.path.exists(os.path.join(directory, 'manifest.json'))
+
+class CompiledForest:
+    """RandomForestClassifier flattened into NumPy arrays for fast batch scoring
+    
+    All trees share one set of node arrays. Leaves point to themselves with an
+    infinite threshold, so every row can walk every tree in lockstep for
+    max_depth steps without checking for leaves.
+    """
+    
+    MODEL_TYPE = 'random_forest'
+    
+    # Rows scored per step, bounds the (rows x trees) working arrays
+    CHUNK_SIZE = 256
+    
+    def __init__(self, feature, threshold, children, leaf_values, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * node + went_left] picks the next node without a np.where
+        self.children = children
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+    
+    @classmethod
+    def from_estimator(cls, forest):
+        """Compile a fitted RandomForestClassifier"""
+        features, thresholds, children, values, roots = [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            node_ids = np.arange(tree.node_count, dtype=np.int64) + offset
+            
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(np.stack([
+                np.where(is_leaf, node_ids, tree.children_right + offset),
+                np.where(is_leaf, node_ids, tree.children_left + offset)
+            ], axis=1).ravel())
+            
+            # Normalize node class counts to probabilities like DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0.0] = 1.0
+            values.append(value / totals)
+            
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+        
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            leaf_values=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int64),
+            max_depth=int(max_depth),
+            classes=np.asarray(forest.classes_)
+        )
+    
+    def to_arrays(self):
+        """Return (arrays, metadata) for save_artifact"""
+        arrays = {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'children': self.children,
+            'leaf_values': self.leaf_values,
+            'roots': self.roots,
+            'classes': self.classes_.astype(str)
+        }
+        return arrays, {'max_depth': self.max_depth}
+    
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        """Rebuild from the output of to_arrays(), arrays may be memory-mapped"""
+        return cls(
+            feature=arrays['feature'],
+            threshold=arrays['threshold'],
+            children=arrays['children'],
+            leaf_values=arrays['leaf_values'],
+            roots=arrays['roots'],
+            max_depth=metadata['max_depth'],
+            classes=arrays['classes'].astype(object)
+        )
+    
+    def predict_proba(self, X):
+        """Average leaf probabilities of all trees for each row of X"""
+        # sklearn evaluates trees on float32 inputs, cast the same way for identical splits
+        X = np.asarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        probabilities = np.empty((n_rows, self.leaf_values.shape[1]), dtype=np.float64)
+        
+        for start in range(0, n_rows, self.CHUNK_SIZE):
+            chunk = X[start:start + self.CHUNK_SIZE]
+            flat = chunk.ravel()
+            row_offsets = (np.arange(len(chunk)) * n_features)[:, None]
+            nodes = np.tile(self.roots, (len(chunk), 1))
+            
+            for _ in range(self.max_depth):
+                go_left = flat[row_offsets + self.feature[nodes]] <= self.threshold[nodes]
+                nodes = self.children[2 * nodes + go_left]
+            
+            probabilities[start:start + len(chunk)] = self.leaf_values[nodes].mean(axis=1)
+        
+        return probabilities
+    
+    def predict(self, X):
+        """Predict the class with the highest averaged probability"""
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+class CompiledLinearModel:
+    """LogisticRegression (or log-loss SGDClassifier) reduced to its coefficients, scored with NumPy only"""
+    
+    MODEL_TYPE = 'linear'
+    
+    # SGDClassifier losses whose predict_proba is one-vs-rest logistic
+    LOGISTIC_SGD_LOSSES = ('log_loss', 'log')
+    
+    def __init__(self, coef, intercept, classes, multinomial):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes_ = classes
+        self.multinomial = multinomial
+    
+    @classmethod
+    def from_estimator(cls, model):
+        """Compile a fitted LogisticRegression or log-loss SGDClassifier"""
+        if hasattr(model, 'multi_class'):
+            # Same rule LogisticRegression.predict_proba uses to pick softmax over one-vs-rest
+            multinomial = not (
+                model.multi_class in ('ovr', 'warn') or (
+                    model.multi_class == 'auto'
+                    and (len(model.classes_) <= 2 or model.solver in ('liblinear', 'newton-cholesky'))
+                )
+            )
+        elif getattr(model, 'loss', None) in cls.LOGISTIC_SGD_LOSSES and hasattr(model, 'coef_'):
+            multinomial = False
+        else:
+            raise ValueError("Only LogisticRegression and log-loss SGDClassifier models can be compiled")
+        
+        return cls(
+            coef=np.asarray(model.coef_, dtype=np.float64),
+            intercept=np.asarray(model.intercept_, dtype=np.float64),
+            classes=np.asarray(model.classes_),
+            multinomial=multinomial
+        )
+    
+    def to_arrays(self):
+        """Return (arrays, metadata) for save_artifact"""
+        arrays = {'coef': self.coef, 'intercept': self.intercept, 'classes': self.classes_.astype(str)}
+        return arrays, {'multinomial': self.multinomial}
+    
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        """Rebuild from the output of to_arrays(), arrays may be memory-mapped"""
+        return cls(
+            coef=arrays['coef'],
+            intercept=arrays['intercept'],
+            classes=arrays['classes'].astype(object),
+            multinomial=metadata['multinomial']
+        )
+    
+    def decision_function(self, X):
+        """Linear scores, one column per coefficient row"""
+        return np.asarray(X, dtype=np.float64) @ self.coef.T + self.intercept
+    
+    def probabilities_from_scores(self, scores):
+        """Class probabilities, computed like LogisticRegression.predict_proba"""
+        if self.multinomial:
+            if scores.shape[1] == 1:
+                scores = np.hstack([-scores, scores])
+            scores = scores - scores.max(axis=1, keepdims=True)
+            probabilities = np.exp(scores)
+            probabilities /= probabilities.sum(axis=1, keepdims=True)
+            return probabilities
+        
+        probabilities = 1.0 / (1.0 + np.exp(-scores))
+        if probabilities.shape[1] == 1:
+            return np.hstack([1 - probabilities, probabilities])
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+    
+    def predict_proba(self, X):
+        """Class probabilities for each row of X"""
+        return self.probabilities_from_scores(self.decision_function(X))
+    
+    def predict(self, X):
+        """Predict the class with the highest probability"""
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+# Training data shared with model selection worker processes, set once per process
+_selection_data = {}
+
+def _init_selection_worker(X, y):
+    _selection_data['X'] = X
+    _selection_data['y'] = y
+
+def _score_candidate_fold(name, estimator, train_index, test_index):
+    """Fit one candidate on one cross-validation fold and return its accuracy"""
+    from sklearn.base import clone
+    X, y = _selection_data['X'], _selection_data['y']
+    model = clone(estimator).fit(X[train_index], y[train_index])
+    return name, float((model.predict(X[test_index]) == y[test_index]).mean())
+
+# Questions of the assessment page, in the order they are asked. Survey models
+# are trained on exactly these, with answers from 0 (never) to 4 (very often).
+ASSESSMENT_QUESTIONS = [
+    "How often do you feel nervous or anxious?",
+    "How often do you feel depressed or down?",
+    "How often do you have trouble sleeping?",
+    "How often do you feel overwhelmed by daily tasks?",
+    "How often do you feel hopeless about the future?",
+    "How often do you have difficulty concentrating?",
+    "How often do you feel tired or have little energy?",
+    "How often do you feel bad about yourself?",
+    "How often do you feel restless or fidgety?",
+    "How often do you have thoughts of self-harm?"
+]
+
 class MentalHealthPredictor:
     """Survey-based mental health risk prediction"""
     
-    def __init__(self):
+    ARTIFACT_NAME = 'survey_model'
+    PICKLE_NAME = 'mental_health_model.pkl'
+    COMPILED_TYPES = {CompiledForest.MODEL_TYPE: CompiledForest, CompiledLinearModel.MODEL_TYPE: CompiledLinearModel}
+    QUESTIONS = ASSESSMENT_QUESTIONS
+    
+    def __init__(self, models_dir=None):
+        self.models_dir = str(models_dir or DEFAULT_MODELS_DIR)
         self.model = None
+        self.compiled_model = None
         self.scaler = None
         self.model_name = None
         self.accuracy = 0
         self.mental_health_questions = []
+        self._question_index = {}
+    
+    @property
+    def artifact_path(self):
+        return os.path.join(self.models_dir, self.ARTIFACT_NAME)
+    
+    @property
+    def pickle_path(self):
+        return os.path.join(self.models_dir, self.PICKLE_NAME)
         
-    def initialize_model(self):
-        """Initialize with pre-trained model or create new one"""
-        try:
-            # Try to load existing model
-            with open('mental_health_model.pkl', 'rb') as f:
-                model_package = pickle.load(f)
-                self.model = model_package['model']
-                self.scaler = model_package.get('scaler')
-                self.model_name = model_package['model_name']
-                self.accuracy = model_package['accuracy']
-            print(f"Loaded existing model: {self.model_name}")
-        except FileNotFoundError:
-            # Create a basic model if file doesn't exist
+    def initialize_model(self, use_artifact=True, strict=False):
+        """Initialize with pre-trained model or create new one
+        
+        A model trained on other questions than QUESTIONS cannot score the
+        assessment, so it is refused: the demo model is used instead, or
+        ValueError is raised when strict.
+        """
+        if use_artifact and artifact_exists(self.artifact_path):
+            # Memory-mapped artifacts need neither pickle nor scikit-learn
+            self._load_artifact()
+            source = 'model artifact'
+        else:
+            try:
+                # Try to load existing model
+                with open(self.pickle_path, 'rb') as f:
+                    model_package = pickle.load(f)
+                    self.model = model_package['model']
+                    self.scaler = model_package.get('scaler')
+                    self.model_name = model_package['model_name']
+                    self.accuracy = model_package['accuracy']
+                    self.mental_health_questions = list(
+                        model_package.get('feature_names', getattr(self.model, 'feature_names_in_', []))
+                    )
+                source = 'existing model'
+            except FileNotFoundError:
+                # Create a basic model if file doesn't exist
+                self._create_basic_model()
+                self._prepare_model()
+                return
+        
+        mismatch = self.question_mismatch(self.mental_health_questions)
+        if mismatch is not None:
+            message = f"{self.model_name} was not trained on the assessment questions ({mismatch})"
+            if strict:
+                raise ValueError(message)
+            print(f"{message}, using the demo model instead")
             self._create_basic_model()
+        else:
+            print(f"Loaded {source}: {self.model_name}")
+        
+        if self.model is not None:
+            self._prepare_model()
+    
+    def question_mismatch(self, feature_names):
+        """Describe how feature_names differ from QUESTIONS, or None if they are the same questions"""
+        expected, actual = set(self.QUESTIONS), set(feature_names)
+        missing = [question for question in self.QUESTIONS if question not in actual]
+        unknown = [name for name in feature_names if name not in expected]
+        if not missing and not unknown:
+            return None
+        example = unknown[0] if unknown else missing[0]
+        return f"{len(missing)} questions missing, {len(unknown)} unknown features such as {example.strip()!r}"
+    
+    def _prepare_model(self):
+        """Precompute what predictions need from a freshly loaded or trained model"""
+        # Column positions are fixed once per model instead of per prediction
+        self._question_index = {question: i for i, question in enumerate(self.mental_health_questions)}
+        
+        # Forests and linear models are scored from flat arrays instead of the sklearn estimators
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.linear_model import LogisticRegression
+        if isinstance(self.model, RandomForestClassifier):
+            self.compiled_model = CompiledForest.from_estimator(self.model)
+        elif isinstance(self.model, LogisticRegression) and self.scaler is None:
+            self.compiled_model = CompiledLinearModel.from_estimator(self.model)
+        else:
+            self.compiled_model = None
+    
+    def _load_artifact(self):
+        manifest, arrays = load_artifact(self.artifact_path, kind='survey_model')
+        metadata = manifest['metadata']
+        
+        compiled_type = self.COMPILED_TYPES[metadata['model_type']]
+        self.compiled_model = compiled_type.from_arrays(arrays, metadata)
+        self.model = None
+        self.scaler = None
+        self.model_name = metadata['model_name']
+        self.accuracy = metadata['accuracy']
+        self.mental_health_questions = list(metadata['feature_names'])
+        self._question_index = {question: i for i, question in enumerate(self.mental_health_questions)}
+    
+    def save_artifact(self, path=None):
+        """Write the compiled model as a memory-mappable artifact"""
+        if self.compiled_model is None:
+            raise ValueError(f"{self.model_name} cannot be exported as an artifact")
+        
+        arrays, metadata = self.compiled_model.to_arrays()
+        metadata.update({
+            'model_type': self.compiled_model.MODEL_TYPE,
+            'model_name': self.model_name,
+            'accuracy': self.accuracy,
+            'feature_names': list(self.mental_health_questions)
+        })
+        return save_artifact(path or self.artifact_path, 'survey_model', arrays, metadata)
     
     def _create_basic_model(self):
         """Create a basic model for demonstration"""
         print("Creating basic model for demonstration...")
+        from sklearn.ensemble import RandomForestClassifier
         self.model = RandomForestClassifier(n_estimators=100, random_state=42)
+        self.scaler = None
         self.model_name = "Random Forest (Demo)"
         self.accuracy = 0.85
         
-        # Create dummy mental health questions
-        self.mental_health_questions = [
-            "Feeling nervous or anxious",
-            "Not being able to stop worrying",
-            "Feeling down or depressed",
-            "Little interest in doing things",
-            "Feeling tired or having little energy",
-            "Poor appetite or overeating",
-            "Feeling bad about yourself",
-            "Trouble concentrating",
-            "Moving or speaking slowly",
-            "Thoughts of self-harm"
-        ]
+        self.mental_health_questions = list(self.QUESTIONS)
         
-        # Train with dummy data for demo purposes
-        X_dummy = np.random.randint(0, 5, (100, len(self.mental_health_questions)))
-        y_dummy = np.random.choice(['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk'], 100)
+        # Dummy answers at every level, labelled by their total score so higher answers mean higher risk
+        rng = np.random.RandomState(42)
+        levels = rng.randint(0, 5, (400, 1))
+        X_dummy = np.clip(levels + rng.randint(-1, 2, (400, len(self.mental_health_questions))), 0, 4)
+        risk_levels = np.array(['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk'])
+        y_dummy = risk_levels[np.digitize(X_dummy.sum(axis=1), [10, 20, 30])]
         self.model.fit(X_dummy, y_dummy)
     
+    def candidate_models(self):
+        """Classifiers compared during model selection"""
+        from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier, GradientBoostingClassifier
+        from sklearn.linear_model import LogisticRegression
+        
+        return {
+            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
+            'Random Forest (shallow)': RandomForestClassifier(n_estimators=200, max_depth=8, min_samples_leaf=2, random_state=42),
+            'Extra Trees': ExtraTreesClassifier(n_estimators=200, random_state=42),
+            'Gradient Boosting': GradientBoostingClassifier(random_state=42),
+            'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
+        }
+    
+    def load_survey_data(self, csv_path, label_column):
+        """Load a survey CSV with compact dtypes: float32 answers and a categorical label"""
+        columns = pd.read_csv(csv_path, nrows=0).columns
+        if label_column not in columns:
+            raise ValueError(f"Label column '{label_column}' not found in {csv_path}")
+        
+        feature_names = [column for column in columns if column != label_column]
+        dtypes = {column: np.float32 for column in feature_names}
+        dtypes[label_column] = 'category'
+        
+        data = pd.read_csv(csv_path, dtype=dtypes)
+        data = data[data[label_column].notna()]
+        
+        # Unanswered questions count as 0, like missing responses in predict_risk
+        X = data[feature_names].fillna(0).to_numpy(dtype=np.float32)
+        y = data[label_column].astype(str).to_numpy()
+        return X, y, feature_names
+    
+    def train_model_selection(self, csv_path, label_column, cv=5, n_jobs=None, progress=None):
+        """Cross-validate candidate classifiers in parallel and keep the best one
+        
+        Every (candidate, fold) pair is fitted in a process pool with n_jobs
+        workers (all cores by default). The winner is refitted on all rows.
+        progress, if given, is called with (name, fold accuracy) as folds finish.
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from sklearn.model_selection import StratifiedKFold
+        
+        X, y, feature_names = self.load_survey_data(csv_path, label_column)
+        mismatch = self.question_mismatch(feature_names)
+        if mismatch is not None:
+            raise ValueError(f"Survey data columns must be the assessment questions ({mismatch})")
+        candidates = self.candidate_models()
+        folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=42).split(X, y))
+        
+        scores = {name: [] for name in candidates}
+        with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count(),
+                                 initializer=_init_selection_worker, initargs=(X, y)) as executor:
+            futures = [
+                executor.submit(_score_candidate_fold, name, estimator, train_index, test_index)
+                for name, estimator in candidates.items()
+                for train_index, test_index in folds
+            ]
+            for future in as_completed(futures):
+                name, accuracy = future.result()
+                scores[name].append(accuracy)
+                if progress is not None:
+                    progress(name, accuracy)
+        
+        mean_scores = {name: float(np.mean(fold_scores)) for name, fold_scores in scores.items()}
+        best_name = max(mean_scores, key=mean_scores.get)
+        
+        self.model = candidates[best_name].fit(X, y)
+        self.scaler = None
+        self.model_name = best_name
+        self.accuracy = mean_scores[best_name]
+        self.mental_health_questions = feature_names
+        self._prepare_model()
+        
+        return mean_scores
+    
+    def save_model(self, path=None, cv_scores=None):
+        """Write the current model as the package initialize_model loads"""
+        model_package = {
+            'model': self.model,
+            'scaler': self.scaler,
+            'model_name': self.model_name,
+            'accuracy': self.accuracy,
+            'feature_names': list(self.mental_health_questions),
+            'cv_scores': cv_scores
+        }
+        with open(path or self.pickle_path, 'wb') as f:
+            pickle.dump(model_package, f)
+    
     def predict_risk(self, responses):
         """Predict mental health risk based on survey responses"""
-        if self.model is None:
+        if self.model is None and self.compiled_model is None:
             self.initialize_model()
         
-        # Convert responses to proper format
-        if isinstance(responses, dict):
-            # Convert dictionary responses to array
-            response_array = [responses.get(q, 0) for q in self.mental_health_questions]
-        else:
-            response_array = responses
+        # Convert responses to a single feature row
+        features = self._response_row(responses).reshape(1, -1)
+        
+        return self._build_predictions(features)[0]
+    
+    def predict_risk_many(self, responses):
+        """Predict mental health risk for a 2-D array of survey responses"""
+        if self.model is None and self.compiled_model is None:
+            self.initialize_model()
+        
+        features = np.asarray(responses, dtype=np.float64)
+        if features.ndim != 2:
+            raise ValueError("predict_risk_many expects a 2-D array of responses")
         
         # Ensure we have the right number of features
-        if len(response_array) != len(self.mental_health_questions):
-            response_array = response_array[:len(self.mental_health_questions)]
-            response_array.extend([0] * (len(self.mental_health_questions) - len(response_array)))
+        n_features = len(self.mental_health_questions)
+        if features.shape[1] != n_features:
+            padded = np.zeros((features.shape[0], n_features), dtype=np.float64)
+            width = min(n_features, features.shape[1])
+            padded[:, :width] = features[:, :width]
+            features = padded
         
-        # Make prediction
-        response_df = pd.DataFrame([response_array], columns=self.mental_health_questions)
-        prediction = self.model.predict(response_df)[0]
-        probabilities = self.model.predict_proba(response_df)[0]
+        return self._build_predictions(features)
+    
+    def _response_row(self, responses):
+        """Convert dict or sequence responses to an array in question order
         
-        # Calculate confidence
-        max_prob = max(probabilities)
+        Unanswered questions count as 0. A dict with questions the model was
+        not trained on raises ValueError instead of being scored as all 0.
+        """
+        row = np.zeros(len(self.mental_health_questions), dtype=np.float64)
         
-        return {
-            'risk_level': prediction,
-            'confidence': float(max_prob),
-            'total_score': sum(response_array),
-            'recommendations': self._get_recommendations(prediction)
-        }
+        if isinstance(responses, dict):
+            unknown = [question for question in responses if question not in self._question_index]
+            if unknown:
+                raise ValueError(f"{self.model_name} does not know the question {unknown[0]!r}")
+            for question, value in responses.items():
+                row[self._question_index[question]] = value
+        else:
+            # Extra responses are dropped and missing ones count as 0
+            values = list(responses)[:len(row)]
+            row[:len(values)] = values
+        
+        return row
+    
+    def _build_predictions(self, features):
+        # One predict_proba call gives both the label (argmax) and the confidence
+        model = self.compiled_model if self.compiled_model is not None else self.model
+        probabilities = model.predict_proba(features)
+        best = probabilities.argmax(axis=1)
+        labels = model.classes_[best]
+        confidences = probabilities[np.arange(len(best)), best]
+        total_scores = features.sum(axis=1)
+        
+        results = []
+        for prediction, confidence, total_score in zip(labels, confidences, total_scores):
+            total_score = float(total_score)
+            results.append({
+                'risk_level': prediction,
+                'confidence': float(confidence),
+                'total_score': int(total_score) if total_score.is_integer() else total_score,
+                'recommendations': self._get_recommendations(prediction)
+            })
+        return results
     
     def _get_recommendations(self, risk_level):
         """Get recommendations based on risk level"""
@@ -122,14 +630,448 @@ class MentalHealthPredictor:
         }
         return recommendations.get(risk_level, [])
 
+class TextNormalizer:
+    """Compiled text normalizer used by NLPMentalHealthAnalyzer.preprocess_text
+    
+    Produces exactly the same output as the original seven re.sub passes
+    (kept as reference()) in at most three passes, skipping the contraction
+    and URL passes when the text cannot contain a match.
+    """
+    
+    CONTRACTIONS = {"can't": "cannot", "won't": "will not", "n't": " not"}
+    CONTRACTION_PATTERN = re.compile(r"can't|won't|n't")
+    URL_PATTERN = re.compile(r'http[^\s\x00]+|www[^\s\x00]+|@\w+|#\w+')
+    URL_MARKERS = ('http', 'www', '@', '#')
+    # Punctuation becomes a space and whitespace runs collapse, so both are one substitution
+    SEPARATOR_PATTERN = re.compile(r'[^\w!?.,\x00]+')
+    REPEAT_PATTERN = re.compile(r'([!?])\1+')
+    
+    # Joins texts in normalize_many(); it stops every pattern like whitespace does
+    BATCH_SEPARATOR = '\x00'
+    
+    def normalize(self, text):
+        """Normalize a single text"""
+        if text.__class__ is not str:
+            if pd.isna(text):
+                return ""
+            text = str(text)
+        if self.BATCH_SEPARATOR in text:
+            return self.reference(text)
+        return self._normalize(text.lower()).strip()
+    
+    def normalize_many(self, texts):
+        """Normalize a list or pandas Series of texts in one pass over a joined string"""
+        is_series = isinstance(texts, pd.Series)
+        values = texts.tolist() if is_series else list(texts)
+        
+        strings = []
+        for value in values:
+            if value.__class__ is not str:
+                value = "" if pd.isna(value) else str(value)
+            strings.append(value)
+        
+        joined = self.BATCH_SEPARATOR.join(strings)
+        if len(strings) < 2 or joined.count(self.BATCH_SEPARATOR) != len(strings) - 1:
+            # A text already contains the separator, fall back to one text at a time
+            normalized = [self.normalize(value) for value in strings]
+        else:
+            normalized = [part.strip() for part in self._normalize(joined.lower()).split(self.BATCH_SEPARATOR)]
+        
+        if is_series:
+            return pd.Series(normalized, index=texts.index, name=texts.name)
+        return normalized
+    
+    def _normalize(self, text):
+        if "'" in text:
+            text = self.CONTRACTION_PATTERN.sub(self._expand_contraction, text)
+        if any(marker in text for marker in self.URL_MARKERS):
+            text = self.URL_PATTERN.sub('', text)
+        text = self.SEPARATOR_PATTERN.sub(' ', text)
+        if '!!' in text or '??' in text:
+            text = self.REPEAT_PATTERN.sub(r'\1\1', text)
+        return text
+    
+    def _expand_contraction(self, match):
+        return self.CONTRACTIONS[match.group(0)]
+    
+    @staticmethod
+    def reference(text):
+        """Original preprocessing rules, kept as the parity reference"""
+        if pd.isna(text):
+            return ""
+        
+        text = str(text).lower()
+        text = re.sub(r"can't|cannot", "cannot", text)
+        text = re.sub(r"won't|will not", "will not", text)
+        text = re.sub(r"n't", " not", text)
+        text = re.sub(r'http\S+|www\S+|@\w+|#\w+', '', text)
+        text = re.sub(r'[^\w\s!?.,]', ' ', text)
+        text = re.sub(r'([!?])\1+', r'\1\1', text)
+        text = re.sub(r'\s+', ' ', text).strip()
+        
+        return text
+
+def _murmur_block(k):
+    k = (k * 0xcc9e2d51) & 0xffffffff
+    k = ((k << 15) | (k >> 17)) & 0xffffffff
+    return (k * 0x1b873593) & 0xffffffff
+
+def murmurhash3_32(data, seed=0):
+    """Signed 32-bit MurmurHash3 (x86) of bytes, the hash scikit-learn's HashingVectorizer uses"""
+    h = seed & 0xffffffff
+    length = len(data)
+    rounded = length & ~3
+    
+    for i in range(0, rounded, 4):
+        h ^= _murmur_block(int.from_bytes(data[i:i + 4], 'little'))
+        h = ((h << 13) | (h >> 19)) & 0xffffffff
+        h = (h * 5 + 0xe6546b64) & 0xffffffff
+    if length & 3:
+        h ^= _murmur_block(int.from_bytes(data[rounded:], 'little'))
+    
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+    return h - 0x100000000 if h & 0x80000000 else h
+
+class LinearTextScorer:
+    """NumPy-only runtime for a fitted text vectorizer + linear classifier pair
+    
+    Tokenizes, builds the weighted, normalized term vector and applies the
+    linear model exactly as scikit-learn does, so workers that load an
+    exported artifact never need to import scikit-learn. Two pairs are
+    supported:
+    
+    - TfidfVectorizer + LogisticRegression. The vocabulary is a sorted
+      array of UTF-8 terms searched with np.searchsorted, so it can be
+      memory-mapped and shared instead of rebuilt as a dict per worker.
+    - HashingVectorizer + log-loss SGDClassifier (train_streaming()). There
+      is no vocabulary: each n-gram's column is its MurmurHash3 modulo
+      n_features, and the artifact is just the coefficient matrix.
+    """
+    
+    def __init__(self, terms, term_columns, idf, linear_model, config):
+        self.terms = terms
+        self.term_columns = term_columns
+        self.idf = idf
+        self.linear_model = linear_model
+        self.classes_ = linear_model.classes_
+        self.config = config
+        self.n_features = config.get('n_features')
+        self.ngram_range = tuple(config['ngram_range'])
+        self.stop_words = set(config['stop_words']) if config['stop_words'] is not None else None
+        self._token_pattern = re.compile(config['token_pattern'])
+    
+    @classmethod
+    def from_estimators(cls, vectorizer, model):
+        """Export a fitted TfidfVectorizer + LogisticRegression or HashingVectorizer + SGDClassifier"""
+        hashing = hasattr(vectorizer, 'n_features') and hasattr(vectorizer, 'alternate_sign')
+        if not hashing and not hasattr(vectorizer, 'vocabulary_'):
+            raise ValueError("Only fitted TfidfVectorizer or HashingVectorizer models can be exported")
+        if vectorizer.analyzer != 'word' or vectorizer.tokenizer is not None or vectorizer.preprocessor is not None:
+            raise ValueError("Only word analyzers with the default tokenizer and preprocessor can be exported")
+        if vectorizer.strip_accents is not None:
+            raise ValueError("Vectorizers with strip_accents cannot be exported")
+        linear_model = CompiledLinearModel.from_estimator(model)
+        
+        stop_words = vectorizer.get_stop_words()
+        config = {
+            'ngram_range': list(vectorizer.ngram_range),
+            'token_pattern': vectorizer.token_pattern,
+            'lowercase': bool(vectorizer.lowercase),
+            'stop_words': sorted(stop_words) if stop_words is not None else None,
+            'binary': bool(vectorizer.binary),
+            'norm': vectorizer.norm,
+        }
+        
+        if hashing:
+            if linear_model.coef.shape[1] != vectorizer.n_features:
+                raise ValueError("The model was not trained on this HashingVectorizer's features")
+            config.update({
+                'use_idf': False,
+                'sublinear_tf': False,
+                'n_features': int(vectorizer.n_features),
+                'alternate_sign': bool(vectorizer.alternate_sign),
+            })
+            return cls(terms=None, term_columns=None, idf=None, linear_model=linear_model, config=config)
+        
+        config.update({'use_idf': bool(vectorizer.use_idf), 'sublinear_tf': bool(vectorizer.sublinear_tf)})
+        idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(vectorizer.vocabulary_))
+        
+        encoded = sorted((term.encode('utf-8'), index) for term, index in vectorizer.vocabulary_.items())
+        return cls(
+            terms=np.array([term for term, _ in encoded], dtype=np.bytes_),
+            term_columns=np.array([index for _, index in encoded], dtype=np.int64),
+            idf=np.asarray(idf, dtype=np.float64),
+            linear_model=linear_model,
+            config=config
+        )
+    
+    def to_arrays(self):
+        """Return (arrays, metadata) for save_artifact"""
+        arrays, model_metadata = self.linear_model.to_arrays()
+        if self.n_features is None:
+            arrays.update({'terms': self.terms, 'term_columns': self.term_columns, 'idf': self.idf})
+        return arrays, dict(self.config, **model_metadata)
+    
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        """Rebuild from the output of to_arrays(), arrays may be memory-mapped"""
+        return cls(
+            terms=arrays.get('terms'),
+            term_columns=arrays.get('term_columns'),
+            idf=arrays.get('idf'),
+            linear_model=CompiledLinearModel.from_arrays(arrays, metadata),
+            config=metadata
+        )
+    
+    def save(self, directory):
+        """Write the scorer as a memory-mappable artifact directory"""
+        arrays, metadata = self.to_arrays()
+        return save_artifact(directory, 'nlp_scorer', arrays, metadata)
+    
+    @classmethod
+    def load(cls, directory):
+        """Read a scorer written by save()"""
+        manifest, arrays = load_artifact(directory, kind='nlp_scorer')
+        return cls.from_arrays(arrays, manifest['metadata'])
+    
+    def _term_vector(self, text):
+        """Return (column indices, weights) of the tf-idf vector of one text"""
+        if self.config['lowercase']:
+            text = text.lower()
+        tokens = self._token_pattern.findall(text)
+        if self.stop_words is not None:
+            tokens = [token for token in tokens if token not in self.stop_words]
+        
+        grams = []
+        min_n, max_n = self.ngram_range
+        for n in range(min_n, min(max_n, len(tokens)) + 1):
+            if n == 1:
+                grams.extend(tokens)
+            else:
+                grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        
+        if not grams or (self.n_features is None and not len(self.terms)):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        
+        if self.n_features is not None:
+            indices, weights = self._hashed_counts(grams)
+        else:
+            # Binary search every n-gram in the sorted vocabulary at once
+            keys = np.array([gram.encode('utf-8') for gram in grams], dtype=np.bytes_)
+            positions = np.minimum(np.searchsorted(self.terms, keys), len(self.terms) - 1)
+            found = self.terms[positions] == keys
+            indices, counts = np.unique(self.term_columns[positions[found]], return_counts=True)
+            weights = counts.astype(np.float64)
+        
+        if self.config['binary']:
+            weights[:] = 1.0
+        elif self.config['sublinear_tf']:
+            weights = np.log(weights) + 1
+        if self.idf is not None:
+            weights *= self.idf[indices]
+        
+        norm = self.config['norm']
+        if norm == 'l2':
+            length = np.sqrt(np.dot(weights, weights))
+        elif norm == 'l1':
+            length = np.abs(weights).sum()
+        else:
+            length = 0.0
+        if length > 0:
+            weights /= length
+        
+        return indices, weights
+    
+    def _hashed_counts(self, grams):
+        """Column indices and summed (signed) counts of n-grams, as HashingVectorizer computes them"""
+        columns = np.empty(len(grams), dtype=np.int64)
+        signs = np.ones(len(grams), dtype=np.float64)
+        for i, gram in enumerate(grams):
+            h = murmurhash3_32(gram.encode('utf-8'))
+            # abs(-2**31) overflows in scikit-learn's int32 arithmetic, this is what it yields instead
+            columns[i] = (2147483647 - (self.n_features - 1)) % self.n_features if h == -2147483648 else abs(h) % self.n_features
+            if self.config['alternate_sign'] and h < 0:
+                signs[i] = -1.0
+        
+        indices, inverse = np.unique(columns, return_inverse=True)
+        weights = np.zeros(len(indices), dtype=np.float64)
+        np.add.at(weights, inverse, signs)
+        return indices, weights
+    
+    def decision_function(self, texts):
+        """Linear model scores for each text"""
+        coef = self.linear_model.coef
+        scores = np.empty((len(texts), coef.shape[0]), dtype=np.float64)
+        for row, text in enumerate(texts):
+            indices, weights = self._term_vector(text)
+            scores[row] = coef[:, indices] @ weights
+        scores += self.linear_model.intercept
+        return scores
+    
+    def predict_proba(self, texts):
+        """Class probabilities, computed like LogisticRegression.predict_proba"""
+        return self.linear_model.probabilities_from_scores(self.decision_function(texts))
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a labeled keyword lexicon
+    
+    Built once, then finds every whole-word or whole-phrase occurrence of
+    every keyword in a single left-to-right pass, so scanning cost depends
+    on the text length and not on the size of the lexicon.
+    """
+    
+    def __init__(self, lexicon):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        
+        for label, phrases in lexicon.items():
+            for phrase in phrases:
+                state = 0
+                for char in phrase.lower():
+                    next_state = self._goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(self._goto)
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._output.append([])
+                        self._goto[state][char] = next_state
+                    state = next_state
+                self._output[state].append((label, phrase.lower()))
+        
+        # Breadth-first pass links each state to its longest proper suffix state
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+    
+    def find(self, text):
+        """Return (label, phrase, start, end) for every whole-word match in text"""
+        matches = []
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            
+            for label, phrase in output[state]:
+                start = i - len(phrase) + 1
+                end = i + 1
+                # Only keep matches that are not part of a longer word
+                if start > 0 and self._is_word_char(text[start - 1]):
+                    continue
+                if end < len(text) and self._is_word_char(text[end]):
+                    continue
+                matches.append((label, phrase, start, end))
+        
+        return matches
+    
+    @staticmethod
+    def _is_word_char(char):
+        return char.isalnum() or char == '_'
+    
+    @staticmethod
+    def reference(lexicon, text):
+        """One regex scan per phrase, the matching the automaton replaces, kept as the parity reference"""
+        matches = []
+        for label, phrases in lexicon.items():
+            for phrase in phrases:
+                pattern = r'(?<!\w)' + re.escape(phrase.lower()) + r'(?!\w)'
+                for match in re.finditer(pattern, text):
+                    matches.append((label, phrase.lower(), match.start(), match.end()))
+        return matches
+
+class PredictionCache:
+    """Thread-safe, size-bounded LRU cache for text classification results
+    
+    Entries optionally expire ttl seconds after they were stored. Counters
+    for hits, misses and evictions are kept for monitoring.
+    """
+    
+    def __init__(self, max_size=10000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Return the cached value for key or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries"""
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all entries, counters are kept"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Return cache size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
 class NLPMentalHealthAnalyzer:
     """NLP-based mental health analysis from text"""
     
-    def __init__(self):
+    ARTIFACT_NAME = 'nlp_scorer'
+    PICKLE_NAME = 'best_fast_mental_health_model.pkl'
+    
+    def __init__(self, models_dir=None, cache_size=10000, cache_ttl=None):
+        self.models_dir = str(models_dir or DEFAULT_MODELS_DIR)
         self.model = None
         self.vectorizer = None
+        self.scorer = None
+        self.model_version = 0
+        self.prediction_cache = PredictionCache(max_size=cache_size, ttl=cache_ttl)
         self.categories = ['Normal', 'Depression', 'Suicidal', 'Anxiety', 'Bipolar', 'Stress', 'Personality disorder']
         self.best_model_type = 'tfidf'
+        self.normalizer = TextNormalizer()
         
         # Mental health keywords
         self.mental_health_patterns = {
@@ -147,22 +1089,54 @@ class NLPMentalHealthAnalyzer:
             'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'
         }
         
-    def initialize_model(self):
+        # Unambiguous phrases that route a message straight to crisis support
+        self.crisis_phrases = [
+            'suicide', 'suicidal', 'kill myself', 'hurt myself', 'end my life', 'end it all',
+            'ending it all', 'want to die', 'better off dead', 'done with life', 'self harm'
+        ]
+        
+        lexicon = {category[:-len('_words')]: words for category, words in self.mental_health_patterns.items()}
+        lexicon['crisis'] = self.crisis_phrases
+        self.keyword_matcher = KeywordMatcher(lexicon)
+        
+    @property
+    def artifact_path(self):
+        return os.path.join(self.models_dir, self.ARTIFACT_NAME)
+    
+    @property
+    def pickle_path(self):
+        return os.path.join(self.models_dir, self.PICKLE_NAME)
+    
+    def initialize_model(self, use_artifact=True):
         """Initialize the NLP model"""
-        try:
-            # Try to load existing model
-            with open('best_fast_mental_health_model.pkl', 'rb') as f:
-                model_package = pickle.load(f)
-                self.model = model_package['model']
-                self.vectorizer = model_package['vectorizer']
-                self.best_model_type = model_package.get('best_model_type', 'tfidf')
-            print("Loaded existing NLP model")
-        except FileNotFoundError:
-            self._create_basic_nlp_model()
+        if use_artifact and artifact_exists(self.artifact_path):
+            # Memory-mapped scorers need neither pickle nor scikit-learn
+            self.scorer = LinearTextScorer.load(self.artifact_path)
+            self.model = None
+            self.vectorizer = None
+            print("Loaded NLP scorer artifact")
+        else:
+            self.scorer = None
+            try:
+                # Try to load existing model
+                with open(self.pickle_path, 'rb') as f:
+                    model_package = pickle.load(f)
+                    self.model = model_package['model']
+                    self.vectorizer = model_package['vectorizer']
+                    self.best_model_type = model_package.get('best_model_type', 'tfidf')
+                print("Loaded existing NLP model")
+            except FileNotFoundError:
+                self._create_basic_nlp_model()
+        
+        # Cached results belong to the previous model
+        self.model_version += 1
+        self.prediction_cache.clear()
     
     def _create_basic_nlp_model(self):
         """Create a basic NLP model for demonstration"""
         print("Creating basic NLP model for demonstration...")
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.feature_extraction.text import TfidfVectorizer
         self.model = LogisticRegression(random_state=42, max_iter=1000)
         self.vectorizer = TfidfVectorizer(max_features=1000, ngram_range=(1, 2))
         
@@ -183,80 +1157,944 @@ class NLPMentalHealthAnalyzer:
         X_dummy = self.vectorizer.fit_transform(dummy_texts)
         self.model.fit(X_dummy, dummy_labels)
     
+    def train_streaming(self, csv_path, text_column='statement', label_column='status', chunk_size=10000,
+                        holdout_fraction=0.1, epochs=1, n_features=2 ** 20, progress=None):
+        """Train out of core from a labeled CSV file
+        
+        The CSV is read in chunks, featurized with a stateless HashingVectorizer
+        and fed to an SGD logistic regression through partial_fit, so memory
+        does not grow with the dataset. A seeded random holdout_fraction of the
+        rows is never trained on and is scored in a final pass. progress, if
+        given, is called with a stats dict after every chunk.
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import SGDClassifier
+        
+        vectorizer = HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False)
+        model = SGDClassifier(loss='log_loss', alpha=1e-6, random_state=42)
+        classes = np.array(self.categories, dtype=object)
+        
+        stats = {'epoch': 0, 'rows': 0, 'train_rows': 0, 'holdout_rows': 0, 'skipped_rows': 0}
+        start = time.perf_counter()
+        
+        for epoch in range(1, epochs + 1):
+            stats['epoch'] = epoch
+            for texts, labels, holdout in self._stream_training_chunks(
+                csv_path, text_column, label_column, chunk_size, holdout_fraction, classes, stats
+            ):
+                train = ~holdout
+                if train.any():
+                    model.partial_fit(vectorizer.transform(texts[train]), labels[train], classes=classes)
+                
+                elapsed = time.perf_counter() - start
+                stats['seconds'] = elapsed
+                stats['rows_per_second'] = stats['rows'] / elapsed if elapsed > 0 else 0.0
+                if progress is not None:
+                    progress(dict(stats))
+        
+        # Score the rows that were held out of training in one more streaming pass
+        correct = 0
+        holdout_rows = 0
+        for texts, labels, holdout in self._stream_training_chunks(
+            csv_path, text_column, label_column, chunk_size, holdout_fraction, classes, None
+        ):
+            if holdout.any():
+                predictions = model.predict(vectorizer.transform(texts[holdout]))
+                correct += int((predictions == labels[holdout]).sum())
+                holdout_rows += int(holdout.sum())
+        
+        elapsed = time.perf_counter() - start
+        stats.update({
+            'seconds': elapsed,
+            'rows_per_second': stats['rows'] / elapsed if elapsed > 0 else 0.0,
+            'holdout_rows': holdout_rows,
+            'accuracy': correct / holdout_rows if holdout_rows else None
+        })
+        
+        self.model = model
+        self.vectorizer = vectorizer
+        self.scorer = None
+        self.best_model_type = 'hashing'
+        self.model_version += 1
+        self.prediction_cache.clear()
+        
+        return stats
+    
+    def _stream_training_chunks(self, csv_path, text_column, label_column, chunk_size, holdout_fraction, classes, stats):
+        """Yield (texts, labels, holdout mask) arrays for each CSV chunk"""
+        known_classes = set(classes)
+        reader = pd.read_csv(
+            csv_path,
+            usecols=[text_column, label_column],
+            dtype={text_column: 'string', label_column: 'string'},
+            chunksize=chunk_size
+        )
+        
+        for chunk_index, chunk in enumerate(reader):
+            texts = self.preprocess_texts(chunk[text_column]).to_numpy(dtype=object)
+            labels = chunk[label_column].to_numpy(dtype=object, na_value='')
+            
+            # Rows without text or with unknown labels cannot be trained on
+            valid = (texts != '') & np.fromiter((label in known_classes for label in labels), dtype=bool, count=len(labels))
+            
+            # Seeded per chunk so every pass holds out exactly the same rows
+            holdout = np.random.RandomState(42 + chunk_index).rand(len(chunk)) < holdout_fraction
+            
+            if stats is not None:
+                stats['rows'] += len(chunk)
+                stats['skipped_rows'] += int((~valid).sum())
+                if stats['epoch'] == 1:
+                    stats['train_rows'] += int((valid & ~holdout).sum())
+                    stats['holdout_rows'] += int((valid & holdout).sum())
+            
+            yield texts[valid], labels[valid], holdout[valid]
+    
+    def save_model(self, path=None, accuracy=None):
+        """Write the current model and vectorizer as the package initialize_model loads"""
+        model_package = {
+            'model': self.model,
+            'vectorizer': self.vectorizer,
+            'best_model_type': self.best_model_type,
+            'accuracy': accuracy
+        }
+        with open(path or self.pickle_path, 'wb') as f:
+            pickle.dump(model_package, f)
+    
+    def export_scorer(self, path=None):
+        """Write the text model (TF-IDF or hashed, see LinearTextScorer) as a NumPy-only scorer artifact"""
+        if self.model is None:
+            self.initialize_model(use_artifact=False)
+        
+        scorer = LinearTextScorer.from_estimators(self.vectorizer, self.model)
+        return scorer.save(path or self.artifact_path)
+    
     def preprocess_text(self, text):
         """Preprocess text for analysis"""
-        if pd.isna(text):
-            return ""
+        return self.normalizer.normalize(text)
+    
+    def preprocess_texts(self, texts):
+        """Preprocess a list or pandas Series of texts for analysis"""
+        return self.normalizer.normalize_many(texts)
+    
+    def screen_text(self, text):
+        """Scan text for mental health keywords in one pass, without the model
         
-        text = str(text).lower()
-        text = re.sub(r"can't|cannot", "cannot", text)
-        text = re.sub(r"won't|will not", "will not", text)
-        text = re.sub(r"n't", " not", text)
-        text = re.sub(r'http\S+|www\S+|@\w+|#\w+', '', text)
-        text = re.sub(r'[^\w\s!?.,]', ' ', text)
-        text = re.sub(r'([!?])\1+', r'\1\1', text)
-        text = re.sub(r'\s+', ' ', text).strip()
+        Matching is lexical on purpose: negations such as "I don't want to
+        die" still hit the crisis phrases. A false alarm costs one reply
+        with crisis resources, a missed crisis costs far more, and a negated
+        phrase is no reliable sign that someone is safe.
+        """
+        matches = self.keyword_matcher.find(self.preprocess_text(text))
         
-        return text
+        categories = Counter(label for label, _, _, _ in matches)
+        intensity = categories.pop('intensity', 0)
+        crisis = categories.pop('crisis', 0) > 0
+        
+        return {
+            'categories': dict(categories),
+            'intensity': intensity,
+            'crisis': crisis,
+            'matches': [phrase for _, phrase, _, _ in matches]
+        }
     
     def analyze_text(self, text):
         """Analyze text and predict mental health condition"""
-        if self.model is None:
+        return self.analyze_texts([text])[0]
+    
+    def analyze_texts(self, texts):
+        """Analyze a batch of texts with one transform and one predict_proba call"""
+        if self.model is None and self.scorer is None:
             self.initialize_model()
         
-        # Preprocess text
-        processed_text = self.preprocess_text(text)
+        # Preprocess texts, empty ones are answered without touching the model
+        processed_texts = self.preprocess_texts(texts)
+        results = [(None, {}, 0.0)] * len(processed_texts)
+        model_version = self.model_version
         
-        if not processed_text:
-            return None, {}, 0.0
+        # Serve repeated texts from the cache, only misses reach the model
+        batch_indices = []
+        for i, text in enumerate(processed_texts):
+            if not text:
+                continue
+            cached = self.prediction_cache.get((model_version, text))
+            if cached is None:
+                batch_indices.append(i)
+            else:
+                prediction, prob_dict, confidence = cached
+                results[i] = (prediction, dict(prob_dict), confidence)
+        
+        if not batch_indices:
+            return results
         
         try:
-            # Transform text using vectorizer
-            text_features = self.vectorizer.transform([processed_text])
-            
-            # Make prediction
-            prediction = self.model.predict(text_features)[0]
-            probabilities = self.model.predict_proba(text_features)[0]
+            batch_texts = [processed_texts[i] for i in batch_indices]
             
-            # Create probability dictionary
-            prob_dict = {}
-            for i, class_name in enumerate(self.model.classes_):
-                prob_dict[class_name] = float(probabilities[i])
+            # Make predictions, the label is the argmax of the probabilities
+            if self.scorer is not None:
+                probabilities = self.scorer.predict_proba(batch_texts)
+                classes = self.scorer.classes_
+            else:
+                # Transform all texts using vectorizer in a single sparse matrix
+                text_features = self.vectorizer.transform(batch_texts)
+                probabilities = self.model.predict_proba(text_features)
+                classes = self.model.classes_
             
-            confidence = max(probabilities)
+            for row, i in enumerate(batch_indices):
+                row_probabilities = probabilities[row]
+                best = int(np.argmax(row_probabilities))
+                
+                # Create probability dictionary
+                prob_dict = {}
+                for j, class_name in enumerate(classes):
+                    prob_dict[class_name] = float(row_probabilities[j])
+                
+                result = (classes[best], prob_dict, float(row_probabilities[best]))
+                self.prediction_cache.set((model_version, processed_texts[i]), (result[0], dict(prob_dict), result[2]))
+                results[i] = result
             
-            return prediction, prob_dict, float(confidence)
+            return results
             
         except Exception as e:
             print(f"Error in text analysis: {e}")
-            return "Normal", {"Normal": 1.0}, 1.0
+            for i in batch_indices:
+                results[i] = ("Normal", {"Normal": 1.0}, 1.0)
+            return results
+
+class ModelRegistry:
+    """Versioned, checksummed copies of the trained models
+    
+    Every published version is an immutable models directory under
+    versions/<version>/ holding the survey and NLP models (artifact and/or
+    pickle) plus version.json with its metadata and a SHA-256 of every file.
+    registry.json names the active version and the order versions were
+    promoted in, which is what rollback() walks back through.
+    """
+    
+    # Files and artifact directories that make up one version
+    MODEL_FILES = [
+        (MentalHealthPredictor.ARTIFACT_NAME, MentalHealthPredictor.PICKLE_NAME),
+        (NLPMentalHealthAnalyzer.ARTIFACT_NAME, NLPMentalHealthAnalyzer.PICKLE_NAME),
+    ]
+    
+    def __init__(self, root):
+        self.root = str(root)
+        self.versions_dir = os.path.join(self.root, 'versions')
+        self.state_path = os.path.join(self.root, 'registry.json')
+    
+    def version_path(self, version):
+        return os.path.join(self.versions_dir, version)
+    
+    def publish(self, source_dir, metadata=None):
+        """Copy the models in source_dir into a new version and return its version.json"""
+        version = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'.{version}-', dir=self.versions_dir)
+        os.chmod(staging, 0o755)
+        
+        try:
+            for artifact_name, pickle_name in self.MODEL_FILES:
+                artifact = os.path.join(source_dir, artifact_name)
+                pickle_file = os.path.join(source_dir, pickle_name)
+                if not artifact_exists(artifact) and not os.path.exists(pickle_file):
+                    raise ValueError(f"{source_dir} has neither {artifact_name} nor {pickle_name}")
+                if artifact_exists(artifact):
+                    shutil.copytree(artifact, os.path.join(staging, artifact_name))
+                if os.path.exists(pickle_file):
+                    shutil.copy2(pickle_file, os.path.join(staging, pickle_name))
+            
+            info = {
+                'version': version,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'source': os.path.abspath(source_dir),
+                'metadata': metadata or {},
+                'checksums': self._checksums(staging)
+            }
+            with open(os.path.join(staging, 'version.json'), 'w') as f:
+                json.dump(info, f, indent=2)
+            os.replace(staging, self.version_path(version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        
+        return info
+    
+    def versions(self):
+        """version.json of every published version, oldest first"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        infos = []
+        for name in sorted(os.listdir(self.versions_dir)):
+            info_path = os.path.join(self.versions_dir, name, 'version.json')
+            if not name.startswith('.') and os.path.exists(info_path):
+                with open(info_path) as f:
+                    infos.append(json.load(f))
+        return infos
+    
+    def get(self, version):
+        info_path = os.path.join(self.version_path(version), 'version.json')
+        if not os.path.exists(info_path):
+            raise ValueError(f"Unknown model version {version}")
+        with open(info_path) as f:
+            return json.load(f)
+    
+    def verify(self, version):
+        """Raise ValueError unless every file of the version matches its checksum"""
+        expected = self.get(version)['checksums']
+        actual = self._checksums(self.version_path(version))
+        if actual != expected:
+            changed = sorted(name for name in set(expected) | set(actual) if expected.get(name) != actual.get(name))
+            raise ValueError(f"Model version {version} failed checksum verification: {', '.join(changed)}")
+    
+    def active_version(self):
+        return self._read_state()['active']
+    
+    def history(self):
+        return self._read_state()['history']
+    
+    def promote(self, version):
+        """Make a verified version the one every worker serves"""
+        self.verify(version)
+        state = self._read_state()
+        if state['active'] == version:
+            return
+        state['history'].append(version)
+        state['active'] = version
+        self._write_state(state)
+    
+    def rollback(self):
+        """Reactivate the previously promoted version and return it"""
+        state = self._read_state()
+        if len(state['history']) < 2:
+            raise ValueError("No earlier promoted version to roll back to")
+        state['history'].pop()
+        state['active'] = state['history'][-1]
+        self.verify(state['active'])
+        self._write_state(state)
+        return state['active']
+    
+    def _read_state(self):
+        if not os.path.exists(self.state_path):
+            return {'active': None, 'history': []}
+        with open(self.state_path) as f:
+            return json.load(f)
+    
+    def _write_state(self, state):
+        # Workers poll this file, so it is replaced in one rename
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.registry-', dir=self.root)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, self.state_path)
+    
+    @staticmethod
+    def _checksums(directory):
+        checksums = {}
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, directory)
+                if name == 'version.json':
+                    continue
+                digest = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+                checksums[name.replace(os.sep, '/')] = digest.hexdigest()
+        return checksums
+
+class ConversationContextStore:
+    """Bounded per-session memory of recent message predictions
+    
+    Each session keeps fixed-size ring buffers of its latest predictions and
+    probability vectors plus an exponentially weighted moving average of
+    every class probability, so updates are O(1) per message. Snapshots
+    list the buffered turns oldest first. Sessions idle
+    for longer than ttl seconds expire, and the least recently used ones are
+    evicted beyond max_sessions.
+    """
+    
+    class _Session:
+        __slots__ = ('predictions', 'probabilities', 'risk', 'turns', 'last_seen')
+        
+        def __init__(self, history_size, n_classes):
+            self.predictions = [None] * history_size
+            self.probabilities = np.zeros((history_size, n_classes))
+            self.risk = np.zeros(n_classes)
+            self.turns = 0
+            self.last_seen = 0.0
+    
+    def __init__(self, classes, history_size=10, alpha=0.3, max_sessions=10000, ttl=3600):
+        self.classes = list(classes)
+        self.history_size = history_size
+        self.alpha = alpha
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._class_index = {name: i for i, name in enumerate(self.classes)}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+    
+    def update(self, session_id, prediction, probabilities):
+        """Record one analyzed message and return the session's updated context"""
+        vector = np.zeros(len(self.classes))
+        for name, probability in probabilities.items():
+            index = self._class_index.get(name)
+            if index is not None:
+                vector[index] = probability
+        
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._Session(self.history_size, len(self.classes))
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            
+            slot = session.turns % self.history_size
+            session.predictions[slot] = prediction
+            session.probabilities[slot] = vector
+            if session.turns == 0:
+                session.risk[:] = vector
+            else:
+                session.risk *= 1 - self.alpha
+                session.risk += self.alpha * vector
+            session.turns += 1
+            session.last_seen = now
+            
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            
+            return self._snapshot(session)
+    
+    def get(self, session_id):
+        """Return the session's context, or None if unknown or expired"""
+        with self._lock:
+            self._expire(time.monotonic())
+            session = self._sessions.get(session_id)
+            return self._snapshot(session) if session is not None else None
+    
+    def clear(self, session_id=None):
+        """Forget one session, or all of them"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+    
+    def __len__(self):
+        return len(self._sessions)
+    
+    def _expire(self, now):
+        # Sessions are kept in last-use order, so expired ones are at the front
+        if not self.ttl:
+            return
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+    
+    def _snapshot(self, session):
+        count = min(session.turns, self.history_size)
+        start = session.turns - count
+        slots = [i % self.history_size for i in range(start, session.turns)]
+        return {
+            'turns': session.turns,
+            'recent_predictions': [session.predictions[slot] for slot in slots],
+            'recent_probabilities': [
+                {name: float(session.probabilities[slot, i]) for i, name in enumerate(self.classes)}
+                for slot in slots
+            ],
+            'rolling_risk': {name: float(session.risk[i]) for i, name in enumerate(self.classes)}
+        }
+
+class BatchingInferenceEngine:
+    """Micro-batches concurrent analyze_text calls into single model calls
+    
+    Callers block in submit() while a background thread gathers every text
+    that arrives within batch_window seconds of the first one (or until
+    max_batch_size texts are waiting) and scores them with one
+    analyze_texts() call.
+    
+    A batch only holds texts whose callers are blocked in submit() at the
+    same time. The async chat view calls it from an InferencePool thread,
+    so there batches never grow past the pool's max_workers, whatever
+    max_batch_size says; raise INFERENCE_POOL_WORKERS along with it.
+    """
+    
+    def __init__(self, analyzer, batch_window=0.005, max_batch_size=32):
+        self.analyzer = analyzer
+        self.batch_window = batch_window
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+    
+    def submit(self, text):
+        """Queue a text and block until its (prediction, probabilities, confidence) is ready"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Inference engine has been shut down")
+            self._ensure_worker()
+            self._queue.put((text, future))
+        return future.result()
+    
+    def shutdown(self, timeout=None):
+        """Stop accepting texts and wait for the worker to score the ones already queued"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+            if thread is not None:
+                # Texts are queued under the lock, so none can land behind the stop marker
+                self._queue.put(None)
+        if thread is not None:
+            thread.join(timeout)
+    
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so pre-forked workers start their own
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='moodigo-inference', daemon=True
+            )
+            self._thread.start()
+    
+    def _collect_batch(self):
+        """Next batch of (text, future) pairs, and whether shutdown() was called"""
+        item = self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    
+    def _run(self):
+        while True:
+            batch, stop = self._collect_batch()
+            if batch:
+                self._score(batch)
+            if stop:
+                return
+    
+    def _score(self, batch):
+        texts = [text for text, _ in batch]
+        # A hot reload swaps self.analyzer; a running batch finishes on the old one
+        analyzer = self.analyzer
+        try:
+            results = analyzer.analyze_texts(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+class InferenceOverloaded(RuntimeError):
+    """Raised when the inference pool has no room for another request"""
+
+class ModelsNotReady(RuntimeError):
+    """Raised when the models are not warmed up within the wait, or warm-up failed"""
+
+class InferencePool:
+    """Bounded thread pool that runs blocking inference for async callers
+    
+    At most max_workers calls run at once and at most max_pending are
+    accepted (running or queued); beyond that run() raises
+    InferenceOverloaded straight away instead of queueing without bound.
+    A call counts as pending until it finishes on its thread, even when
+    its caller was cancelled first; a queued call that is cancelled never runs.
+    """
+    
+    def __init__(self, max_workers=4, max_pending=64):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.pending = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+    
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the pool and await its result"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise InferenceOverloaded(f"{self.pending} inference requests already pending")
+            self.pending += 1
+            executor = self._get_executor()
+        
+        try:
+            future = executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # A cancelled caller stops waiting, but a call already running keeps its slot until it returns
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+    
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            if future is not None and future.cancelled():
+                self.cancelled += 1
+            else:
+                self.completed += 1
+    
+    def _get_executor(self):
+        # Pool threads do not survive fork(), so pre-forked workers create their own
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='moodigo-inference-pool'
+            )
+        return self._executor
+    
+    def stats(self):
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'completed': self.completed,
+            'cancelled': self.cancelled,
+            'rejected': self.rejected
+        }
 
 class MoodigoAI:
     """Main AI service that combines both models"""
     
-    def __init__(self):
-        self.survey_model = MentalHealthPredictor()
-        self.nlp_model = NLPMentalHealthAnalyzer()
-        self.conversation_context = []
+    # Dummy inputs used to exercise every inference path during warm-up
+    WARMUP_MESSAGES = [
+        "I feel really anxious about my exams!!",
+        "I can't sleep and I'm so stressed @work http://example.com",
+    ]
+    
+    def __init__(self, models_dir=None, batch_window=0, max_batch_size=32, cache_size=10000, cache_ttl=None,
+                 crisis_short_circuit=True, context_history_size=10, context_alpha=0.3,
+                 context_max_sessions=10000, context_ttl=3600, registry=None,
+                 pool_workers=4, pool_max_pending=64, warmup_timeout=10):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        
+        # Both models are swapped together by replacing this one tuple
+        self._models = (
+            MentalHealthPredictor(models_dir=models_dir),
+            NLPMentalHealthAnalyzer(models_dir=models_dir, cache_size=cache_size, cache_ttl=cache_ttl)
+        )
+        self.conversation_context = ConversationContextStore(
+            self.nlp_model.categories,
+            history_size=context_history_size,
+            alpha=context_alpha,
+            max_sessions=context_max_sessions,
+            ttl=context_ttl
+        )
+        
+        # Crisis keyword hits skip the model (and any wait for it) entirely
+        self.crisis_short_circuit = crisis_short_circuit
+        
+        # Micro-batching is only enabled with a positive batch window
+        self.inference_engine = None
+        if batch_window > 0:
+            self.inference_engine = BatchingInferenceEngine(
+                self.nlp_model, batch_window=batch_window, max_batch_size=max_batch_size
+            )
+        
+        # Runs model calls for async views, see analyze_message_async()
+        self.inference_pool = InferencePool(max_workers=pool_workers, max_pending=pool_max_pending)
+        
+        # Background warm-up state, see start_warmup()
+        self._warmup_lock = threading.Lock()
+        self._warmup_done = threading.Event()
+        self._warmup_thread = None
+        self._warmup_pid = None
+        self.warmup_timeout = warmup_timeout
+        self.warmup_error = None
+        self.warmup_seconds = None
+        
+        # Hot reload from a ModelRegistry, see start_model_watcher()
+        self.registry = registry
+        self.registry_version = None
+        self.reload_error = None
+        self._reload_lock = threading.Lock()
+        self._watcher_lock = threading.Lock()
+        self._watcher_thread = None
+        self._watcher_pid = None
+        self._watcher_interval = None
+        self._watcher_stop = threading.Event()
+    
+    @property
+    def survey_model(self):
+        return self._models[0]
+    
+    @property
+    def nlp_model(self):
+        return self._models[1]
         
     def initialize(self):
-        """Initialize both models"""
+        """Initialize both models, from the registry's active version if there is one"""
+        version = self.registry.active_version() if self.registry is not None else None
+        if version is not None:
+            self.load_version(version)
+            return
         self.survey_model.initialize_model()
         self.nlp_model.initialize_model()
+    
+    def load_version(self, version):
+        """Load, warm up and atomically swap in a registry version
+        
+        Requests already running keep the models they started with; only
+        requests arriving after the swap see the new version.
+        """
+        with self._reload_lock:
+            self.registry.verify(version)
+            path = self.registry.version_path(version)
+            survey_model = MentalHealthPredictor(models_dir=path)
+            nlp_model = NLPMentalHealthAnalyzer(models_dir=path, cache_size=self.cache_size, cache_ttl=self.cache_ttl)
+            # A version whose survey model does not fit the assessment is never swapped in
+            survey_model.initialize_model(strict=True)
+            nlp_model.initialize_model()
+            self._warm_models(survey_model, nlp_model)
+            
+            self._models = (survey_model, nlp_model)
+            if self.inference_engine is not None:
+                self.inference_engine.analyzer = nlp_model
+            self.registry_version = version
+            print(f"Serving model version {version}")
+    
+    def start_model_watcher(self, interval=30):
+        """Poll the registry every interval seconds and hot-reload a newly promoted version
+        
+        Forked workers restart polling on their next analysis or status
+        call, since the thread did not survive the fork.
+        """
+        if self.registry is None or not interval:
+            return
+        with self._watcher_lock:
+            if self._watcher_thread is not None and self._watcher_pid == os.getpid() and self._watcher_thread.is_alive():
+                return
+            self._watcher_pid = os.getpid()
+            self._watcher_interval = interval
+            self._watcher_stop.clear()
+            self._watcher_thread = threading.Thread(
+                target=self._watch_registry, args=(interval,), name='moodigo-model-watcher', daemon=True
+            )
+            self._watcher_thread.start()
+    
+    def stop_model_watcher(self):
+        self._watcher_interval = None
+        self._watcher_stop.set()
+    
+    def _restart_after_fork(self):
+        """Start this process's own warm-up and registry polling if they began in a parent process"""
+        pid = os.getpid()
+        if self._warmup_thread is not None and self._warmup_pid != pid:
+            self.start_warmup()
+        if self._watcher_interval and self._watcher_pid != pid:
+            self.start_model_watcher(self._watcher_interval)
+    
+    def check_for_new_version(self):
+        """Load the registry's active version if it differs from the one being served"""
+        # Leave the first load to warm-up
+        if self._warmup_thread is not None and not self._warmup_done.is_set():
+            return False
+        version = self.registry.active_version()
+        if version is None or version == self.registry_version:
+            return False
+        try:
+            self.load_version(version)
+        except Exception as e:
+            # Keep serving the current models and retry on the next poll
+            self.reload_error = e
+            print(f"Error loading model version {version}: {e}")
+            return False
+        self.reload_error = None
+        return True
+    
+    def _watch_registry(self, interval):
+        while not self._watcher_stop.wait(interval):
+            try:
+                self.check_for_new_version()
+            except Exception as e:
+                print(f"Error polling model registry: {e}")
+    
+    def start_warmup(self):
+        """Load and warm up both models in a background thread
+        
+        Returns immediately. Analysis calls made before warm-up finishes wait
+        for it instead of loading the models a second time. Calling it again
+        in a process forked while warm-up was running starts that process's
+        own warm-up, since the thread did not survive the fork.
+        """
+        if self._warmup_done.is_set():
+            return
+        with self._warmup_lock:
+            if self._warmup_done.is_set() or (self._warmup_thread is not None and self._warmup_pid == os.getpid()):
+                return
+            self._warmup_pid = os.getpid()
+            self._warmup_thread = threading.Thread(target=self._warm_up, name='moodigo-warmup', daemon=True)
+            self._warmup_thread.start()
+    
+    def _warm_up(self):
+        start = time.perf_counter()
+        try:
+            self.initialize()
+            self._warm_models(self.survey_model, self.nlp_model)
+            if self.inference_engine is not None:
+                self.inference_engine.submit(self.WARMUP_MESSAGES[0])
+            
+            self.warmup_seconds = time.perf_counter() - start
+            print(f"Models warmed up in {self.warmup_seconds:.2f}s")
+        except Exception as e:
+            self.warmup_error = e
+            print(f"Error during model warm-up: {e}")
+        finally:
+            self._warmup_done.set()
+    
+    def _warm_models(self, survey_model, nlp_model):
+        # Touch every inference path once so the first request pays no lazy cost
+        nlp_model.analyze_texts(self.WARMUP_MESSAGES)
+        survey_model.predict_risk([0] * len(survey_model.mental_health_questions))
+        self._generate_response('Normal', 1.0)
+    
+    @property
+    def is_ready(self):
+        """True once warm-up has finished without errors"""
+        return self._warmup_done.is_set() and self.warmup_error is None
+    
+    def wait_until_ready(self, timeout=None):
+        """Block until a started warm-up finishes, at most timeout (default warmup_timeout) seconds
         
-    def analyze_message(self, message):
-        """Analyze user message using NLP model"""
-        prediction, probabilities, confidence = self.nlp_model.analyze_text(message)
+        Raises ModelsNotReady when warm-up is still running after that or
+        has failed.
+        """
+        self._restart_after_fork()
+        if self._warmup_thread is None:
+            return
+        if not self._warmup_done.wait(self.warmup_timeout if timeout is None else timeout):
+            raise ModelsNotReady("Models are still warming up")
+        if self.warmup_error is not None:
+            raise ModelsNotReady(f"Model warm-up failed: {self.warmup_error}")
+    
+    def status(self):
+        """Model readiness details for health checks"""
+        self._restart_after_fork()
+        return {
+            'ready': self.is_ready,
+            'warming_up': self._warmup_thread is not None and not self._warmup_done.is_set(),
+            'warmup_seconds': self.warmup_seconds,
+            'error': str(self.warmup_error) if self.warmup_error is not None else None,
+            'survey_model': self.survey_model.model_name,
+            'nlp_model_version': self.nlp_model.model_version,
+            'registry_version': self.registry_version,
+            'inference_pool': self.inference_pool.stats(),
+            'reload_error': str(self.reload_error) if self.reload_error is not None else None
+        }
+        
+    def analyze_message(self, message, session_id=None):
+        """Analyze user message using NLP model
+        
+        With a session_id the result also carries that session's recent
+        predictions and probabilities and rolling per-class risk.
+        """
+        screen = self.nlp_model.screen_text(message)
+        return self._analyze_screened(message, screen, session_id)
+    
+    async def analyze_message_async(self, message, session_id=None):
+        """analyze_message() for async views
         
+        The model call runs on the bounded inference pool so the event loop
+        never blocks on it. Raises InferenceOverloaded when the pool is full
+        and ModelsNotReady when the models are not warm in time; crisis
+        keyword hits are answered on the loop and never rejected.
+        """
+        screen = self.nlp_model.screen_text(message)
+        if screen['crisis'] and self.crisis_short_circuit:
+            return self._analyze_screened(message, screen, session_id)
+        return await self.inference_pool.run(self._analyze_screened, message, screen, session_id)
+    
+    def _analyze_screened(self, message, screen, session_id):
+        if screen['crisis'] and self.crisis_short_circuit:
+            analysis = self._build_crisis_analysis(screen)
+        else:
+            self.wait_until_ready()
+            if self.inference_engine is not None:
+                prediction, probabilities, confidence = self.inference_engine.submit(message)
+            else:
+                prediction, probabilities, confidence = self.nlp_model.analyze_text(message)
+            analysis = self._build_analysis(prediction, probabilities, confidence, screen)
+        
+        if session_id is not None and analysis['prediction'] is not None:
+            analysis['context'] = self.conversation_context.update(
+                session_id, analysis['prediction'], analysis['probabilities']
+            )
+        
+        return analysis
+    
+    def analyze_messages(self, messages):
+        """Analyze several user messages with a single NLP model call"""
+        screens = [self.nlp_model.screen_text(message) for message in messages]
+        results = [None] * len(messages)
+        
+        # Only messages without crisis keywords go to the model
+        model_indices = []
+        for i, screen in enumerate(screens):
+            if screen['crisis'] and self.crisis_short_circuit:
+                results[i] = self._build_crisis_analysis(screen)
+            else:
+                model_indices.append(i)
+        
+        if model_indices:
+            self.wait_until_ready()
+            predictions = self.nlp_model.analyze_texts([messages[i] for i in model_indices])
+            for i, (prediction, probabilities, confidence) in zip(model_indices, predictions):
+                results[i] = self._build_analysis(prediction, probabilities, confidence, screens[i])
+        
+        return results
+    
+    def _build_analysis(self, prediction, probabilities, confidence, screen=None):
         return {
             'prediction': prediction,
             'probabilities': probabilities,
             'confidence': confidence,
-            'response': self._generate_response(prediction, confidence)
+            'response': self._generate_response(prediction, confidence),
+            'keyword_screen': screen
         }
     
+    def _build_crisis_analysis(self, screen):
+        """Analysis for a message whose crisis keywords bypassed the model"""
+        analysis = self._build_analysis('Suicidal', {'Suicidal': 1.0}, 1.0, screen)
+        analysis['source'] = 'keyword_screen'
+        return analysis
+    
     def analyze_survey(self, responses):
         """Analyze survey responses"""
+        self.wait_until_ready()
         return self.survey_model.predict_risk(responses)
     
     def _generate_response(self, prediction, confidence):
@@ -12,6 +12,14 @@ class UserSession(models.Model):
     last_activity = models.DateTimeField(auto_now=True)
     is_anonymous = models.BooleanField(default=True)
     
+    class Meta:
+        indexes = [
+            # cleanup_old_sessions, range column first so it stays usable for the boolean filter
+            models.Index(fields=['last_activity', 'is_anonymous'], name='session_activity_anon_idx'),
+            # Daily analytics rollups
+            models.Index(fields=['created_at'], name='session_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Session {self.session_id[:8]}"
 
@@ -24,6 +32,14 @@ class Conversation(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Active conversation lookup
+            models.Index(fields=['session', 'is_active'], name='conv_session_active_idx'),
+            # Conversation history, newest first
+            models.Index(fields=['session', '-created_at'], name='conv_session_created_idx'),
+            # Daily analytics rollups
+            models.Index(fields=['created_at'], name='conv_created_idx'),
+        ]
     
     def __str__(self):
         return f"Conversation {self.id} - {self.created_at.strftime('%Y-%m-%d')}"
@@ -47,6 +63,12 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Messages of a conversation in order
+            models.Index(fields=['conversation', 'timestamp'], name='msg_conv_timestamp_idx'),
+            # Daily analytics rollups (prediction distribution)
+            models.Index(fields=['timestamp', 'predicted_condition'], name='msg_timestamp_pred_idx'),
+        ]
     
     def __str__(self):
         return f"{self.sender}: {self.content[:50]}..."
@@ -72,6 +94,12 @@ class MoodEntry(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Mood tracker and chart
+            models.Index(fields=['session', 'created_at'], name='mood_session_created_idx'),
+            # Daily analytics rollups
+            models.Index(fields=['created_at'], name='mood_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_mood_display()} ({self.intensity}/10) - {self.created_at.strftime('%Y-%m-%d')}"
@@ -94,6 +122,10 @@ class MentalHealthAssessment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Daily analytics rollups
+            models.Index(fields=['created_at'], name='assessment_created_idx'),
+        ]
     
     def __str__(self):
         return f"Assessment {self.id} - {self.get_risk_level_display()}"
@@ -118,6 +150,17 @@ class Resource(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource_type', 'is_active'], name='resource_type_active_idx'),
+            # Booleans compare as bare columns on SQLite, which only a partial index can match
+            models.Index(
+                fields=['is_crisis', 'is_active'],
+                condition=models.Q(is_crisis=True, is_active=True),
+                name='resource_crisis_active_idx'
+            ),
+        ]
+    
     def __str__(self):
         return self.title
 
@@ -132,4 +175,27 @@ class UserPreference(models.Model):
     year_of_study = models.CharField(max_length=20, blank=True)
     
     def __str__(self):
-        return f"Preferences for {self.session.session_id[:8]}"
\ No newline at end of file
+        return f"Preferences for {self.session.session_id[:8]}"
+
+class DailyAnalytics(models.Model):
+    """Per-day usage rollup read by export_analytics, maintained by rollup_analytics"""
+    date = models.DateField(unique=True)
+    sessions = models.PositiveIntegerField(default=0)
+    conversations = models.PositiveIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)
+    prediction_distribution = models.JSONField(default=dict)  # condition -> messages
+    mood_entries = models.PositiveIntegerField(default=0)
+    mood_intensity_sum = models.PositiveIntegerField(default=0)
+    mood_distribution = models.JSONField(default=dict)  # mood -> entries
+    assessments = models.PositiveIntegerField(default=0)
+    assessment_score_sum = models.IntegerField(default=0)
+    risk_distribution = models.JSONField(default=dict)  # risk level -> assessments
+    is_complete = models.BooleanField(default=False)  # False while the day was still running
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily analytics'
+    
+    def __str__(self):
+        return f"Analytics {self.date}"
\ No newline at end of file
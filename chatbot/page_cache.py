@@ -0,0 +1,111 @@
+# chatbot/page_cache.py
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from .resource_catalog import resource_catalog
+import gzip
+import hashlib
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Same matching as django.middleware.gzip
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+
+# Headers that belong to one response, never to the cached page
+UNCACHED_HEADERS = {'set-cookie', 'vary', 'content-length', 'content-encoding', 'etag', 'cache-control'}
+
+class PageCacheMiddleware:
+    """Serves anonymous, identical-for-everyone pages from a cache of compressed bodies
+    
+    The first GET of a page listed in PAGE_CACHE_VIEWS renders it normally
+    and stores the body as-is, gzipped and (with the brotli package)
+    brotli-compressed, plus a strong ETag. Later GETs and HEADs get the
+    variant their Accept-Encoding allows, or a 304 when If-None-Match
+    matches, without running the view or the middleware below this one.
+    
+    Placed above SessionMiddleware, so cached hits do not load or save
+    the session. Requests carrying flash messages bypass the cache, since
+    those pages are the only per-visitor part of base.html. Keys include
+    the resource catalog version, so resource edits show up at once.
+    Query strings are ignored: none of these views read them.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'PAGE_CACHE_VIEWS', []))
+        self.cache_alias = getattr(settings, 'PAGE_CACHE_ALIAS', 'default')
+        self.timeout = getattr(settings, 'PAGE_CACHE_TTL', 600)
+        self.max_age = getattr(settings, 'PAGE_CACHE_BROWSER_MAX_AGE', 60)
+    
+    def __call__(self, request):
+        if not self.is_cacheable(request):
+            return self.get_response(request)
+        
+        key = f'moodigo:page:{request.path}:{resource_catalog.version()}'
+        cache = caches[self.cache_alias]
+        entry = cache.get(key)
+        cookies = None
+        if entry is None:
+            response = self.get_response(request)
+            if response.status_code != 200 or response.streaming or response.has_header('Cache-Control'):
+                return response
+            entry = self.build_entry(response)
+            cache.set(key, entry, self.timeout)
+            cookies = response.cookies
+        
+        response = self.respond(request, entry)
+        if cookies:
+            response.cookies = cookies
+        return response
+    
+    def is_cacheable(self, request):
+        if request.method not in ('GET', 'HEAD') or 'messages' in request.COOKIES:
+            return False
+        try:
+            return resolve(request.path_info).url_name in self.views
+        except Resolver404:
+            return False
+    
+    def build_entry(self, response):
+        body = response.content
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body)
+        headers = [(name, value) for name, value in response.items() if name.lower() not in UNCACHED_HEADERS]
+        return {'etag': etag, 'bodies': bodies, 'headers': headers}
+    
+    def respond(self, request, entry):
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if 'br' in entry['bodies'] and ACCEPTS_BROTLI.search(accept_encoding):
+            encoding = 'br'
+        elif ACCEPTS_GZIP.search(accept_encoding):
+            encoding = 'gzip'
+        else:
+            encoding = 'identity'
+        
+        # Each encoding is its own representation, so each has its own strong ETag
+        etag = f'"{entry["etag"]}"' if encoding == 'identity' else f'"{entry["etag"]}-{encoding}"'
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if if_none_match.strip() == '*' or etag in re.findall(r'"[^"]*"', if_none_match):
+            response = HttpResponseNotModified()
+        else:
+            body = entry['bodies'][encoding]
+            response = HttpResponse(b'' if request.method == 'HEAD' else body)
+            for name, value in entry['headers']:
+                response[name] = value
+            response['Content-Length'] = str(len(body))
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={self.max_age}'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -0,0 +1,37 @@
+# chatbot/pagination.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+def encode_cursor(value, pk):
+    """Opaque cursor for the row with datetime value and primary key pk"""
+    delta = value - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f'{microseconds}-{pk}'
+
+def decode_cursor(cursor):
+    """(datetime, pk) from encode_cursor(), raising ValueError for anything else"""
+    # The time part can be negative, the primary key cannot
+    microseconds, _, pk = cursor.rpartition('-')
+    try:
+        return EPOCH + timedelta(microseconds=int(microseconds)), int(pk)
+    except OverflowError:
+        raise ValueError('Invalid cursor')
+
+def keyset_page(queryset, field, cursor=None, limit=50):
+    """Newest-first page of queryset by (field, pk) and the cursor of the next, older page
+    
+    Rows strictly older than the cursor are read straight off an index on
+    field, so the cost depends on the page size, not on how far back the
+    page is. The next cursor is None on the last page.
+    """
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(**{f'{field}__lte': value}).exclude(**{field: value, 'pk__gte': pk})
+    
+    rows = list(queryset.order_by(f'-{field}', '-pk')[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], field), rows[-1].pk)
@@ -0,0 +1,196 @@
+# chatbot/persistence.py
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Message, UserPreference
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+class ChatTurnWriter:
+    """Stores chat turns (user message, bot reply, crisis flag) in batched transactions
+    
+    A turn is written with one bulk INSERT for both messages and one upsert
+    for the crisis flag, inside a single transaction, so it costs one commit
+    instead of up to four.
+    
+    With deferred=True, save() only queues the turn and returns; a background
+    thread writes everything queued within flush_interval seconds (or
+    max_batch_size turns) in one transaction. Durability in that mode: a
+    reply can reach the user up to flush_interval before its turn is
+    committed, and turns still queued are lost if the process is killed
+    (they are flushed on a normal exit). A batch that fails to write is
+    retried once turn by turn, on a fresh connection; turns that fail again
+    are appended to the dead_letter_path file as JSON lines, one per turn,
+    so they can be inspected and re-entered. Without deferral a failed
+    write raises, and the request fails with it.
+    """
+    
+    def __init__(self, deferred=False, flush_interval=0.05, max_batch_size=200, dead_letter_path=None):
+        self.deferred = deferred
+        self.flush_interval = flush_interval
+        self.max_batch_size = max(1, max_batch_size)
+        self.dead_letter_path = str(dead_letter_path) if dead_letter_path else None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.turns = 0
+        self.dead_letters = 0
+        if deferred:
+            atexit.register(self._flush_at_exit)
+    
+    def save(self, conversation_id, user_session, message_content, ai_analysis, is_crisis):
+        """Store one chat turn and return the bot Message"""
+        user_message = Message(
+            conversation_id=conversation_id,
+            sender='user',
+            content=message_content
+        )
+        bot_message = Message(
+            conversation_id=conversation_id,
+            sender='bot',
+            content=ai_analysis['response'],
+            predicted_condition=ai_analysis['prediction'],
+            confidence_score=ai_analysis['confidence']
+        )
+        turn = ([user_message, bot_message], user_session.pk if is_crisis else None)
+        
+        if self.deferred:
+            # Not inserted yet; the reply shows the time it was produced
+            bot_message.timestamp = timezone.now()
+            self._ensure_worker()
+            self._queue.put(turn)
+        else:
+            self.write([turn])
+        return bot_message
+    
+    def write(self, turns):
+        """Write a list of (messages, crisis session pk or None) turns in one transaction"""
+        messages = [message for turn_messages, _ in turns for message in turn_messages]
+        crisis_sessions = {session_pk for _, session_pk in turns if session_pk is not None}
+        
+        with transaction.atomic():
+            Message.objects.bulk_create(messages)
+            if crisis_sessions:
+                # Insert missing preferences and set crisis_mode on existing ones in one statement
+                UserPreference.objects.bulk_create(
+                    [UserPreference(session_id=session_pk, crisis_mode=True) for session_pk in crisis_sessions],
+                    update_conflicts=True,
+                    unique_fields=['session'],
+                    update_fields=['crisis_mode']
+                )
+        
+        self.batches += 1
+        self.turns += len(turns)
+    
+    def flush(self):
+        """Write every queued turn now"""
+        turns = []
+        while True:
+            try:
+                turns.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(turns), self.max_batch_size):
+            self.write_batch(turns[start:start + self.max_batch_size])
+        return len(turns)
+    
+    def write_batch(self, turns):
+        """write() a batch of queued turns, retrying once turn by turn and dead-lettering what still fails"""
+        try:
+            self.write(turns)
+            return
+        except Exception as e:
+            print(f"Error writing {len(turns)} chat turns, retrying one at a time: {e}")
+            # Retry on a fresh connection
+            connection.close()
+        
+        failed = []
+        for turn in turns:
+            # The rolled back INSERT may already have handed out primary keys
+            for message in turn[0]:
+                message.pk = None
+            try:
+                self.write([turn])
+            except Exception as e:
+                failed.append((turn, e))
+                connection.close()
+        if failed:
+            self._dead_letter(failed)
+    
+    def _dead_letter(self, failed):
+        self.dead_letters += len(failed)
+        lines = []
+        for (messages, crisis_session_pk), error in failed:
+            lines.append(json.dumps({
+                'failed_at': timezone.now().isoformat(),
+                'error': str(error),
+                'conversation_id': messages[0].conversation_id,
+                'crisis_session_id': crisis_session_pk,
+                'messages': [
+                    {
+                        'sender': message.sender,
+                        'content': message.content,
+                        'predicted_condition': message.predicted_condition,
+                        'confidence_score': message.confidence_score,
+                        'timestamp': message.timestamp.isoformat() if message.timestamp else None
+                    }
+                    for message in messages
+                ]
+            }))
+        
+        if self.dead_letter_path is None:
+            print(f"Dropped {len(failed)} chat turns, no dead letter file configured:\n" + '\n'.join(lines))
+            return
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or '.', exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            print(f"Wrote {len(failed)} chat turns that could not be stored to {self.dead_letter_path}")
+        except OSError as e:
+            print(f"Dropped {len(failed)} chat turns, writing {self.dead_letter_path} failed ({e}):\n" + '\n'.join(lines))
+    
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error writing queued chat turns at exit: {e}")
+    
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so pre-forked workers start their own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    # Turns queued before a fork belong to the parent process
+                    self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='moodigo-chat-writer', daemon=True)
+                self._thread.start()
+    
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} chat turns: {e}")
+                connection.close()
@@ -0,0 +1,82 @@
+# chatbot/resource_catalog.py
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import Resource
+import threading
+import uuid
+
+class ResourceCatalog:
+    """Per-process copy of the active resources, grouped for the resource pages
+    
+    All active resources are read in one query and kept in memory, grouped
+    by type and crisis flag. Each process remembers the catalog version it
+    loaded; the current version lives under a key in a cache shared by all
+    workers, so bumping it (invalidate(), called from the Resource signals)
+    makes every process reload on its next read. Between changes a read
+    costs one cache lookup and no database query.
+    """
+    
+    VERSION_KEY = 'moodigo:resource_catalog:version'
+    
+    def __init__(self, cache_alias='default'):
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.loads = 0
+    
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+    
+    def crisis(self):
+        """Active crisis resources"""
+        return self._get()['crisis']
+    
+    def by_type(self, resource_type):
+        """Active resources of one type"""
+        return self._get()['by_type'].get(resource_type, [])
+    
+    def invalidate(self):
+        """Make every process reload the catalog once the current transaction commits"""
+        # Bumping before commit would let another worker cache the old rows under the new version
+        transaction.on_commit(self._bump_version)
+    
+    def _bump_version(self):
+        self.cache.set(self.VERSION_KEY, uuid.uuid4().hex, None)
+    
+    def version(self):
+        """Current catalog version, shared by all workers"""
+        version = self.cache.get(self.VERSION_KEY)
+        if version is None:
+            # First process to look (or the cache was cleared): start a version everyone shares
+            self.cache.add(self.VERSION_KEY, uuid.uuid4().hex, None)
+            version = self.cache.get(self.VERSION_KEY)
+        return version
+    
+    def _get(self):
+        version = self.version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot['version'] == version:
+            return snapshot
+        
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot['version'] != version:
+                # The version is read before the rows, so a change during the load triggers another one
+                snapshot = self._load(version)
+                self._snapshot = snapshot
+        return snapshot
+    
+    def _load(self, version):
+        by_type = {}
+        crisis = []
+        for resource in Resource.objects.filter(is_active=True).order_by('pk'):
+            by_type.setdefault(resource.resource_type, []).append(resource)
+            if resource.is_crisis:
+                crisis.append(resource)
+        
+        self.loads += 1
+        return {'version': version, 'by_type': by_type, 'crisis': crisis}
+
+resource_catalog = ResourceCatalog(cache_alias=getattr(settings, 'RESOURCE_CATALOG_CACHE', 'default'))
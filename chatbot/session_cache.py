@@ -0,0 +1,133 @@
+# chatbot/session_cache.py
+from django.db import connection, transaction
+from django.utils import timezone
+from collections import OrderedDict
+from .models import UserSession
+import atexit
+import os
+import threading
+import time
+
+class SessionCache:
+    """Per-process cache of UserSession rows with write-behind activity tracking
+    
+    Resolving a session normally costs no query: rows are kept for ttl
+    seconds (at most max_size of them, least recently used evicted first).
+    Only the row is cached, not what other workers change under it: the
+    active conversation is always read from the database. last_activity
+    bumps are collected in memory and written by a background thread every
+    flush_interval seconds with bulk UPDATEs, so page views do not write
+    to the database. Activity not yet flushed is lost if the process dies;
+    it is only used to expire old sessions, so that is acceptable.
+    """
+    
+    def __init__(self, max_size=10000, ttl=300, flush_interval=10):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+        atexit.register(self._flush_at_exit)
+    
+    def get_session(self, session_id, user=None):
+        """Return the UserSession for session_id, creating it if needed, and record activity"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and now - entry['cached_at'] < self.ttl:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                user_session = entry['session']
+            else:
+                user_session = None
+                self.misses += 1
+        
+        if user_session is None:
+            is_authenticated = user is not None and user.is_authenticated
+            user_session, _ = UserSession.objects.get_or_create(
+                session_id=session_id,
+                defaults={
+                    'user': user if is_authenticated else None,
+                    'is_anonymous': not is_authenticated
+                }
+            )
+            with self._lock:
+                self._entries[session_id] = {'session': user_session, 'cached_at': now}
+                self._entries.move_to_end(session_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        
+        self.touch(user_session)
+        return user_session
+    
+    def touch(self, user_session):
+        """Record activity now; the database sees it on the next flush"""
+        user_session.last_activity = timezone.now()
+        with self._lock:
+            self._dirty[user_session.pk] = user_session.last_activity
+        self._ensure_flusher()
+    
+    def flush(self):
+        """Write all pending last_activity values with bulk UPDATEs"""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return 0
+            
+            sessions = [UserSession(pk=pk, last_activity=last_activity) for pk, last_activity in dirty.items()]
+            try:
+                with transaction.atomic():
+                    UserSession.objects.bulk_update(sessions, ['last_activity'], batch_size=500)
+            except Exception:
+                # Keep the values for the next flush unless newer ones arrived meanwhile
+                with self._lock:
+                    for pk, last_activity in dirty.items():
+                        self._dirty.setdefault(pk, last_activity)
+                raise
+            self.flushed += len(sessions)
+            return len(sessions)
+    
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'pending_updates': len(self._dirty),
+            'flushed': self.flushed
+        }
+    
+    def _ensure_flusher(self):
+        # Threads do not survive fork(), so pre-forked workers start their own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='moodigo-session-flush', daemon=True)
+                self._thread.start()
+    
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing session activity at exit: {e}")
+    
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing session activity: {e}")
+            finally:
+                # Do not hold this thread's connection open between flushes
+                connection.close()
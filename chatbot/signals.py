@@ -0,0 +1,10 @@
+# chatbot/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Resource
+from .resource_catalog import resource_catalog
+
+@receiver([post_save, post_delete], sender=Resource)
+def invalidate_resource_catalog(sender, **kwargs):
+    """Resources changed in the admin or by setup_initial_data reach every worker's catalog"""
+    resource_catalog.invalidate()
@@ -1,3 +1,1554 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import asyncio
+import gzip
+import io
+import json
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+import numpy as np
+import pandas as pd
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from .ml_models import (
+    TextNormalizer, CompiledForest, LinearTextScorer, NLPMentalHealthAnalyzer, BatchingInferenceEngine,
+    PredictionCache, MentalHealthPredictor, ASSESSMENT_QUESTIONS, MoodigoAI, ModelsNotReady,
+    KeywordMatcher, ModelRegistry, InferencePool, InferenceOverloaded, ConversationContextStore
+)
+from .models import (
+    Resource, Conversation, Message, MoodEntry, MentalHealthAssessment, UserPreference, UserSession, DailyAnalytics
+)
+from .session_cache import SessionCache
+from .persistence import ChatTurnWriter
+from .pagination import encode_cursor, decode_cursor
+from .analytics import compute_rollups, update_rollups, day_start
+from .resource_catalog import resource_catalog
+from .management.commands.cleanup_old_sessions import Command as CleanupCommand
+from .management.commands.export_analytics import Command as ExportAnalyticsCommand
+from . import views
+
+try:
+    # channels.testing needs daphne, which only the tests use (requirements-dev.txt)
+    from channels.testing import WebsocketCommunicator
+    from .consumers import ChatConsumer
+except ImportError:
+    WebsocketCommunicator = None
+
+# In-memory caches for tests that bump the resource catalog version, which would
+# otherwise reach the on-disk 'shared' cache every dev server on the host reads
+ISOLATED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'moodigo-tests-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'moodigo-tests-shared'},
+}
+
+# Chat-like inputs that exercise every preprocessing rule and their interactions
+PREPROCESSING_CORPUS = [
+    "I feel really anxious about my exams",
+    "I can't sleep and I cannot focus",
+    "I won't go, I will not go, I don't care",
+    "CAN'T WON'T DON'T Shouldn't",
+    "check http://example.com/can't and www.site.org/don't now",
+    "@friend #sad #don't @won't",
+    "!!http://x.y!! ??www.z?? !!!",
+    "why???? really!!!! ?!?! !?!!",
+    "  lots   of \t whitespace \n\n here  ",
+    "émotions Über ΣΊΣΥΦΟΣ naïve café",
+    "emoji 😢😢 and symbols $%^&*()[]{}",
+    "it's... fine, okay.",
+    "httpn't wwwn't @n't #n't",
+    "'n't' can'tn't won'twon't",
+    "",
+    "   ",
+    None,
+    float('nan'),
+    12345,
+]
+
+# Fragments that are recombined at random to fuzz the normalizer
+FUZZ_FRAGMENTS = [
+    "can't", "won't", "n't", "cannot", "will not", "http", "www", "://", "@", "#",
+    "!", "?", ".", ",", "'", " ", "\t", "\n", "a", "Z", "_", "9", "Σ", "é", "😢", "-", "/",
+]
+
+
+class TextNormalizerParityTests(SimpleTestCase):
+    """TextNormalizer must be byte-identical to the original preprocessing"""
+
+    def setUp(self):
+        self.normalizer = TextNormalizer()
+        rng = random.Random(42)
+        self.fuzz_corpus = [
+            ''.join(rng.choice(FUZZ_FRAGMENTS) for _ in range(rng.randint(0, 30)))
+            for _ in range(2000)
+        ]
+
+    def test_single_text_parity(self):
+        for text in PREPROCESSING_CORPUS + self.fuzz_corpus:
+            self.assertEqual(self.normalizer.normalize(text), TextNormalizer.reference(text), repr(text))
+
+    def test_batch_parity(self):
+        corpus = PREPROCESSING_CORPUS + self.fuzz_corpus
+        expected = [TextNormalizer.reference(text) for text in corpus]
+        self.assertEqual(self.normalizer.normalize_many(corpus), expected)
+
+    def test_series_parity(self):
+        series = pd.Series(PREPROCESSING_CORPUS + [np.nan, pd.NA], index=range(100, 100 + len(PREPROCESSING_CORPUS) + 2))
+        result = self.normalizer.normalize_many(series)
+        self.assertIsInstance(result, pd.Series)
+        self.assertTrue(result.index.equals(series.index))
+        self.assertEqual(result.tolist(), [TextNormalizer.reference(text) for text in series])
+
+    def test_separator_in_text_falls_back(self):
+        corpus = ["a\x00b", "http://x\x00y don't"]
+        expected = [TextNormalizer.reference(text) for text in corpus]
+        self.assertEqual(self.normalizer.normalize_many(corpus), expected)
+        self.assertEqual([self.normalizer.normalize(text) for text in corpus], expected)
+
+
+class CompiledForestParityTests(SimpleTestCase):
+    """CompiledForest must reproduce RandomForestClassifier probabilities"""
+
+    def test_matches_sklearn(self):
+        rng = np.random.RandomState(0)
+        X = rng.randint(0, 5, (300, 10)).astype(float)
+        y = rng.choice(['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk'], 300)
+        forest = RandomForestClassifier(n_estimators=25, random_state=42).fit(X, y)
+        compiled = CompiledForest.from_estimator(forest)
+
+        X_test = np.vstack([X[:50], rng.uniform(-1, 6, (50, 10))])
+        np.testing.assert_allclose(compiled.predict_proba(X_test), forest.predict_proba(X_test), atol=1e-12)
+        np.testing.assert_array_equal(compiled.predict(X_test), forest.predict(X_test))
+
+
+class LinearTextScorerParityTests(SimpleTestCase):
+    """The exported NLP scorer must reproduce the scikit-learn pipeline"""
+
+    def test_matches_analyze_text(self):
+        analyzer = NLPMentalHealthAnalyzer(cache_size=0)
+        analyzer.initialize_model(use_artifact=False)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'nlp_scorer')
+            analyzer.export_scorer(path)
+            scorer = LinearTextScorer.load(path)
+
+        texts = analyzer.preprocess_texts(PREPROCESSING_CORPUS)
+        texts = [text for text in texts if text]
+        expected = analyzer.model.predict_proba(analyzer.vectorizer.transform(texts))
+        np.testing.assert_allclose(scorer.predict_proba(texts), expected, rtol=0, atol=1e-12)
+
+        sklearn_results = analyzer.analyze_texts(texts)
+        analyzer.scorer, analyzer.model = scorer, None
+        for result, expected_result in zip(analyzer.analyze_texts(texts), sklearn_results):
+            self.assertEqual(result[0], expected_result[0])
+            self.assertAlmostEqual(result[2], expected_result[2], places=12)
+
+    def test_streaming_model_exports_as_hashed_scorer(self):
+        rng = random.Random(7)
+        vocabulary = {
+            'Anxiety': ['anxious', 'panic', 'nervous', 'worried'],
+            'Depression': ['hopeless', 'empty', 'sad', 'crying'],
+            'Normal': ['happy', 'great', 'fine', 'relaxed'],
+        }
+        rows = [
+            (' '.join(rng.choice(words) for _ in range(6)) + f' day {i}', label)
+            for i in range(300) for label, words in vocabulary.items()
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'statements.csv')
+            pd.DataFrame(rows, columns=['statement', 'status']).to_csv(csv_path, index=False)
+            analyzer = NLPMentalHealthAnalyzer(models_dir=directory, cache_size=0)
+            analyzer.train_streaming(csv_path, chunk_size=250, n_features=2 ** 12)
+
+            analyzer.export_scorer()
+            scorer = LinearTextScorer.load(analyzer.artifact_path)
+            self.assertEqual(sorted(os.listdir(analyzer.artifact_path)), ['classes.npy', 'coef.npy', 'intercept.npy', 'manifest.json'])
+
+            texts = analyzer.preprocess_texts(PREPROCESSING_CORPUS + [text for text, _ in rows[:30]])
+            texts = [text for text in texts if text]
+            expected = analyzer.model.predict_proba(analyzer.vectorizer.transform(texts))
+            np.testing.assert_allclose(scorer.predict_proba(texts), expected, rtol=0, atol=1e-12)
+
+            # Workers pick the artifact up instead of the pickle
+            loaded = NLPMentalHealthAnalyzer(models_dir=directory, cache_size=0)
+            loaded.initialize_model()
+            self.assertIsNotNone(loaded.scorer)
+            self.assertEqual(loaded.analyze_text('I am so anxious and nervous')[0], 'Anxiety')
+
+
+@override_settings(CACHES=ISOLATED_CACHES)
+class ResourceCatalogTests(TestCase):
+    """Resources are served from memory until a save or delete bumps the catalog version"""
+
+    def create_resource(self, **fields):
+        # Invalidation waits for the commit, which TestCase never does on its own
+        with self.captureOnCommitCallbacks(execute=True):
+            return Resource.objects.create(description='Test', resource_type='hotline', **fields)
+
+    def test_reads_from_memory_until_changed(self):
+        first = self.create_resource(title='First line', is_crisis=True)
+        self.assertEqual(resource_catalog.crisis(), [first])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(resource_catalog.by_type('hotline'), [first])
+
+        second = self.create_resource(title='Second line', is_crisis=True)
+        self.create_resource(title='Inactive line', is_crisis=True, is_active=False)
+        self.assertEqual(resource_catalog.crisis(), [first, second])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(resource_catalog.crisis(), [second])
+
+    def test_crisis_help_renders_without_queries(self):
+        self.create_resource(title='Crisis line', is_crisis=True)
+        resource_catalog.crisis()
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/crisis-help/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=ISOLATED_CACHES)
+class PageCacheTests(TestCase):
+    """Pages in PAGE_CACHE_VIEWS are served precompressed with ETags, without running the view"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def get(self, path='/about/', **headers):
+        with mock.patch.object(views, 'render', wraps=views.render) as render:
+            response = self.client.get(path, **headers)
+        return response, render.called
+
+    def test_later_requests_skip_the_view(self):
+        first, rendered = self.get()
+        self.assertTrue(rendered)
+        second, rendered = self.get()
+        self.assertFalse(rendered)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Cache-Control'], 'public, max-age=60')
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()[0]['ETag']
+        response, rendered = self.get(HTTP_IF_NONE_MATCH=f'"other", {etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        self.assertFalse(rendered)
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"')[0].status_code, 200)
+
+    def test_gzip_is_negotiated(self):
+        identity = self.get()[0]
+        compressed = self.get(HTTP_ACCEPT_ENCODING='deflate, gzip')[0]
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), identity.content)
+        self.assertEqual(compressed['ETag'], identity['ETag'][:-1] + '-gzip"')
+        self.assertEqual(int(compressed['Content-Length']), len(compressed.content))
+        for response in (identity, compressed):
+            self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertFalse(identity.has_header('Content-Encoding'))
+
+    def test_brotli_is_preferred_when_available(self):
+        fake_brotli = mock.Mock(compress=lambda body: b'br:' + body)
+        with mock.patch('chatbot.page_cache.brotli', fake_brotli):
+            identity = self.get()[0]
+            response = self.get(HTTP_ACCEPT_ENCODING='gzip, br')[0]
+            self.assertEqual(self.get(HTTP_ACCEPT_ENCODING='gzip')[0]['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response.content, b'br:' + identity.content)
+        self.assertTrue(response['ETag'].endswith('-br"'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_flash_messages_bypass_the_cache(self):
+        self.get()
+        self.client.cookies['messages'] = 'pending'
+        response, rendered = self.get()
+        self.assertTrue(rendered)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_catalog_change_renders_again(self):
+        self.get('/resources/')
+        self.assertFalse(self.get('/resources/')[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Resource.objects.create(title='New line', description='Test', resource_type='counseling')
+        response, rendered = self.get('/resources/')
+        self.assertTrue(rendered)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.get('/resources/')[1])
+
+    def test_pages_outside_the_list_are_not_cached(self):
+        self.addCleanup(views.session_cache.flush)
+        response, rendered = self.get('/mood-tracker/')
+        self.assertTrue(rendered)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class GatedAnalyzer:
+    """analyze_texts() stand-in that records its batches and can hold the first one"""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def analyze_texts(self, texts):
+        self.batches.append(list(texts))
+        self.entered.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [(text.upper(), {}, 1.0) for text in texts]
+
+
+class BatchingInferenceEngineTests(SimpleTestCase):
+    """Concurrent submits are scored together and every caller gets its own outcome"""
+
+    def submit_in_threads(self, engine, texts):
+        results = {}
+
+        def submit(text):
+            try:
+                results[text] = engine.submit(text)
+            except Exception as e:
+                results[text] = e
+
+        threads = [threading.Thread(target=submit, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def hold_first_batch(self, engine, analyzer, texts):
+        # The first text occupies the worker while the rest queue up behind it
+        analyzer.release.clear()
+        first_threads, results = self.submit_in_threads(engine, texts[:1])
+        self.assertTrue(analyzer.entered.wait(5))
+        threads, more_results = self.submit_in_threads(engine, texts[1:])
+        while engine._queue.qsize() < len(texts) - 1:
+            time.sleep(0.001)
+        analyzer.release.set()
+        for thread in first_threads + threads:
+            thread.join(5)
+        results.update(more_results)
+        return results
+
+    def test_waiting_texts_form_batches_up_to_max_size(self):
+        analyzer = GatedAnalyzer()
+        engine = BatchingInferenceEngine(analyzer, batch_window=1, max_batch_size=4)
+        texts = ['a', 'b', 'c', 'd', 'e', 'f']
+        results = self.hold_first_batch(engine, analyzer, texts)
+
+        self.assertEqual(analyzer.batches, [['a'], ['b', 'c', 'd', 'e'], ['f']])
+        self.assertEqual(results, {text: (text.upper(), {}, 1.0) for text in texts})
+        self.assertEqual((engine.batches, engine.items), (3, 6))
+
+    def test_lone_text_waits_out_the_window(self):
+        analyzer = GatedAnalyzer()
+        engine = BatchingInferenceEngine(analyzer, batch_window=0.05)
+        start = time.monotonic()
+        self.assertEqual(engine.submit('alone'), ('ALONE', {}, 1.0))
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(analyzer.batches, [['alone']])
+
+    def test_model_error_reaches_every_caller_in_the_batch(self):
+        error = ValueError('model failed')
+        analyzer = GatedAnalyzer(error=error)
+        engine = BatchingInferenceEngine(analyzer, batch_window=1, max_batch_size=3)
+        results = self.hold_first_batch(engine, analyzer, ['a', 'b', 'c', 'd'])
+
+        self.assertEqual(analyzer.batches, [['a'], ['b', 'c', 'd']])
+        self.assertEqual(results, {text: error for text in 'abcd'})
+
+        # The worker keeps serving after a failed batch
+        analyzer.error = None
+        self.assertEqual(engine.submit('e'), ('E', {}, 1.0))
+
+    def test_shutdown_scores_queued_texts_then_stops(self):
+        analyzer = GatedAnalyzer()
+        engine = BatchingInferenceEngine(analyzer, batch_window=1, max_batch_size=32)
+        analyzer.release.clear()
+        threads, results = self.submit_in_threads(engine, ['a'])
+        self.assertTrue(analyzer.entered.wait(5))
+        more_threads, more_results = self.submit_in_threads(engine, ['b', 'c'])
+        while engine._queue.qsize() < 2:
+            time.sleep(0.001)
+
+        worker = engine._thread
+        stopper = threading.Thread(target=engine.shutdown)
+        stopper.start()
+        analyzer.release.set()
+        stopper.join(5)
+        for thread in threads + more_threads:
+            thread.join(5)
+        results.update(more_results)
+
+        self.assertFalse(worker.is_alive())
+        # The stop marker ends the window early instead of waiting out the second
+        self.assertEqual(analyzer.batches, [['a'], ['b', 'c']])
+        self.assertEqual(results, {text: (text.upper(), {}, 1.0) for text in 'abc'})
+        with self.assertRaises(RuntimeError):
+            engine.submit('late')
+
+
+class PredictionCacheTests(SimpleTestCase):
+    """Bounded LRU with optional TTL, emptied whenever the model changes"""
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PredictionCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_entries_expire_after_ttl(self):
+        cache = PredictionCache(max_size=10, ttl=0.05)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_zero_size_disables_caching(self):
+        cache = PredictionCache(max_size=0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_reload_never_serves_the_old_models_predictions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            analyzer = NLPMentalHealthAnalyzer(models_dir=directory)
+            analyzer.initialize_model()
+            text = "I feel really anxious about my exams"
+            before = analyzer.analyze_text(text)
+            self.assertEqual(analyzer.analyze_text(text), before)
+            self.assertEqual(analyzer.prediction_cache.stats()['hits'], 1)
+
+            # A new model that labels everything Stress replaces the demo model in place
+            vectorizer = TfidfVectorizer().fit([text, "something else entirely"])
+            model = DummyClassifier(strategy='constant', constant='Stress')
+            model.fit(vectorizer.transform([text, "something else entirely"]), ['Stress', 'Normal'])
+            with open(analyzer.pickle_path, 'wb') as f:
+                pickle.dump({'model': model, 'vectorizer': vectorizer}, f)
+            analyzer.initialize_model()
+
+            self.assertEqual(analyzer.prediction_cache.stats()['size'], 0)
+            self.assertEqual(analyzer.analyze_text(text)[0], 'Stress')
+            self.assertNotEqual(before[0], 'Stress')
+
+
+class ConversationContextStoreTests(SimpleTestCase):
+    """Per-session ring buffers and rolling risk, bounded by TTL and LRU eviction"""
+
+    def store(self, **options):
+        return ConversationContextStore(['Normal', 'Anxiety', 'Depression'], **options)
+
+    def test_rolling_risk_is_an_ewma(self):
+        store = self.store(alpha=0.5)
+        store.update('a', 'Normal', {'Normal': 1.0})
+        store.update('a', 'Anxiety', {'Anxiety': 1.0, 'Unknown': 1.0})
+        context = store.update('a', 'Anxiety', {'Anxiety': 1.0})
+        self.assertEqual(context['turns'], 3)
+        self.assertEqual(context['rolling_risk'], {'Normal': 0.25, 'Anxiety': 0.75, 'Depression': 0.0})
+
+    def test_ring_buffer_wraps_around(self):
+        store = self.store(history_size=3)
+        for i, prediction in enumerate(['Normal', 'Anxiety', 'Depression', 'Normal', 'Anxiety']):
+            context = store.update('a', prediction, {prediction: 0.5 + i / 10})
+
+        self.assertEqual(context['turns'], 5)
+        self.assertEqual(context['recent_predictions'], ['Depression', 'Normal', 'Anxiety'])
+        self.assertEqual(
+            [probabilities[prediction] for probabilities, prediction in zip(context['recent_probabilities'], context['recent_predictions'])],
+            [0.7, 0.8, 0.9]
+        )
+        self.assertEqual(context['recent_probabilities'][0], {'Normal': 0.0, 'Anxiety': 0.0, 'Depression': 0.7})
+
+    def test_least_recently_used_session_is_evicted(self):
+        store = self.store(max_sessions=2)
+        store.update('a', 'Normal', {'Normal': 1.0})
+        store.update('b', 'Normal', {'Normal': 1.0})
+        store.update('a', 'Normal', {'Normal': 1.0})
+        store.update('c', 'Normal', {'Normal': 1.0})
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.get('a')['turns'], 2)
+        self.assertEqual(store.evictions, 1)
+
+    def test_idle_sessions_expire(self):
+        store = self.store(ttl=0.05)
+        store.update('a', 'Normal', {'Normal': 1.0})
+        self.assertIsNotNone(store.get('a'))
+
+        time.sleep(0.06)
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(store.update('a', 'Anxiety', {'Anxiety': 1.0})['turns'], 1)
+        self.assertEqual(len(store), 1)
+
+    def test_analyze_message_returns_session_context(self):
+        session_id = f'context-test-{uuid.uuid4()}'
+        self.addCleanup(views.moodigo_ai.conversation_context.clear, session_id)
+
+        self.assertNotIn('context', views.moodigo_ai.analyze_message('I had a good day'))
+        first = views.moodigo_ai.analyze_message('I had a good day', session_id=session_id)
+        second = views.moodigo_ai.analyze_message('I cannot stop worrying about exams', session_id=session_id)
+
+        self.assertEqual(first['context']['turns'], 1)
+        self.assertEqual(second['context']['turns'], 2)
+        self.assertEqual(second['context']['recent_predictions'], [first['prediction'], second['prediction']])
+        self.assertEqual(second['context']['recent_probabilities'][1][second['prediction']], second['probabilities'][second['prediction']])
+
+
+class SurveyModelTests(TestCase):
+    """The survey model must be scored on the questions the assessment page asks"""
+
+    def setUp(self):
+        # Pending activity is written inside the test transaction, not after the test database is gone
+        self.addCleanup(views.session_cache.flush)
+
+    def post_assessment(self, answer):
+        data = {f'question_{i}': answer for i in range(len(ASSESSMENT_QUESTIONS))}
+        return self.client.post('/assessment/', data).context['result']
+
+    def test_assessment_answers_reach_the_model(self):
+        high = self.post_assessment(4)
+        self.assertEqual(high['total_score'], 4 * len(ASSESSMENT_QUESTIONS))
+        self.assertNotEqual(high['risk_level'], 'Low Risk')
+
+        low = self.post_assessment(0)
+        self.assertEqual(low['risk_level'], 'Low Risk')
+
+    def test_model_trained_on_other_questions_is_refused(self):
+        questions = [f'{i}. In a semester, how often have you felt upset?' for i in range(1, 27)]
+        X = pd.DataFrame(np.random.RandomState(0).randint(0, 5, (80, len(questions))), columns=questions)
+        model = LogisticRegression(max_iter=1000).fit(X, ['Low Risk', 'High Risk'] * 40)
+
+        with tempfile.TemporaryDirectory() as directory:
+            predictor = MentalHealthPredictor(models_dir=directory)
+            with open(predictor.pickle_path, 'wb') as f:
+                pickle.dump({'model': model, 'scaler': None, 'model_name': 'Semester survey', 'accuracy': 0.9}, f)
+
+            with self.assertRaises(ValueError):
+                predictor.initialize_model(strict=True)
+
+            predictor.initialize_model()
+            self.assertEqual(predictor.model_name, 'Random Forest (Demo)')
+            self.assertEqual(predictor.mental_health_questions, ASSESSMENT_QUESTIONS)
+
+    def test_unknown_questions_are_rejected(self):
+        predictor = MentalHealthPredictor()
+        predictor._create_basic_model()
+        predictor._prepare_model()
+
+        responses = dict.fromkeys(ASSESSMENT_QUESTIONS, 4)
+        self.assertNotEqual(predictor.predict_risk(responses)['risk_level'], 'Low Risk')
+        responses['How often do you feel upset in a semester?'] = 4
+        with self.assertRaises(ValueError):
+            predictor.predict_risk(responses)
+
+
+class SurveyTrainingTests(SimpleTestCase):
+    """Model selection reads a survey CSV, cross-validates candidates and refits the winner"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        # Columns in another order than the assessment asks them
+        self.columns = list(reversed(ASSESSMENT_QUESTIONS))
+        answers = np.random.RandomState(0).randint(0, 5, (60, len(self.columns)))
+        self.data = pd.DataFrame(answers, columns=self.columns)
+        self.data['risk'] = np.where(answers.sum(axis=1) > 20, 'High Risk', 'Low Risk')
+
+    def write_csv(self, data):
+        path = os.path.join(self.directory, 'survey.csv')
+        data.to_csv(path, index=False)
+        return path
+
+    def train(self, path, label_column='risk'):
+        predictor = MentalHealthPredictor(models_dir=self.directory)
+        candidates = {
+            'Most frequent': DummyClassifier(strategy='most_frequent'),
+            'Logistic Regression': LogisticRegression(max_iter=1000),
+        }
+        with mock.patch.object(MentalHealthPredictor, 'candidate_models', return_value=candidates):
+            scores = predictor.train_model_selection(path, label_column, cv=3, n_jobs=1)
+        return predictor, scores
+
+    def test_load_survey_data_uses_compact_dtypes(self):
+        data = self.data.astype({self.columns[0]: float})
+        data.loc[0, self.columns[0]] = np.nan
+        data.loc[1, 'risk'] = np.nan
+
+        X, y, feature_names = MentalHealthPredictor().load_survey_data(self.write_csv(data), 'risk')
+        self.assertEqual(feature_names, self.columns)
+        self.assertEqual(X.dtype, np.float32)
+        self.assertEqual(X.shape, (59, len(self.columns)))
+        self.assertEqual(X[0, 0], 0)
+        self.assertEqual(set(y), {'High Risk', 'Low Risk'})
+
+    def test_missing_label_column_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Label column 'status' not found"):
+            self.train(self.write_csv(self.data), label_column='status')
+
+    def test_other_questions_are_rejected(self):
+        path = self.write_csv(self.data.rename(columns={self.columns[0]: 'How often do you feel upset in a semester?'}))
+        with self.assertRaisesMessage(ValueError, 'Survey data columns must be the assessment questions'):
+            self.train(path)
+
+    def test_train_models_creates_the_models_dir(self):
+        models_dir = os.path.join(self.directory, 'new', 'models')
+        candidates = {'Logistic Regression': LogisticRegression(max_iter=1000)}
+        out = io.StringIO()
+        with mock.patch.object(MentalHealthPredictor, 'candidate_models', return_value=candidates):
+            call_command(
+                'train_models', '--survey-data', self.write_csv(self.data), '--survey-label-column', 'risk',
+                '--cv', '2', '--jobs', '1', '--models-dir', models_dir, stdout=out
+            )
+
+        self.assertIn('ML model setup completed successfully!', out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(models_dir, MentalHealthPredictor.PICKLE_NAME)))
+
+    def test_winner_is_refitted_on_all_rows_and_saved(self):
+        path = self.write_csv(self.data)
+        predictor, scores = self.train(path)
+
+        self.assertEqual(set(scores), {'Most frequent', 'Logistic Regression'})
+        self.assertGreater(scores['Logistic Regression'], scores['Most frequent'])
+        self.assertEqual(predictor.model_name, 'Logistic Regression')
+        self.assertEqual(predictor.accuracy, scores['Logistic Regression'])
+
+        X, y, _ = predictor.load_survey_data(path, 'risk')
+        refitted = LogisticRegression(max_iter=1000).fit(X, y)
+        np.testing.assert_allclose(predictor.model.coef_, refitted.coef_)
+
+        predictor.save_model(cv_scores=scores)
+        with open(predictor.pickle_path, 'rb') as f:
+            package = pickle.load(f)
+        self.assertEqual(package['feature_names'], self.columns)
+        self.assertEqual(package['cv_scores'], scores)
+        self.assertEqual(package['model_name'], 'Logistic Regression')
+
+        # Answers are matched to the saved column order, not the assessment's
+        loaded = MentalHealthPredictor(models_dir=self.directory)
+        loaded.initialize_model(use_artifact=False, strict=True)
+        responses = dict(zip(self.columns, X[0]))
+        self.assertEqual(loaded.predict_risk(responses)['risk_level'], refitted.predict(X[:1])[0])
+
+
+
+class PredictRiskManyTests(SimpleTestCase):
+    """Survey responses are scored in batches, fitted to the model's question count"""
+
+    def setUp(self):
+        self.predictor = MentalHealthPredictor()
+        self.predictor._create_basic_model()
+        self.predictor._prepare_model()
+        self.n_questions = len(ASSESSMENT_QUESTIONS)
+
+    def test_rows_are_padded_and_truncated(self):
+        short = [4] * 5
+        long = [3] * (self.n_questions + 4)
+        results = self.predictor.predict_risk_many([short + [0] * (len(long) - 5), long])
+
+        self.assertEqual([result['total_score'] for result in results], [20, 3 * self.n_questions])
+        self.assertEqual(results[0], self.predictor.predict_risk(short))
+        self.assertEqual(results[1], self.predictor.predict_risk(long[:self.n_questions]))
+
+        narrow = self.predictor.predict_risk_many(np.full((2, 3), 4))
+        self.assertEqual([result['total_score'] for result in narrow], [12, 12])
+
+    def test_one_dimensional_input_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.predictor.predict_risk_many([4] * self.n_questions)
+
+    def test_predict_risk_leaves_the_responses_alone(self):
+        for responses in ([1, 2, 3], [2] * (self.n_questions + 3)):
+            original = list(responses)
+            self.predictor.predict_risk(responses)
+            self.assertEqual(responses, original)
+
+        responses = {ASSESSMENT_QUESTIONS[0]: 3}
+        self.predictor.predict_risk(responses)
+        self.assertEqual(responses, {ASSESSMENT_QUESTIONS[0]: 3})
+
+
+
+class WarmupTests(TestCase):
+    """Requests wait a bounded time for warm-up, in the process that started it or a forked one"""
+
+    def setUp(self):
+        self.addCleanup(views.session_cache.flush)
+        self.models_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.models_dir, ignore_errors=True)
+        self.ai = MoodigoAI(models_dir=self.models_dir, cache_size=0)
+
+    def test_forked_worker_restarts_warm_up(self):
+        # Forked while the parent's warm-up ran: the thread object came along, the thread did not
+        self.ai._warmup_thread = threading.Thread(target=lambda: None)
+        self.ai._warmup_pid = os.getpid()
+
+        with mock.patch('chatbot.ml_models.os.getpid', return_value=os.getpid() + 1):
+            self.ai.wait_until_ready(timeout=30)
+            self.assertEqual(self.ai._warmup_pid, os.getpid())
+
+        self.assertTrue(self.ai.is_ready)
+        self.assertIsNotNone(self.ai.analyze_messages(['I feel fine'])[0]['prediction'])
+
+    def test_wait_is_bounded(self):
+        release = threading.Event()
+
+        def slow_warm_up():
+            release.wait(5)
+            self.ai._warmup_done.set()
+
+        self.ai.warmup_timeout = 0.05
+        with mock.patch.object(self.ai, '_warm_up', slow_warm_up):
+            self.ai.start_warmup()
+        self.addCleanup(release.set)
+
+        with self.assertRaises(ModelsNotReady):
+            self.ai.wait_until_ready()
+        self.assertTrue(self.ai.status()['warming_up'])
+        with self.assertRaises(ModelsNotReady):
+            self.ai.analyze_survey(dict.fromkeys(ASSESSMENT_QUESTIONS, 1))
+
+        release.set()
+        self.ai.wait_until_ready(timeout=5)
+
+    def test_chat_returns_503_until_models_are_ready(self):
+        not_ready = mock.AsyncMock(side_effect=ModelsNotReady("Models are still warming up"))
+        with mock.patch.object(views.moodigo_ai, 'analyze_message_async', not_ready):
+            response = self.client.post('/send-message/', {'message': 'hello'}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    """The one-pass keyword screen must find exactly what per-phrase regexes find"""
+
+    def setUp(self):
+        self.analyzer = NLPMentalHealthAnalyzer(cache_size=0)
+        self.matcher = self.analyzer.keyword_matcher
+
+    def phrases(self, text):
+        return sorted(phrase for _, phrase, _, _ in self.matcher.find(text))
+
+    def test_only_whole_words_match(self):
+        matcher = KeywordMatcher({'test': ['kill', 'end']})
+        self.assertEqual(
+            [(phrase, start) for _, phrase, start, _ in matcher.find('skills weekend kill_ killed end. kill')],
+            [('end', 28), ('kill', 33)]
+        )
+
+    def test_overlapping_phrases_all_match(self):
+        self.assertEqual(
+            self.phrases('i want to die and end it all'),
+            ['die', 'end', 'end it all', 'want to die']
+        )
+        matcher = KeywordMatcher({'long': ['mood swing'], 'short': ['swing', 'mood']})
+        self.assertEqual(
+            sorted(matcher.find('mood swing')),
+            [('long', 'mood swing', 0, 10), ('short', 'mood', 0, 4), ('short', 'swing', 5, 10)]
+        )
+
+    def test_text_is_normalized_before_matching(self):
+        self.assertTrue(self.analyzer.screen_text('I WANT TO DIE!!!')['crisis'])
+        self.assertTrue(self.analyzer.screen_text('thinking about self-harm again')['crisis'])
+        screen = self.analyzer.screen_text('So   STRESSED, and Overwhelmed')
+        self.assertEqual(screen['categories'], {'stress': 2})
+        self.assertEqual(screen['intensity'], 1)
+
+    def test_unrelated_text_does_not_match(self):
+        screen = self.analyzer.screen_text('The weather was mild and I walked the dog')
+        self.assertEqual(screen, {'categories': {}, 'intensity': 0, 'crisis': False, 'matches': []})
+
+    def test_negated_crisis_phrases_still_match(self):
+        # Intentional, see screen_text()
+        self.assertTrue(self.analyzer.screen_text("I don't want to die")['crisis'])
+
+    def test_matches_per_phrase_regexes(self):
+        lexicon = {category[:-len('_words')]: words for category, words in self.analyzer.mental_health_patterns.items()}
+        lexicon['crisis'] = self.analyzer.crisis_phrases
+        words = [phrase for phrases in lexicon.values() for phrase in phrases]
+        fragments = words + ['a', 'x', '_', '9', 'é', 'ing', 's', ' ', ' ', ' ', '.', '!', '-']
+
+        rng = random.Random(11)
+        corpus = PREPROCESSING_CORPUS[:-3] + [
+            ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 25))) for _ in range(1000)
+        ]
+        for text in corpus:
+            for normalized in (text.lower(), self.analyzer.preprocess_text(text)):
+                self.assertEqual(
+                    sorted(self.matcher.find(normalized)),
+                    sorted(KeywordMatcher.reference(lexicon, normalized)),
+                    repr(normalized)
+                )
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """Published versions are checksummed, promoted, rolled back and hot-reloaded"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.registry = ModelRegistry(os.path.join(self.root, 'registry'))
+
+    def publish(self, name, nlp_label=None):
+        """Publish demo models, with an NLP model that answers nlp_label to everything if given"""
+        source = os.path.join(self.root, name)
+        os.makedirs(source)
+        survey_model = MentalHealthPredictor(models_dir=source)
+        survey_model.initialize_model()
+        survey_model.save_model()
+
+        nlp_model = NLPMentalHealthAnalyzer(models_dir=source, cache_size=0)
+        nlp_model.initialize_model()
+        if nlp_label is not None:
+            nlp_model.model = DummyClassifier(strategy='constant', constant=nlp_label).fit(
+                nlp_model.vectorizer.transform(['a', 'b']), [nlp_label, 'Normal']
+            )
+        nlp_model.save_model()
+        return self.registry.publish(source, metadata={'name': name})['version']
+
+    def corrupt(self, version):
+        with open(os.path.join(self.registry.version_path(version), NLPMentalHealthAnalyzer.PICKLE_NAME), 'ab') as f:
+            f.write(b'tampered')
+
+    def test_promote_and_rollback(self):
+        first = self.publish('first')
+        second = self.publish('second')
+        self.assertEqual([info['version'] for info in self.registry.versions()], [first, second])
+        self.assertEqual(self.registry.get(second)['metadata'], {'name': 'second'})
+        self.assertIsNone(self.registry.active_version())
+
+        self.registry.promote(first)
+        self.registry.promote(second)
+        self.assertEqual(self.registry.active_version(), second)
+        self.assertEqual(self.registry.history(), [first, second])
+
+        self.assertEqual(self.registry.rollback(), first)
+        self.assertEqual(self.registry.active_version(), first)
+        with self.assertRaises(ValueError):
+            self.registry.rollback()
+
+    def test_tampered_version_is_rejected(self):
+        version = self.publish('first')
+        self.registry.verify(version)
+        self.corrupt(version)
+
+        with self.assertRaisesRegex(ValueError, NLPMentalHealthAnalyzer.PICKLE_NAME):
+            self.registry.verify(version)
+        with self.assertRaises(ValueError):
+            self.registry.promote(version)
+        self.assertIsNone(self.registry.active_version())
+
+    def test_workers_hot_reload_the_promoted_version(self):
+        first = self.publish('first')
+        second = self.publish('second', nlp_label='Stress')
+        self.registry.promote(first)
+        ai = MoodigoAI(models_dir=os.path.join(self.root, 'unused'), cache_size=0, registry=self.registry)
+        ai.initialize()
+        self.assertEqual(ai.registry_version, first)
+        self.assertFalse(ai.check_for_new_version())
+
+        self.registry.promote(second)
+        self.assertTrue(ai.check_for_new_version())
+        self.assertEqual(ai.registry_version, second)
+        self.assertEqual(ai.analyze_message('hello there')['prediction'], 'Stress')
+
+        # A version damaged after promotion is not loaded, the current one keeps serving
+        third = self.publish('third')
+        self.registry.promote(third)
+        self.corrupt(third)
+        self.assertFalse(ai.check_for_new_version())
+        self.assertIsNotNone(ai.reload_error)
+        self.assertEqual(ai.registry_version, second)
+
+    def test_forked_worker_restarts_polling(self):
+        ai = MoodigoAI(models_dir=os.path.join(self.root, 'unused'), cache_size=0, registry=self.registry)
+        self.addCleanup(ai.stop_model_watcher)
+        ai.start_model_watcher(interval=60)
+        parent_thread = ai._watcher_thread
+
+        with mock.patch('chatbot.ml_models.os.getpid', return_value=os.getpid() + 1):
+            ai.status()
+            self.assertEqual(ai._watcher_pid, os.getpid())
+        self.assertIsNot(ai._watcher_thread, parent_thread)
+        self.assertTrue(ai._watcher_thread.is_alive())
+
+        # Once stopped, polling is not restarted
+        ai.stop_model_watcher()
+        with mock.patch('chatbot.ml_models.os.getpid', return_value=os.getpid() + 2):
+            ai.status()
+        self.assertNotEqual(ai._watcher_pid, os.getpid() + 2)
+
+
+class InferencePoolTests(TestCase):
+    """The pool turns requests away when full and counts a call until it really finishes"""
+
+    def setUp(self):
+        # Pending activity is written inside the test transaction, not after the test database is gone
+        self.addCleanup(views.session_cache.flush)
+
+    def test_cancelled_calls_keep_their_slot_until_they_finish(self):
+        pool = InferencePool(max_workers=1, max_pending=2)
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def blocking_call():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        async def scenario():
+            running = asyncio.ensure_future(pool.run(blocking_call))
+            queued = asyncio.ensure_future(pool.run(lambda: 'never runs'))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            self.assertEqual(pool.pending, 2)
+
+            running.cancel()
+            queued.cancel()
+            await asyncio.gather(running, queued, return_exceptions=True)
+            # The queued call was dropped, the running one still holds its thread
+            self.assertEqual(pool.pending, 1)
+            self.assertEqual(pool.cancelled, 1)
+
+            extra = asyncio.ensure_future(pool.run(lambda: 'next'))
+            await asyncio.sleep(0)
+            with self.assertRaises(InferenceOverloaded):
+                await pool.run(lambda: 'rejected')
+
+            release.set()
+            self.assertEqual(await extra, 'next')
+
+        asyncio.run(scenario())
+        self.assertEqual(pool.stats()['pending'], 0)
+        self.assertEqual((pool.completed, pool.cancelled, pool.rejected), (2, 1, 1))
+
+    def test_chat_returns_503_with_retry_after_when_full(self):
+        pool = InferencePool(max_workers=1, max_pending=1)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        occupant = threading.Thread(target=asyncio.run, args=(pool.run(release.wait, 5),))
+        occupant.start()
+        while pool.pending < 1:
+            time.sleep(0.001)
+
+        with mock.patch.object(views.moodigo_ai, 'inference_pool', pool):
+            response = self.client.post('/send-message/', {'message': 'hello'}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(pool.rejected, 1)
+
+        release.set()
+        occupant.join(5)
+        self.assertEqual(pool.pending, 0)
+
+
+@unittest.skipIf(WebsocketCommunicator is None, 'channels.testing needs daphne (pip install -r requirements-dev.txt)')
+class ChatConsumerTests(TestCase):
+    """The chat socket answers messages, pings and bad frames, and needs a Django session"""
+
+    def setUp(self):
+        # Pending activity is written inside the test transaction, not after the test database is gone
+        self.addCleanup(views.session_cache.flush)
+
+    async def connect(self, session=None):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), '/ws/chat/')
+        communicator.scope['session'] = {'session_id': str(uuid.uuid4())} if session is None else session
+        communicator.scope['user'] = AnonymousUser()
+        connected, close_code = await communicator.connect()
+        return communicator, connected, close_code
+
+    async def test_message_gets_a_reply_and_is_stored(self):
+        communicator, connected, _ = await self.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to({'type': 'message', 'id': 7, 'message': 'I had a long but okay day'})
+        reply = await communicator.receive_json_from(timeout=10)
+        await communicator.disconnect()
+
+        self.assertEqual(reply['type'], 'reply')
+        self.assertEqual(reply['id'], 7)
+        self.assertFalse(reply['is_crisis'])
+        self.assertTrue(reply['bot_response'])
+        senders = [message.sender async for message in Message.objects.order_by('pk')]
+        self.assertEqual(senders, ['user', 'bot'])
+
+    async def test_crisis_message_sets_crisis_mode(self):
+        communicator, _, _ = await self.connect()
+        await communicator.send_json_to({'type': 'message', 'id': 1, 'message': 'I want to end my life'})
+        reply = await communicator.receive_json_from(timeout=10)
+        await communicator.disconnect()
+
+        self.assertEqual(reply['prediction'], 'Suicidal')
+        self.assertTrue(reply['is_crisis'])
+        self.assertIn('988', reply['bot_response'])
+        self.assertTrue(await UserPreference.objects.filter(crisis_mode=True).aexists())
+
+    async def test_ping_gets_pong(self):
+        communicator, _, _ = await self.connect()
+        await communicator.send_json_to({'type': 'ping'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong'})
+        await communicator.disconnect()
+
+    async def test_message_length_is_limited(self):
+        communicator, _, _ = await self.connect()
+        await communicator.send_json_to({'type': 'message', 'id': 2, 'message': 'a' * 501})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'error', 'id': 2, 'error': 'Message is too long'}
+        )
+        await communicator.send_json_to({'type': 'message', 'id': 3, 'message': 'a' * 500})
+        self.assertEqual((await communicator.receive_json_from(timeout=10))['type'], 'reply')
+        await communicator.disconnect()
+        self.assertEqual(await Message.objects.acount(), 2)
+
+    async def test_socket_without_session_is_closed(self):
+        communicator, connected, close_code = await self.connect(session={})
+        self.assertFalse(connected)
+        self.assertEqual(close_code, ChatConsumer.CLOSE_NO_SESSION)
+        self.assertFalse(await Conversation.objects.aexists())
+
+
+class SessionCacheTests(TestCase):
+    """Session rows are cached with a TTL and LRU bound, activity is written in bulk"""
+
+    def cache(self, **options):
+        cache = SessionCache(flush_interval=3600, **options)
+        self.addCleanup(cache.flush)
+        return cache
+
+    def test_rows_are_cached_until_ttl(self):
+        cache = self.cache(ttl=0.05)
+        first = cache.get_session('a')
+        with self.assertNumQueries(0):
+            self.assertIs(cache.get_session('a'), first)
+
+        time.sleep(0.06)
+        with self.assertNumQueries(1):
+            self.assertEqual(cache.get_session('a').pk, first.pk)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_least_recently_used_row_is_evicted(self):
+        cache = self.cache(max_size=2)
+        cache.get_session('a')
+        cache.get_session('b')
+        cache.get_session('a')
+        cache.get_session('c')
+        self.assertEqual(cache.stats()['size'], 2)
+
+        with self.assertNumQueries(0):
+            cache.get_session('a')
+            cache.get_session('c')
+        with self.assertNumQueries(1):
+            cache.get_session('b')
+
+    def test_activity_is_written_in_one_bulk_update(self):
+        cache = self.cache()
+        sessions = [cache.get_session(name) for name in 'abc']
+        stored = dict(UserSession.objects.values_list('pk', 'last_activity'))
+        for user_session in sessions:
+            cache.touch(user_session)
+        self.assertEqual(dict(UserSession.objects.values_list('pk', 'last_activity')), stored)
+        self.assertEqual(cache.stats()['pending_updates'], 3)
+
+        self.assertEqual(cache.flush(), 3)
+        self.assertEqual(
+            dict(UserSession.objects.values_list('pk', 'last_activity')),
+            {user_session.pk: user_session.last_activity for user_session in sessions}
+        )
+        self.assertEqual(cache.stats()['pending_updates'], 0)
+        self.assertEqual(cache.flush(), 0)
+
+    def test_conversation_ended_elsewhere_is_not_reused(self):
+        self.addCleanup(views.session_cache.flush)
+        self.client.get('/chat/')
+        first = Conversation.objects.get()
+
+        # Another worker ends the conversation; this one has the session cached
+        Conversation.objects.filter(pk=first.pk).update(is_active=False)
+        response = self.client.post('/send-message/', {'message': 'hello again'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        second = Conversation.objects.get(is_active=True)
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(first.messages.count(), 0)
+        self.assertEqual(second.messages.count(), 2)
+
+
+class ChatTurnWriterTests(TestCase):
+    """Chat turns are stored in one transaction; deferred batches are retried, then dead-lettered"""
+
+    def setUp(self):
+        self.user_session = UserSession.objects.create(session_id=str(uuid.uuid4()))
+        self.conversation = Conversation.objects.create(session=self.user_session, title='Chat')
+
+    def analysis(self, response='Take care', prediction='Stress'):
+        return {'response': response, 'prediction': prediction, 'confidence': 0.9}
+
+    def deferred_writer(self, **options):
+        writer = ChatTurnWriter(deferred=True, **options)
+        # The tests flush by hand instead of racing the writer thread for the queue
+        writer._ensure_worker = lambda: None
+        return writer
+
+    def test_turn_is_one_transaction(self):
+        writer = ChatTurnWriter()
+        # Savepoint, one INSERT for both messages, one upsert for the crisis flag, release
+        with self.assertNumQueries(4):
+            bot_message = writer.save(self.conversation.pk, self.user_session, 'help', self.analysis(), True)
+        self.assertEqual(bot_message.content, 'Take care')
+        self.assertEqual(
+            list(self.conversation.messages.values_list('sender', 'content', 'predicted_condition')),
+            [('user', 'help', None), ('bot', 'Take care', 'Stress')]
+        )
+
+    def test_crisis_flag_upserts_the_preference(self):
+        preference = UserPreference.objects.create(session=self.user_session, preferred_name='Sam', crisis_mode=False)
+        writer = ChatTurnWriter()
+        writer.save(self.conversation.pk, self.user_session, 'help', self.analysis(), True)
+        preference.refresh_from_db()
+        self.assertTrue(preference.crisis_mode)
+        self.assertEqual(preference.preferred_name, 'Sam')
+
+        other_session = UserSession.objects.create(session_id=str(uuid.uuid4()))
+        writer.save(self.conversation.pk, other_session, 'help', self.analysis(), True)
+        self.assertTrue(UserPreference.objects.get(session=other_session).crisis_mode)
+        self.assertEqual(UserPreference.objects.count(), 2)
+
+    def test_sync_write_failure_fails_the_request(self):
+        writer = ChatTurnWriter()
+        with mock.patch.object(Message.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                writer.save(self.conversation.pk, self.user_session, 'hi', self.analysis(), False)
+
+    def test_queued_turns_are_flushed_at_exit(self):
+        writer = self.deferred_writer(max_batch_size=2)
+        for i in range(3):
+            writer.save(self.conversation.pk, self.user_session, f'message {i}', self.analysis(), False)
+        self.assertEqual(Message.objects.count(), 0)
+
+        writer._flush_at_exit()
+        self.assertEqual(Message.objects.count(), 6)
+        self.assertEqual((writer.batches, writer.turns), (2, 3))
+
+    def test_failed_turns_are_retried_then_dead_lettered(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dead', 'turns.jsonl')
+            writer = self.deferred_writer(dead_letter_path=path)
+            writer.save(self.conversation.pk, self.user_session, 'good turn', self.analysis(), False)
+            writer.save(self.conversation.pk, self.user_session, 'bad turn', self.analysis(), True)
+
+            write = writer.write
+            def write_without_bad_turns(turns):
+                if any(message.content == 'bad turn' for messages, _ in turns for message in messages):
+                    raise DatabaseError('constraint failed')
+                return write(turns)
+
+            with mock.patch.object(writer, 'write', side_effect=write_without_bad_turns):
+                self.assertEqual(writer.flush(), 2)
+
+            self.assertEqual(list(Message.objects.filter(sender='user').values_list('content', flat=True)), ['good turn'])
+            self.assertEqual(writer.dead_letters, 1)
+            with open(path) as f:
+                dead_letters = [json.loads(line) for line in f]
+
+        self.assertEqual(len(dead_letters), 1)
+        self.assertEqual(dead_letters[0]['error'], 'constraint failed')
+        self.assertEqual(dead_letters[0]['conversation_id'], self.conversation.pk)
+        self.assertEqual(dead_letters[0]['crisis_session_id'], self.user_session.pk)
+        self.assertEqual([message['content'] for message in dead_letters[0]['messages']], ['bad turn', 'Take care'])
+
+
+class QueryPlanAuditTests(TestCase):
+    """audit_query_plans explains the SQL the views and commands really issue"""
+
+    def test_audits_captured_queries_and_leaves_no_rows(self):
+        self.addCleanup(views.session_cache.flush)
+        out = io.StringIO()
+        call_command('audit_query_plans', '--verbose-plans', stdout=out)
+        output = out.getvalue()
+
+        self.assertNotIn('returned', output)
+        for location in (
+            'chat', 'send_message', 'mood_tracker', 'mood_chart_data', 'conversation_history',
+            'view_conversation', 'conversation_messages', 'new_conversation', 'cleanup_old_sessions',
+            'rollup_analytics', 'export_analytics'
+        ):
+            self.assertIn(f'  {location}', output)
+        # The history preview is the view's Substr subquery, not a hand-written copy of it
+        history = [line for line in output.splitlines() if 'SELECT' in line and '"chatbot_conversation"' in line and 'SUBSTR' in line.upper()]
+        self.assertTrue(history)
+
+        # Everything the views and commands wrote was rolled back
+        for model in (UserSession, Conversation, Message, MoodEntry, MentalHealthAssessment):
+            self.assertFalse(model.objects.exists())
+
+
+class MessagePaginationTests(TestCase):
+    """Message pages are keyset ranges on (timestamp, pk) behind an opaque cursor"""
+
+    def setUp(self):
+        self.addCleanup(views.session_cache.flush)
+        self.client.get('/chat/')
+        self.conversation = Conversation.objects.get()
+        self.url = f'/conversation/{self.conversation.pk}/messages/'
+
+    def add_messages(self, count, timestamp=None):
+        Message.objects.bulk_create(
+            Message(conversation=self.conversation, sender='user', content=f'message {i}') for i in range(count)
+        )
+        if timestamp is not None:
+            Message.objects.update(timestamp=timestamp)
+        return list(Message.objects.order_by('timestamp', 'pk').values_list('pk', flat=True))
+
+    def test_cursor_round_trips(self):
+        for value, pk in (
+            (datetime(2024, 5, 17, 13, 45, 12, 345678, tzinfo=dt_timezone.utc), 42),
+            (datetime(1969, 12, 31, 23, 59, 59, 999999, tzinfo=dt_timezone.utc), 1),
+        ):
+            self.assertEqual(decode_cursor(encode_cursor(value, pk)), (value, pk))
+
+    def test_pages_walk_every_message_once_with_equal_timestamps(self):
+        expected = self.add_messages(7, timestamp=timezone.now())
+
+        seen = []
+        cursor = None
+        while True:
+            query = {'limit': 3} if cursor is None else {'limit': 3, 'before': cursor}
+            page = self.client.get(self.url, query).json()
+            # Each page comes oldest first and goes before everything already seen
+            seen = [message['id'] for message in page['messages']] + seen
+            cursor = page['next_cursor']
+            self.assertEqual(page['has_more'], cursor is not None)
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_or_limit_is_rejected(self):
+        for query in (
+            {'before': 'not-a-cursor'}, {'before': '12x-3'}, {'before': '99999999999999999999-1'},
+            {'limit': 'ten'}, {'limit': 0}
+        ):
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_limit_is_capped(self):
+        self.add_messages(205)
+        page = self.client.get(self.url, {'limit': 1000}).json()
+        self.assertEqual(len(page['messages']), 200)
+        self.assertTrue(page['has_more'])
+
+    def test_other_sessions_conversations_are_not_found(self):
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ConversationHistoryTests(TestCase):
+    """The history page annotates each conversation in the page query"""
+
+    def setUp(self):
+        self.addCleanup(views.session_cache.flush)
+        self.client.get('/chat/')
+        self.user_session = UserSession.objects.get()
+
+    def conversation(self, *turns):
+        conversation = Conversation.objects.create(session=self.user_session)
+        for sender, content in turns:
+            Message.objects.create(conversation=conversation, sender=sender, content=content)
+        return conversation
+
+    def test_conversations_are_annotated(self):
+        Conversation.objects.all().delete()
+        empty = self.conversation()
+        chat = self.conversation(('bot', 'Hi there'), ('user', 'x' * 300), ('user', 'second'), ('bot', 'Take care'))
+
+        conversations = {c.pk: c for c in self.client.get('/history/').context['conversations']}
+        self.assertEqual(conversations[chat.pk].message_count, 4)
+        self.assertEqual(conversations[chat.pk].preview, 'x' * 200)
+        self.assertEqual(conversations[chat.pk].last_message_at, chat.messages.order_by('-timestamp', '-pk')[0].timestamp)
+        self.assertEqual(conversations[empty.pk].message_count, 0)
+        self.assertIsNone(conversations[empty.pk].preview)
+        self.assertIsNone(conversations[empty.pk].last_message_at)
+
+    def test_pages_follow_the_cursor(self):
+        Conversation.objects.bulk_create(Conversation(session=self.user_session) for _ in range(14))
+        expected = list(Conversation.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+        first = self.client.get('/history/').context
+        self.assertTrue(first['is_first_page'])
+        second = self.client.get('/history/', {'before': first['next_cursor']}).context
+        self.assertFalse(second['is_first_page'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual([c.pk for c in first['conversations']] + [c.pk for c in second['conversations']], expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', '99999999999999999999-1'):
+            self.assertEqual(self.client.get('/history/', {'before': cursor}).status_code, 400, cursor)
+
+
+class CleanupOldSessionsTests(TestCase):
+    """Old anonymous sessions are deleted in batches, children first, and a stopped run can be resumed"""
+
+    def make_session(self, days_old, is_anonymous=True):
+        user_session = UserSession.objects.create(session_id=str(uuid.uuid4()), is_anonymous=is_anonymous)
+        UserSession.objects.filter(pk=user_session.pk).update(last_activity=timezone.now() - timedelta(days=days_old))
+        for _ in range(2):
+            conversation = Conversation.objects.create(session=user_session)
+            for content in ('hello', 'hi', 'bye'):
+                Message.objects.create(conversation=conversation, sender='user', content=content)
+        MoodEntry.objects.create(session=user_session, mood='neutral', intensity=5)
+        MentalHealthAssessment.objects.create(session=user_session, total_score=10, risk_level='low', responses={})
+        UserPreference.objects.create(session=user_session)
+        return user_session
+
+    def cleanup(self, *args):
+        out = io.StringIO()
+        call_command('cleanup_old_sessions', '--sleep', '0', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def assertNoOrphans(self):
+        sessions = UserSession.objects.all()
+        self.assertFalse(Conversation.objects.exclude(session__in=sessions).exists())
+        self.assertFalse(Message.objects.exclude(conversation__in=Conversation.objects.all()).exists())
+        for model in (MoodEntry, MentalHealthAssessment, UserPreference):
+            self.assertFalse(model.objects.exclude(session__in=sessions).exists())
+
+    def test_only_old_anonymous_sessions_are_deleted(self):
+        old = [self.make_session(40) for _ in range(3)]
+        kept = [self.make_session(5), self.make_session(40, is_anonymous=False)]
+
+        output = self.cleanup()
+        self.assertIn('Successfully deleted 3 old sessions', output)
+        self.assertEqual(set(UserSession.objects.values_list('pk', flat=True)), {s.pk for s in kept})
+        self.assertFalse(UserSession.objects.filter(pk__in=[s.pk for s in old]).exists())
+        self.assertEqual(Message.objects.count(), 12)
+        self.assertEqual(MoodEntry.objects.count(), 2)
+        self.assertNoOrphans()
+
+    def test_children_are_deleted_before_parents(self):
+        self.make_session(40)
+        with CaptureQueriesContext(connection) as captured:
+            self.cleanup()
+
+        deletes = [query['sql'].split('"')[1] for query in captured.captured_queries if query['sql'].startswith('DELETE')]
+        order = {table: index for index, table in enumerate(deletes)}
+        self.assertLess(order['chatbot_message'], order['chatbot_conversation'])
+        for child in ('chatbot_conversation', 'chatbot_moodentry', 'chatbot_mentalhealthassessment', 'chatbot_userpreference'):
+            self.assertLess(order[child], order['chatbot_usersession'])
+
+    def test_dry_run_counts_without_deleting(self):
+        self.make_session(40)
+        self.make_session(5)
+
+        output = self.cleanup('--dry-run')
+        self.assertIn('1 old sessions', output)
+        self.assertIn('2 conversations', output)
+        self.assertIn('6 messages', output)
+        self.assertIn('1 mood entries', output)
+        self.assertEqual(UserSession.objects.count(), 2)
+        self.assertEqual(Message.objects.count(), 12)
+
+    def test_interrupted_run_leaves_no_orphans_and_resumes(self):
+        for _ in range(4):
+            self.make_session(40)
+        kept = self.make_session(5)
+
+        # The second batch fails after its messages are gone, before its sessions are
+        raw_delete = CleanupCommand.raw_delete
+        conversation_deletes = []
+        def failing_raw_delete(command, queryset):
+            if queryset.model is Conversation:
+                conversation_deletes.append(queryset)
+                if len(conversation_deletes) == 2:
+                    raise DatabaseError('disk I/O error')
+            return raw_delete(command, queryset)
+
+        with mock.patch.object(CleanupCommand, 'raw_delete', autospec=True, side_effect=failing_raw_delete):
+            output = self.cleanup()
+        self.assertIn('Error during cleanup', output)
+        self.assertIn('run the command again', output)
+        self.assertEqual(UserSession.objects.count(), 3)
+        self.assertNoOrphans()
+
+        output = self.cleanup()
+        self.assertIn('Successfully deleted 2 old sessions', output)
+        self.assertEqual(list(UserSession.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertEqual(Message.objects.count(), 6)
+        self.assertNoOrphans()
+
+
+class AnalyticsRollupTests(TestCase):
+    """Daily rollups are upserted idempotently; exports read them without writing"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.day = lambda days_ago: day_start(self.today - timedelta(days=days_ago))
+
+    def activity_at(self, when):
+        user_session = UserSession.objects.create(session_id=str(uuid.uuid4()))
+        mood_entry = MoodEntry.objects.create(session=user_session, mood='happy', intensity=4)
+        UserSession.objects.filter(pk=user_session.pk).update(created_at=when)
+        MoodEntry.objects.filter(pk=mood_entry.pk).update(created_at=when)
+
+    def rollup_values(self):
+        return list(DailyAnalytics.objects.order_by('date').values_list('date', 'sessions', 'mood_entries', 'mood_distribution', 'is_complete'))
+
+    def test_update_rollups_is_idempotent(self):
+        for when in (self.day(3) + timedelta(hours=6), self.day(2) + timedelta(hours=1), self.day(0)):
+            self.activity_at(when)
+
+        self.assertEqual(update_rollups(), 3)
+        complete = self.rollup_values()
+        self.assertEqual([row[1] for row in complete], [1, 1, 0])
+        self.assertEqual(update_rollups(), 0)
+        self.assertEqual(update_rollups(rebuild_days=3), 3)
+        self.assertEqual(self.rollup_values(), complete)
+
+        # Today is partial: written, then rewritten by every later run
+        self.assertEqual(update_rollups(include_today=True), 1)
+        self.assertEqual(update_rollups(include_today=True), 1)
+        self.assertEqual(self.rollup_values(), complete + [(self.today, 1, 1, {'happy': 1}, False)])
+
+    def test_only_finished_whole_days_are_complete(self):
+        rollups = compute_rollups(self.today - timedelta(days=1), self.today + timedelta(days=1))
+        self.assertEqual([(rollup.date, rollup.is_complete) for rollup in rollups], [
+            (self.today - timedelta(days=1), True), (self.today, False)
+        ])
+
+        partial = compute_rollups(self.today - timedelta(days=1), self.today, since=self.day(1) + timedelta(hours=12))
+        self.assertFalse(partial[0].is_complete)
+
+    def test_export_follows_the_cutoff_without_writing(self):
+        for when in (
+            self.day(3) + timedelta(hours=6), self.day(3) + timedelta(hours=18),
+            self.day(2) + timedelta(hours=1), self.day(0)
+        ):
+            self.activity_at(when)
+        update_rollups()
+        # Full days come from the stored rollups, not the raw rows
+        DailyAnalytics.objects.filter(date=self.today - timedelta(days=2)).update(sessions=50)
+        stored = self.rollup_values()
+
+        cutoff = self.day(3) + timedelta(hours=12)
+        data = ExportAnalyticsCommand().gather_analytics(cutoff)
+        self.assertEqual(self.rollup_values(), stored)
+        self.assertEqual(data['usage_statistics']['total_sessions'], 52)
+        self.assertEqual(data['mood_tracking']['total_mood_entries'], 3)
+        self.assertEqual(data['mood_tracking']['mood_distribution'], {'happy': 3})
+        self.assertEqual(data['period_days'], (timezone.now() - cutoff).days)
+
+        # Days not rolled up yet are computed from the raw rows
+        DailyAnalytics.objects.all().delete()
+        data = ExportAnalyticsCommand().gather_analytics(cutoff)
+        self.assertFalse(DailyAnalytics.objects.exists())
+        self.assertEqual(data['usage_statistics']['total_sessions'], 3)
+
+
+class RowExportTests(TestCase):
+    """Row exports write anonymized day partitions that --resume keeps"""
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        self.today = timezone.localdate()
+        self.user_session = UserSession.objects.create(session_id='secret-session')
+        conversation = Conversation.objects.create(session=self.user_session, title='Private title')
+        self.message = Message.objects.create(
+            conversation=conversation, sender='user', content='very private words',
+            predicted_condition='Anxiety', confidence_score=0.75, risk_level='moderate'
+        )
+        Message.objects.create(conversation=conversation, sender='bot', content='no prediction')
+        MoodEntry.objects.create(session=self.user_session, mood='sad', intensity=3, notes='private notes')
+
+    def export(self, *args):
+        call_command('export_analytics', '--format', 'ndjson', '--output', self.output_dir, '--days', '2', *args, stdout=io.StringIO())
+
+    def partition(self, dataset, day):
+        return os.path.join(self.output_dir, dataset, f'date={day.isoformat()}', 'part-0.ndjson')
+
+    def read(self, dataset, day):
+        with open(self.partition(dataset, day)) as ndjson_file:
+            return [json.loads(line) for line in ndjson_file]
+
+    def test_rows_are_anonymized(self):
+        self.export()
+
+        predictions = self.read('predictions', self.today)
+        self.assertEqual(predictions, [{
+            'timestamp': self.message.timestamp.isoformat(),
+            'predicted_condition': 'Anxiety',
+            'confidence_score': 0.75,
+            'risk_level': 'moderate',
+        }])
+        self.assertEqual(self.read('mood_entries', self.today)[0].keys(), {'created_at', 'mood', 'intensity'})
+        # Quiet days still get an (empty) partition
+        self.assertEqual(self.read('assessments', self.today - timedelta(days=1)), [])
+
+        for dataset in ('predictions', 'mood_entries', 'assessments'):
+            for day in range(3):
+                with open(self.partition(dataset, self.today - timedelta(days=day))) as ndjson_file:
+                    text = ndjson_file.read()
+                for private in ('secret-session', 'private', 'Private'):
+                    self.assertNotIn(private, text)
+
+    def test_resume_keeps_finished_days_and_rewrites_today(self):
+        self.export()
+        yesterday = self.partition('mood_entries', self.today - timedelta(days=1))
+        with open(yesterday, 'w') as ndjson_file:
+            ndjson_file.write('{"kept": true}\n')
+        MoodEntry.objects.create(session=self.user_session, mood='happy', intensity=7)
+
+        out = io.StringIO()
+        call_command(
+            'export_analytics', '--format', 'ndjson', '--output', self.output_dir, '--days', '2', '--resume', stdout=out
+        )
+        self.assertIn('mood_entries: 2 rows written, 2 finished days skipped', out.getvalue())
+        self.assertEqual(self.read('mood_entries', self.today - timedelta(days=1)), [{'kept': True}])
+        self.assertEqual(len(self.read('mood_entries', self.today)), 2)
+
+        # Without --resume every day is written again
+        self.export()
+        self.assertEqual(self.read('mood_entries', self.today - timedelta(days=1)), [])
+
+    def test_parquet_needs_pyarrow(self):
+        with mock.patch('chatbot.management.commands.export_analytics.pyarrow', None):
+            with self.assertRaisesMessage(
+                CommandError, 'Parquet export needs the pyarrow package; use --format ndjson or install pyarrow'
+            ):
+                call_command('export_analytics', '--format', 'parquet', '--output', self.output_dir, stdout=io.StringIO())
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_row_exports_need_an_output_directory(self):
+        with self.assertRaisesMessage(CommandError, '--output must name a directory for ndjson exports'):
+            call_command('export_analytics', '--format', 'ndjson', stdout=io.StringIO())
 
-# Create your tests here.
@@ -23,7 +23,12 @@ urlpatterns = [
     # History and conversations
     path('history/', views.conversation_history, name='conversation_history'),
     path('conversation/<int:conversation_id>/', views.view_conversation, name='view_conversation'),
+    path('conversation/<int:conversation_id>/messages/', views.conversation_messages, name='conversation_messages'),
     
     # AJAX endpoints
     path('mood-chart-data/', views.mood_chart_data, name='mood_chart_data'),
+    
+    # Health checks
+    path('healthz', views.healthz, name='healthz'),
+    path('readyz', views.readyz, name='readyz'),
 ]
\ No newline at end of file
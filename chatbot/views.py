@@ -1,22 +1,63 @@
 # chatbot/views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.conf import settings
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Q, Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Substr
 from django.utils import timezone
 from .models import *
-from .ml_models import MoodigoAI
+from .ml_models import MoodigoAI, ModelRegistry, InferenceOverloaded, ModelsNotReady, ASSESSMENT_QUESTIONS
 from .forms import MoodEntryForm, SurveyForm
+from .session_cache import SessionCache
+from .persistence import ChatTurnWriter
+from .pagination import keyset_page
+from .resource_catalog import resource_catalog
+from asgiref.sync import sync_to_async
 import json
 import uuid
 from datetime import datetime, timedelta
 
 # Initialize AI service
-moodigo_ai = MoodigoAI()
-moodigo_ai.initialize()
+model_registry_dir = getattr(settings, 'ML_MODEL_REGISTRY_DIR', None)
+moodigo_ai = MoodigoAI(
+    models_dir=getattr(settings, 'ML_MODELS_DIR', None),
+    batch_window=getattr(settings, 'INFERENCE_BATCH_WINDOW_MS', 0) / 1000.0,
+    max_batch_size=getattr(settings, 'INFERENCE_MAX_BATCH_SIZE', 32),
+    cache_size=getattr(settings, 'NLP_PREDICTION_CACHE_SIZE', 10000),
+    cache_ttl=getattr(settings, 'NLP_PREDICTION_CACHE_TTL', None),
+    crisis_short_circuit=getattr(settings, 'CRISIS_KEYWORD_SHORT_CIRCUIT', True),
+    context_history_size=getattr(settings, 'CONTEXT_HISTORY_SIZE', 10),
+    context_alpha=getattr(settings, 'CONTEXT_EWMA_ALPHA', 0.3),
+    context_max_sessions=getattr(settings, 'CONTEXT_MAX_SESSIONS', 10000),
+    context_ttl=getattr(settings, 'CONTEXT_SESSION_TTL', 3600),
+    registry=ModelRegistry(model_registry_dir) if model_registry_dir else None,
+    pool_workers=getattr(settings, 'INFERENCE_POOL_WORKERS', 4),
+    pool_max_pending=getattr(settings, 'INFERENCE_POOL_MAX_PENDING', 64),
+    warmup_timeout=getattr(settings, 'MODEL_WARMUP_WAIT', 10)
+)
+
+# Models load in the background, /readyz reports when they are warm
+moodigo_ai.start_warmup()
+
+# Newly promoted model versions are loaded and swapped in without a restart
+moodigo_ai.start_model_watcher(getattr(settings, 'ML_MODEL_RELOAD_INTERVAL', 30))
+
+# UserSession rows are cached per process and last_activity is written behind
+session_cache = SessionCache(
+    max_size=getattr(settings, 'SESSION_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'SESSION_CACHE_TTL', 300),
+    flush_interval=getattr(settings, 'SESSION_ACTIVITY_FLUSH_INTERVAL', 10)
+)
+
+# Chat turns are written in one transaction each, or queued and batched when deferred
+chat_turn_writer = ChatTurnWriter(
+    deferred=getattr(settings, 'CHAT_WRITE_DEFERRED', False),
+    flush_interval=getattr(settings, 'CHAT_WRITE_FLUSH_INTERVAL_MS', 50) / 1000.0,
+    max_batch_size=getattr(settings, 'CHAT_WRITE_BATCH_SIZE', 200),
+    dead_letter_path=getattr(settings, 'CHAT_WRITE_DEAD_LETTER_PATH', None)
+)
 
 def get_or_create_session(request):
     """Get or create user session for anonymous users"""
@@ -26,19 +67,31 @@ def get_or_create_session(request):
         session_id = str(uuid.uuid4())
         request.session['session_id'] = session_id
     
-    user_session, created = UserSession.objects.get_or_create(
-        session_id=session_id,
-        defaults={
-            'user': request.user if request.user.is_authenticated else None,
-            'is_anonymous': not request.user.is_authenticated
-        }
+    return session_cache.get_session(session_id, user=request.user)
+
+def is_crisis_analysis(ai_analysis):
+    """True if a chat message analysis calls for crisis mode"""
+    return ai_analysis['prediction'] == 'Suicidal' or (
+        ai_analysis['prediction'] == 'Depression' and ai_analysis['confidence'] > 0.8
+    )
+
+def get_message_page(conversation_id, cursor=None, limit=None):
+    """Latest messages of a conversation before cursor, oldest first, and the cursor of the page before them"""
+    if limit is None:
+        limit = getattr(settings, 'MESSAGE_PAGE_SIZE', 50)
+    messages, next_cursor = keyset_page(
+        Message.objects.filter(conversation_id=conversation_id), 'timestamp', cursor, limit
+    )
+    messages.reverse()
+    return messages, next_cursor
+
+async def save_chat_turn(conversation_id, user_session, message_content, ai_analysis, is_crisis):
+    """Store a chat turn from async code, skipping the database thread when writes are deferred"""
+    if chat_turn_writer.deferred:
+        return chat_turn_writer.save(conversation_id, user_session, message_content, ai_analysis, is_crisis)
+    return await sync_to_async(chat_turn_writer.save)(
+        conversation_id, user_session, message_content, ai_analysis, is_crisis
     )
-    
-    if not created:
-        user_session.last_activity = timezone.now()
-        user_session.save()
-    
-    return user_session
 
 def home(request):
     """Homepage view"""
@@ -64,21 +117,29 @@ def chat(request):
             title=f"Chat {timezone.now().strftime('%Y-%m-%d %H:%M')}"
         )
     
-    # Get recent messages
-    messages = conversation.messages.all()[:50]  # Last 50 messages
+    # Latest page of messages, older ones are fetched on scroll
+    messages, next_cursor = get_message_page(conversation.id)
     
     context = {
         'conversation': conversation,
         'messages': messages,
+        'next_cursor': next_cursor,
         'session_id': user_session.session_id
     }
     
     return render(request, 'chatbot/chat.html', context)
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def send_message(request):
-    """Handle chat messages via AJAX"""
+async def send_message(request):
+    """Handle chat messages via AJAX
+    
+    Runs on the event loop under ASGI: database calls use the async ORM and
+    the model call runs on the bounded inference pool. When that pool is
+    full, or the models are not warm yet, the request is turned away with
+    a 503 instead of waiting.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
     try:
         data = json.loads(request.body)
         message_content = data.get('message', '').strip()
@@ -86,52 +147,41 @@ def send_message(request):
         if not message_content:
             return JsonResponse({'error': 'Message cannot be empty'}, status=400)
         
-        user_session = get_or_create_session(request)
+        # Sessions and auth have no async API in this Django version
+        user_session = await sync_to_async(get_or_create_session)(request)
         
-        # Get or create conversation
-        conversation = Conversation.objects.filter(
+        # Analyze message with AI before anything is stored, so a rejected request leaves no trace
+        try:
+            ai_analysis = await moodigo_ai.analyze_message_async(message_content, session_id=user_session.session_id)
+        except InferenceOverloaded:
+            response = JsonResponse({'error': 'Moodigo is busy right now, please try again in a moment'}, status=503)
+            response['Retry-After'] = '1'
+            return response
+        except ModelsNotReady:
+            response = JsonResponse({'error': 'Moodigo is still starting up, please try again in a moment'}, status=503)
+            response['Retry-After'] = '5'
+            return response
+        
+        # Get or create conversation. Looked up every time (an index-only read of
+        # conv_session_active_idx), since another worker may have ended it.
+        conversation_id = await Conversation.objects.filter(
             session=user_session,
             is_active=True
-        ).first()
+        ).values_list('pk', flat=True).afirst()
         
-        if not conversation:
-            conversation = Conversation.objects.create(
+        if conversation_id is None:
+            conversation = await Conversation.objects.acreate(
                 session=user_session,
                 title=f"Chat {timezone.now().strftime('%Y-%m-%d %H:%M')}"
             )
-        
-        # Save user message
-        user_message = Message.objects.create(
-            conversation=conversation,
-            sender='user',
-            content=message_content
-        )
-        
-        # Analyze message with AI
-        ai_analysis = moodigo_ai.analyze_message(message_content)
-        
-        # Generate bot response
-        bot_response = ai_analysis['response']
-        
-        # Save bot message with AI predictions
-        bot_message = Message.objects.create(
-            conversation=conversation,
-            sender='bot',
-            content=bot_response,
-            predicted_condition=ai_analysis['prediction'],
-            confidence_score=ai_analysis['confidence']
-        )
+            conversation_id = conversation.id
         
         # Check if this is a crisis situation
-        is_crisis = ai_analysis['prediction'] == 'Suicidal' or (
-            ai_analysis['prediction'] == 'Depression' and ai_analysis['confidence'] > 0.8
-        )
+        is_crisis = is_crisis_analysis(ai_analysis)
         
-        # Update user preferences if crisis detected
-        if is_crisis:
-            preferences, _ = UserPreference.objects.get_or_create(session=user_session)
-            preferences.crisis_mode = True
-            preferences.save()
+        # Save both messages and any crisis flag as one transaction
+        bot_message = await save_chat_turn(conversation_id, user_session, message_content, ai_analysis, is_crisis)
+        bot_response = bot_message.content
         
         response_data = {
             'bot_response': bot_response,
@@ -146,6 +196,9 @@ def send_message(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+# Django 4.2's csrf_exempt wraps views in a sync function, which would hide that this one is async
+send_message.csrf_exempt = True
+
 def mood_tracker(request):
     """Mood tracking page"""
     user_session = get_or_create_session(request)
@@ -179,19 +232,19 @@ def assessment(request):
     """Mental health survey/assessment"""
     user_session = get_or_create_session(request)
     
-    # Mental health questions (simplified version)
-    questions = [
-        "How often do you feel nervous or anxious?",
-        "How often do you feel depressed or down?",
-        "How often do you have trouble sleeping?",
-        "How often do you feel overwhelmed by daily tasks?",
-        "How often do you feel hopeless about the future?",
-        "How often do you have difficulty concentrating?",
-        "How often do you feel tired or have little energy?",
-        "How often do you feel bad about yourself?",
-        "How often do you feel restless or fidgety?",
-        "How often do you have thoughts of self-harm?"
-    ]
+    # Mental health questions (simplified version), the ones the survey model is trained on
+    questions = ASSESSMENT_QUESTIONS
+    
+    context = {
+        'questions': list(enumerate(questions)),  # Convert to list
+        'response_options': [
+            (0, 'Never'),
+            (1, 'Almost Never'),
+            (2, 'Sometimes'),
+            (3, 'Fairly Often'),
+            (4, 'Very Often')
+        ]
+    }
     
     if request.method == 'POST':
         # Process survey responses
@@ -201,7 +254,13 @@ def assessment(request):
             responses[question] = int(response)
         
         # Analyze with AI model
-        assessment_result = moodigo_ai.analyze_survey(responses)
+        try:
+            assessment_result = moodigo_ai.analyze_survey(responses)
+        except ModelsNotReady:
+            messages.warning(request, 'The assessment is still starting up. Please submit it again in a moment.')
+            response = render(request, 'chatbot/assessment.html', context, status=503)
+            response['Retry-After'] = '5'
+            return response
         
         # Save assessment
         assessment = MentalHealthAssessment.objects.create(
@@ -216,27 +275,16 @@ def assessment(request):
             'assessment': assessment,
             'result': assessment_result
         })
-
-    context = {
-        'questions': list(enumerate(questions)),  # Convert to list
-        'response_options': [
-            (0, 'Never'),
-            (1, 'Almost Never'),
-            (2, 'Sometimes'),
-            (3, 'Fairly Often'),
-            (4, 'Very Often')
-        ]
-    }
     
     return render(request, 'chatbot/assessment.html', context)
 
 def resources(request):
     """Mental health resources page"""
-    # Get resources categorized by type
-    crisis_resources = Resource.objects.filter(is_crisis=True, is_active=True)
-    counseling_resources = Resource.objects.filter(resource_type='counseling', is_active=True)
-    app_resources = Resource.objects.filter(resource_type='app', is_active=True)
-    article_resources = Resource.objects.filter(resource_type='article', is_active=True)
+    # Get resources categorized by type, from memory unless the catalog changed
+    crisis_resources = resource_catalog.crisis()
+    counseling_resources = resource_catalog.by_type('counseling')
+    app_resources = resource_catalog.by_type('app')
+    article_resources = resource_catalog.by_type('article')
     
     context = {
         'crisis_resources': crisis_resources,
@@ -251,14 +299,32 @@ def conversation_history(request):
     """View conversation history"""
     user_session = get_or_create_session(request)
     
-    conversations = Conversation.objects.filter(session=user_session)
-    paginator = Paginator(conversations, 10)
+    # One query per page: message count, last message time and preview come from
+    # correlated subqueries, and pages are keyset ranges without a COUNT(*)
+    messages = Message.objects.filter(conversation=OuterRef('pk'))
+    conversations = Conversation.objects.filter(session=user_session).annotate(
+        message_count=Coalesce(
+            Subquery(messages.order_by().values('conversation').annotate(count=Count('pk')).values('count')),
+            0
+        ),
+        last_message_at=Subquery(messages.order_by('-timestamp', '-pk').values('timestamp')[:1]),
+        preview=Subquery(
+            messages.filter(sender='user').order_by('timestamp', 'pk').annotate(
+                snippet=Substr('content', 1, 200)
+            ).values('snippet')[:1]
+        )
+    )
     
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cursor = request.GET.get('before')
+    try:
+        conversations, next_cursor = keyset_page(conversations, 'created_at', cursor, 10)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
     
     context = {
-        'conversations': page_obj
+        'conversations': conversations,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor
     }
     
     return render(request, 'chatbot/history.html', context)
@@ -272,15 +338,68 @@ def view_conversation(request, conversation_id):
         session=user_session
     )
     
-    messages = conversation.messages.all()
+    # Latest page of messages, older ones are fetched on scroll
+    messages, next_cursor = get_message_page(conversation.id)
+    
+    # Stats cover the whole conversation, not only the loaded page
+    stats = conversation.messages.order_by().aggregate(
+        total=Count('id'),
+        user_messages=Count('id', filter=Q(sender='user')),
+        predictions=Count('id', filter=Q(predicted_condition__isnull=False)),
+        last_timestamp=Max('timestamp')
+    )
+    if stats['last_timestamp']:
+        stats['duration_minutes'] = int((stats['last_timestamp'] - conversation.created_at).total_seconds() // 60)
+    else:
+        stats['duration_minutes'] = 0
     
     context = {
         'conversation': conversation,
-        'messages': messages
+        'messages': messages,
+        'next_cursor': next_cursor,
+        'stats': stats
     }
     
     return render(request, 'chatbot/view_conversation.html', context)
 
+def conversation_messages(request, conversation_id):
+    """AJAX endpoint for a page of a conversation's messages
+    
+    Returns the latest messages, or with ?before=<cursor> the ones before an
+    earlier page, oldest first. next_cursor is null once the start of the
+    conversation is reached.
+    """
+    user_session = get_or_create_session(request)
+    conversation = get_object_or_404(
+        Conversation,
+        id=conversation_id,
+        session=user_session
+    )
+    
+    try:
+        limit = min(int(request.GET.get('limit', getattr(settings, 'MESSAGE_PAGE_SIZE', 50))), 200)
+        if limit < 1:
+            raise ValueError
+        messages, next_cursor = get_message_page(conversation.id, request.GET.get('before'), limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+    
+    return JsonResponse({
+        'messages': [
+            {
+                'id': message.id,
+                'sender': message.sender,
+                'content': message.content,
+                'prediction': message.predicted_condition,
+                'confidence': message.confidence_score,
+                'timestamp': message.timestamp.isoformat()
+            }
+            for message in messages
+        ],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    })
+
 def new_conversation(request):
     """Start a new conversation"""
     user_session = get_or_create_session(request)
@@ -295,7 +414,8 @@ def new_conversation(request):
 
 def crisis_help(request):
     """Crisis support page"""
-    crisis_resources = Resource.objects.filter(is_crisis=True, is_active=True)
+    # Served from memory so the page renders even when the database is struggling
+    crisis_resources = resource_catalog.crisis()
     
     context = {
         'crisis_resources': crisis_resources
@@ -329,6 +449,19 @@ def mood_chart_data(request):
         'chart_data': chart_data
     })
 
+def healthz(request):
+    """Liveness probe: the process is up and serving requests"""
+    return JsonResponse({'status': 'ok'})
+
+def readyz(request):
+    """Readiness probe: both models are loaded and warmed up"""
+    status = moodigo_ai.status()
+    if status['ready']:
+        return JsonResponse(dict(status, status='ready'))
+    
+    status['status'] = 'error' if status['error'] else 'warming_up'
+    return JsonResponse(status, status=503)
+
 def privacy_policy(request):
     """Privacy policy page"""
     return render(request, 'chatbot/privacy.html')
@@ -1,5 +1,6 @@
 # moodigo_project/settings.py
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,6 +24,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Above sessions so cached pages skip the session load and save
+    'chatbot.page_cache.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,6 +62,28 @@ DATABASES = {
     }
 }
 
+# 'default' is per process. 'shared' is seen by every worker on the host; point it at
+# Redis or Memcached when workers run on more than one machine.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'moodigo-cache'),
+    },
+}
+
+# Active resources are served from memory; edits bump a version key in this cache
+RESOURCE_CATALOG_CACHE = 'shared'
+
+# Pages that are the same for every visitor, served as precompressed bodies with ETags.
+# Kept per process so a deploy never serves pages rendered by the previous release.
+PAGE_CACHE_VIEWS = ['home', 'about', 'privacy', 'terms', 'crisis_help', 'resources']
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TTL = 600
+PAGE_CACHE_BROWSER_MAX_AGE = 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -92,6 +117,58 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_SAVE_EVERY_REQUEST = True
 
+# UserSession rows cached per process (seconds); last_activity is written in bulk every flush interval
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 300
+SESSION_ACTIVITY_FLUSH_INTERVAL = 10
+
+# Each chat turn is one transaction. With CHAT_WRITE_DEFERRED, turns are queued and
+# committed in batches off the request path: replies can precede their commit by up
+# to the flush interval, and queued turns are lost if a worker is killed. Turns that
+# still fail after a retry are appended to the dead letter file as JSON lines.
+CHAT_WRITE_DEFERRED = False
+CHAT_WRITE_FLUSH_INTERVAL_MS = 50
+CHAT_WRITE_BATCH_SIZE = 200
+CHAT_WRITE_DEAD_LETTER_PATH = BASE_DIR / 'logs' / 'chat_dead_letter.jsonl'
+
+# Messages per page in the chat and conversation views; older pages load on scroll
+MESSAGE_PAGE_SIZE = 50
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
+
+# ML inference settings
+# Trained model pickles and memory-mapped model artifacts
+ML_MODELS_DIR = BASE_DIR / 'ml_models'
+
+# Versioned models managed with "manage.py model_registry"; workers poll it and
+# hot-reload the active version (interval in seconds, 0 disables polling)
+ML_MODEL_REGISTRY_DIR = ML_MODELS_DIR / 'registry'
+ML_MODEL_RELOAD_INTERVAL = 30
+
+# Seconds a request waits for models still warming up before it gets a 503
+MODEL_WARMUP_WAIT = 10
+
+# Chat messages arriving within this window are scored together in one model call (0 disables batching).
+# Each waiting message holds an inference pool thread, so batches stay within INFERENCE_POOL_WORKERS.
+INFERENCE_BATCH_WINDOW_MS = 5
+INFERENCE_MAX_BATCH_SIZE = 32
+
+# Threads running model calls for the async chat endpoint; once this many requests
+# are pending (running or queued) further ones get a 503 with Retry-After
+INFERENCE_POOL_WORKERS = 4
+INFERENCE_POOL_MAX_PENDING = 64
+
+# Bounded LRU cache of chat classification results (0 disables, TTL in seconds or None)
+NLP_PREDICTION_CACHE_SIZE = 10000
+NLP_PREDICTION_CACHE_TTL = None
+
+# Messages containing crisis phrases get the crisis response without waiting for the model
+CRISIS_KEYWORD_SHORT_CIRCUIT = True
+
+# Per-session conversation context kept in memory by each worker
+CONTEXT_HISTORY_SIZE = 10
+CONTEXT_EWMA_ALPHA = 0.3
+CONTEXT_MAX_SESSIONS = 10000
+CONTEXT_SESSION_TTL = 3600